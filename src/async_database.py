@@ -0,0 +1,221 @@
+"""
+Asynchronous access to the databases for the cogs.
+
+Methods of DatabaseDeck and DatabasePersonality are awaited instead of being called directly,
+so that sqlite never blocks the event loop:
+    - reads run on a pool of threads, each one with its own connection,
+    - writes are queued to a single writer thread (sqlite only allows one writer at a time)
+      which commits them by batches, a write is awaited until its batch is committed,
+    - methods answered from memory run directly, once their memory is loaded (on a reader thread).
+
+Threads are started by the first call and stopped by db.close().
+
+Usage:
+    await db.deck.get_user_deck(id_server, id_member)
+    await db.write(function)  # Several writes in one transaction
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from database import DatabaseDeck, DatabasePersonality, deferred_commits
+
+
+class WriteQueue:
+    """Single writer thread committing queued writes by batches (group commit)."""
+
+    def __init__(self, max_batch=64, max_delay=0.002):
+        """Commit after max_batch writes or max_delay seconds after the first write of the batch."""
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='database-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        """Queue a write, the future resolves once it is committed."""
+        future = Future()
+        self.queue.put((functools.partial(function, *args, **kwargs), future))
+        return future
+
+    def close(self):
+        """Stop the writer once the queued writes are committed."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        is_running = True
+        while is_running:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    is_running = False
+                    break
+                batch.append(item)
+
+            # The writer must survive a failing batch, otherwise all next writes would wait forever
+            try:
+                self._write(batch)
+            except Exception as e:
+                self._fail(batch, e)
+
+    @staticmethod
+    def _write(batch):
+        # Same connection for both databases
+        db = DatabaseDeck.get().db
+        results = []
+
+        with deferred_commits() as hooks:
+            if not db.in_transaction:
+                db.execute('BEGIN')
+
+            # Each write has its savepoint so that a failing one does not cancel the others
+            for function, future in batch:
+                db.execute('SAVEPOINT write')
+                nb_hooks = len(hooks)
+                try:
+                    results.append((future, function(), None))
+                except Exception as e:
+                    db.execute('ROLLBACK TO write')
+                    # Memory is not patched with the cancelled writes
+                    del hooks[nb_hooks:]
+                    results.append((future, None, e))
+                db.execute('RELEASE write')
+
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            hooks = []
+            results = [(future, None, e) for future, _, _ in results]
+
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                # The memory might be half patched, it is read again from the database
+                print(f'Database writer: memory patch failed ({e!r}).')
+                WriteQueue._clear_caches()
+
+        for future, result, exception in results:
+            if exception:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch, exception):
+        """Cancel what is left of a batch which failed outside of its writes."""
+        print(f'Database writer: batch of {len(batch)} writes failed ({exception!r}).')
+        try:
+            db = DatabaseDeck.get().db
+            if db.in_transaction:
+                db.rollback()
+            WriteQueue._clear_caches()
+        except Exception as e:
+            print(f'Database writer: cannot roll back the batch ({e!r}).')
+
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exception)
+
+    @staticmethod
+    def _clear_caches():
+        # Memory caches might have been patched by writes which are now lost
+        DatabasePersonality.get().clear_caches()
+        DatabaseDeck.get().clear_caches()
+
+
+def _load_and_call(database, method, *args, **kwargs):
+    database.load_memory()
+    return method(*args, **kwargs)
+
+
+class AsyncDatabaseProxy:
+    def __init__(self, get_database, async_database: AsyncDatabase):
+        self._get_database = get_database
+        self._async_database = async_database
+
+    def __getattr__(self, name):
+        readers, writer = self._async_database.open()
+        database = self._get_database()
+        method = getattr(database, name)
+
+        if getattr(method, 'is_memory', False):
+            is_memory_loaded = getattr(database, 'is_memory_loaded', None)
+
+            async def call_in_memory(*args, **kwargs):
+                if is_memory_loaded is None or is_memory_loaded():
+                    return method(*args, **kwargs)
+                # Loading reads the database (and rebuilds the search indexes), not in the event loop
+                return await asyncio.get_running_loop().run_in_executor(
+                    readers, functools.partial(_load_and_call, database, method, *args, **kwargs))
+            return call_in_memory
+
+        if getattr(method, 'is_write', False):
+            async def write(*args, **kwargs):
+                return await asyncio.wrap_future(writer.submit(method, *args, **kwargs))
+            return write
+
+        async def read(*args, **kwargs):
+            return await asyncio.get_running_loop().run_in_executor(readers,
+                                                                    functools.partial(method, *args, **kwargs))
+        return read
+
+
+class AsyncDatabase:
+    """Reader and writer threads are started on first use, and stopped by close."""
+
+    def __init__(self, nb_readers=4):
+        self.nb_readers = nb_readers
+        self.readers = None
+        self.writer = None
+        self._lock = threading.Lock()
+
+        self.deck = AsyncDatabaseProxy(DatabaseDeck.get, self)
+        self.personality = AsyncDatabaseProxy(DatabasePersonality.get, self)
+
+    def open(self):
+        """Start the threads if they are not running and return (readers, writer)."""
+        with self._lock:
+            if self.writer is None:
+                # Created before the writer: creating them commits (schema and indexes) on the connection of the thread
+                DatabaseDeck.get()
+                DatabasePersonality.get()
+
+                self.readers = ThreadPoolExecutor(max_workers=self.nb_readers, thread_name_prefix='database-reader')
+                self.writer = WriteQueue()
+
+            return self.readers, self.writer
+
+    async def write(self, function, *args, **kwargs):
+        """Run function on the writer thread, all its writes are committed (or cancelled) together."""
+        _, writer = self.open()
+        return await asyncio.wrap_future(writer.submit(function, *args, **kwargs))
+
+    def close(self):
+        """Stop the threads once the queued writes are committed."""
+        with self._lock:
+            if self.writer is not None:
+                self.readers.shutdown()
+                self.writer.close()
+                self.readers = None
+                self.writer = None
+
+
+db = AsyncDatabase()
@@ -5,9 +5,11 @@ import discord
 from discord.ext import commands, pages
 from discord.commands import slash_command, Option, permissions
 
-from database import DatabasePersonality, DatabaseDeck
+from async_database import db
 import utils
 
+PERSONALITIES_LIST_DESCRIPTION = 'Separated with "|", group if needed. Ex: Steve Carell|Jenna Fischer (The Office)'
+
 
 class Badge(commands.Cog):
     def __init__(self, bot):
@@ -20,7 +22,7 @@ class Badge(commands.Cog):
                    guild_ids=utils.get_authorized_guild_ids())
     @permissions.has_role("PersonalitiesWarsAdmin")
     async def create_badge(self, ctx, name: str, description: str = ''):
-        added = DatabaseDeck.get().add_badge(ctx.interaction.guild.id, name, description)
+        added = await db.deck.add_badge(ctx.interaction.guild.id, name, description)
         if not added:
             await ctx.respond('Error : the badge probably already exists.')
             msg = await ctx.interaction.original_message()
@@ -36,12 +38,12 @@ class Badge(commands.Cog):
     async def change_badge_name(self, ctx,
                                 old_name: Option(str, 'Pick a badge name', autocomplete=utils.badges_name_searcher),
                                 new_name: str):
-        id_badge = DatabaseDeck.get().get_id_badge(ctx.interaction.guild.id, old_name)
+        id_badge = await db.deck.get_id_badge(ctx.interaction.guild.id, old_name)
         if not id_badge:
             await ctx.respond(f'Badge {old_name} not found.')
             return
 
-        DatabaseDeck.get().set_badge_name(id_badge, new_name)
+        await db.deck.set_badge_name(id_badge, new_name)
         await ctx.respond(f'Change badge {old_name} to "{new_name}".')
         msg = await ctx.interaction.original_message()
         await msg.add_reaction(u"\u2705")
@@ -50,12 +52,12 @@ class Badge(commands.Cog):
                    guild_ids=utils.get_authorized_guild_ids())
     @permissions.has_role("PersonalitiesWarsAdmin")
     async def set_badge_description(self, ctx, name: Option(str, 'Pick a badge name', autocomplete=utils.badges_name_searcher), description: str):
-        id_badge = DatabaseDeck.get().get_id_badge(ctx.interaction.guild.id, name)
+        id_badge = await db.deck.get_id_badge(ctx.interaction.guild.id, name)
         if not id_badge:
             await ctx.respond(f'Badge {name} not found.')
             return
 
-        DatabaseDeck.get().set_badge_description(id_badge, description)
+        await db.deck.set_badge_description(id_badge, description)
         await ctx.respond(f'Change description of {name} badge to "{description}".')
         msg = await ctx.interaction.original_message()
         await msg.add_reaction(u"\u2705")
@@ -64,12 +66,12 @@ class Badge(commands.Cog):
                    guild_ids=utils.get_authorized_guild_ids())
     @permissions.has_role("PersonalitiesWarsAdmin")
     async def remove_badge(self, ctx, name: Option(str, 'Pick a badge name', autocomplete=utils.badges_name_searcher)):
-        id_badge = DatabaseDeck.get().get_id_badge(ctx.interaction.guild.id, name)
+        id_badge = await db.deck.get_id_badge(ctx.interaction.guild.id, name)
         if not id_badge:
             await ctx.respond(f'Badge {name} not found.')
             return
 
-        DatabaseDeck.get().remove_badge(id_badge)
+        await db.deck.remove_badge(id_badge)
         await ctx.respond(f'Badge {name} removed.')
         msg = await ctx.interaction.original_message()
         await msg.add_reaction(u"\u2705")
@@ -85,7 +87,7 @@ class Badge(commands.Cog):
                                                autocomplete=utils.personalities_group_searcher, required=False,
                                                default=None)):
 
-        id_badge = DatabaseDeck.get().get_id_badge(ctx.interaction.guild.id, badge_name)
+        id_badge = await db.deck.get_id_badge(ctx.interaction.guild.id, badge_name)
         if not id_badge:
             await ctx.respond(f'Badge {badge_name} not found.')
             return
@@ -95,9 +97,9 @@ class Badge(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(personality, group)
+            id_perso = await db.personality.get_perso_group_id(personality, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(personality)
+            id_perso = await db.personality.get_perso_id(personality)
 
         if not id_perso:
             msg = f'I searched everywhere for **{personality}**'
@@ -107,11 +109,11 @@ class Badge(commands.Cog):
             await ctx.respond(msg)
             return
 
-        if id_perso in DatabaseDeck.get().get_perso_in_badge(id_badge):
+        if id_perso in await db.deck.get_perso_in_badge(id_badge):
             await ctx.respond(f'Personnality {personality} is already in {badge_name}.')
             return
 
-        DatabaseDeck.get().add_perso_to_badge(id_badge, id_perso)
+        await db.deck.add_perso_to_badge(id_badge, id_perso)
         await ctx.respond(f'{personality} added to {badge_name}!')
         msg = await ctx.interaction.original_message()
         await msg.add_reaction(u"\u2705")
@@ -120,30 +122,28 @@ class Badge(commands.Cog):
                    guild_ids=utils.get_authorized_guild_ids())
     @permissions.has_role("PersonalitiesWarsAdmin")
     async def add_many_perso_to_badge(self, ctx,
-                                 badge_name: Option(str, 'Pick a badge name', autocomplete=utils.badges_name_searcher),
-                                 personalities: Option(str, 'Personalities separated with "|". Ex: Steve Carell|Jenna Fischer')):
-
-        id_badge = DatabaseDeck.get().get_id_badge(ctx.interaction.guild.id, badge_name)
-        if not id_badge:
-            await ctx.respond(f'Badge {badge_name} not found.')
-            return
-
-        personalities = [perso.strip() for perso in personalities.split('|')]
-        perso_not_found = []
-        perso_added = []
-
-        for personality in personalities:
-            id_perso = DatabasePersonality.get().get_perso_id(personality)
+                                      badge_name: Option(str, 'Pick a badge name',
+                                                         autocomplete=utils.badges_name_searcher),
+                                      personalities: Option(str, PERSONALITIES_LIST_DESCRIPTION)):
+        await self.edit_badge_personalities(ctx, badge_name, personalities, 'add')
 
-            if not id_perso:
-                perso_not_found.append(personality)
-            else:
-                DatabaseDeck.get().add_perso_to_badge(id_badge, id_perso)
-                perso_added.append(personality)
+    @slash_command(description='Remove personalities from a badge',
+                   guild_ids=utils.get_authorized_guild_ids())
+    @permissions.has_role("PersonalitiesWarsAdmin")
+    async def remove_many_perso_from_badge(self, ctx,
+                                           badge_name: Option(str, 'Pick a badge name',
+                                                              autocomplete=utils.badges_name_searcher),
+                                           personalities: Option(str, PERSONALITIES_LIST_DESCRIPTION)):
+        await self.edit_badge_personalities(ctx, badge_name, personalities, 'remove')
 
-        message = f'Added {", ".join(perso_added)}.' if perso_added else ''
-        message += f'\nCouln\'t find {", ".join(perso_not_found)}.' if perso_not_found else ''
-        await ctx.respond(message)
+    @slash_command(description='Replace all personalities of a badge',
+                   guild_ids=utils.get_authorized_guild_ids())
+    @permissions.has_role("PersonalitiesWarsAdmin")
+    async def set_badge_personalities(self, ctx,
+                                      badge_name: Option(str, 'Pick a badge name',
+                                                         autocomplete=utils.badges_name_searcher),
+                                      personalities: Option(str, PERSONALITIES_LIST_DESCRIPTION)):
+        await self.edit_badge_personalities(ctx, badge_name, personalities, 'set')
 
     @slash_command(description='Add a personality to a badge',
                    guild_ids=utils.get_authorized_guild_ids())
@@ -157,7 +157,7 @@ class Badge(commands.Cog):
                                                     autocomplete=utils.personalities_group_searcher, required=False,
                                                     default=None)):
 
-        id_badge = DatabaseDeck.get().get_id_badge(ctx.interaction.guild.id, badge_name)
+        id_badge = await db.deck.get_id_badge(ctx.interaction.guild.id, badge_name)
         if not id_badge:
             await ctx.respond(f'Badge {badge_name} not found.')
             return
@@ -167,9 +167,9 @@ class Badge(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(personality, group)
+            id_perso = await db.personality.get_perso_group_id(personality, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(personality)
+            id_perso = await db.personality.get_perso_id(personality)
 
         if not id_perso:
             msg = f'I searched everywhere for **{personality}**'
@@ -179,11 +179,11 @@ class Badge(commands.Cog):
             await ctx.respond(msg)
             return
 
-        if id_perso not in DatabaseDeck.get().get_perso_in_badge(id_badge):
+        if id_perso not in await db.deck.get_perso_in_badge(id_badge):
             await ctx.respond(f'Personnality {personality} is not in {badge_name}.')
             return
 
-        DatabaseDeck.get().remove_perso_from_badge(id_badge, id_perso)
+        await db.deck.remove_perso_from_badge(id_badge, id_perso)
         await ctx.respond(f'{personality} removed from {badge_name}.')
         msg = await ctx.interaction.original_message()
         await msg.add_reaction(u"\u2705")
@@ -192,86 +192,88 @@ class Badge(commands.Cog):
                    guild_ids=utils.get_authorized_guild_ids())
     async def show_badge(self, ctx,
                          badge_name: Option(str, 'Pick a badge name', autocomplete=utils.badges_name_searcher)):
-        id_badge = DatabaseDeck.get().get_id_badge(ctx.interaction.guild.id, badge_name)
+        id_badge = await db.deck.get_id_badge(ctx.interaction.guild.id, badge_name)
         if not id_badge:
             await ctx.respond(f'Badge {badge_name} not found.')
             return
 
-        badge = DatabaseDeck.get().get_badge_information(id_badge)
+        badge = await db.deck.get_badge_information(id_badge)
 
-        ids = DatabaseDeck.get().get_perso_in_badge(id_badge)
+        ids = await db.deck.get_perso_in_badge(id_badge)
 
         persos_text = []
-        personalities = DatabasePersonality.get().get_multiple_perso_information(ids)
-        if personalities:
-            for perso in personalities:
-                id_owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, perso['id'])
-                owner_txt = ''
-                if id_owner:
-                    owner = ctx.guild.get_member(id_owner)
-                    if owner:
-                        owner_txt = f' - {owner.name if not owner.nick else owner.nick}'
-                persos_text.append(f'**{perso["name"]}** *{perso["group"]}* {owner_txt}')
+        for perso in await db.deck.get_personalities_with_owners(ctx.guild.id, ids):
+            owner_txt = ''
+            if perso['id_owner']:
+                owner = ctx.guild.get_member(perso['id_owner'])
+                if owner:
+                    owner_txt = f' - {owner.name if not owner.nick else owner.nick}'
+            persos_text.append(f'**{perso["name"]}** *{perso["group"]}* {owner_txt}')
 
         persos_text.sort()
         if not persos_text:
             persos_text = ['This badge has no personality yet...']
 
-        id_owner = self.badge_belongs_to(ctx.guild.id, ids)
+        ranking = await db.deck.get_badge_ranking(id_badge)
+        id_owner = ranking['id_owner']
+
+        closest_text = []
+        for member in ranking['closest']:
+            closest = ctx.guild.get_member(member['id_member'])
+            if closest:
+                closest_text.append(f'{closest.name if not closest.nick else closest.nick} '
+                                    f'{member["owned"]}/{ranking["nb_perso"]}')
 
         nb_per_page = 20
-        persos_pages = []
+        owner = ctx.guild.get_member(id_owner) if id_owner else None
 
-        for i in range(0, len(persos_text), nb_per_page):
+        def build_page(page):
+            i = page * nb_per_page
             embed = discord.Embed(title=f'Badge {badge["name"]}', description=badge['description'])
             embed.add_field(name='Personalities', value='\n'.join([perso for perso in persos_text[i:i + nb_per_page]]))
-            if id_owner:
-                owner = ctx.guild.get_member(id_owner)
+            if closest_text and not id_owner:
+                embed.add_field(name='Closest members', value='\n'.join(closest_text))
+            if owner:
                 footer = f'Belongs to {owner.name if not owner.nick else owner.nick}'
                 if owner.avatar:
                     embed.set_footer(icon_url=owner.avatar.url, text=footer)
                 else:
                     embed.set_footer(text=footer)
 
-            persos_pages.append(embed)
+            return embed
 
-        paginator = pages.Paginator(pages=persos_pages, show_disabled=True, show_indicator=True)
+        paginator = utils.LazyPaginator(page_count=math.ceil(len(persos_text) / nb_per_page), build_page=build_page)
         await paginator.send(ctx)
 
     @slash_command(description='Show all personalities in this badge',
                    guild_ids=utils.get_authorized_guild_ids())
     async def badges_progression(self, ctx, member: Option(discord.Member, required=False, default=None)):
         owner = member or ctx.author
-        ids_deck = DatabaseDeck.get().get_user_deck(ctx.guild.id, owner.id)
-        badges = DatabaseDeck.get().get_all_badges_with_perso(ctx.guild.id)
+        badges = await db.deck.get_badges_progress(ctx.guild.id, owner.id)
 
         badges_text = []
-        if badges:
-            for badge_name in badges:
-                count = sum([id_perso in ids_deck for id_perso in badges[badge_name]])
-                nb_perso = len(badges[badge_name])
-                if count == nb_perso:
-                    badges_text.append(f'**{badge_name} {count}/{nb_perso} - Finished**')
-                else:
-                    badges_text.append(f'{badge_name} {count}/{nb_perso}')
+        for badge in badges:
+            if badge['owned'] == badge['nb_perso']:
+                badges_text.append(f'**{badge["name"]} {badge["owned"]}/{badge["nb_perso"]} - Finished**')
+            else:
+                badges_text.append(f'{badge["name"]} {badge["owned"]}/{badge["nb_perso"]}')
 
         badges_text.sort()
 
         nb_per_page = 20
-        badges_pages = []
 
-        for i in range(0, len(badges_text), nb_per_page):
-            embed = discord.Embed(title=f'Badges progression of {owner.name if not owner.nick else owner.nick}',
-                                  description='\n'.join([badge for badge in badges_text[i:i+nb_per_page]]))
-            badges_pages.append(embed)
+        def build_page(page):
+            i = page * nb_per_page
+            return discord.Embed(title=f'Badges progression of {owner.name if not owner.nick else owner.nick}',
+                                 description='\n'.join([badge for badge in badges_text[i:i+nb_per_page]]))
 
-        paginator = pages.Paginator(pages=badges_pages, show_disabled=True, show_indicator=True)
+        paginator = utils.LazyPaginator(page_count=math.ceil(len(badges_text) / nb_per_page), build_page=build_page)
         await paginator.send(ctx)
 
     @slash_command(description='Show all badges',
                    guild_ids=utils.get_authorized_guild_ids())
     async def list_badges(self, ctx):
-        badges = DatabaseDeck.get().get_all_badges(ctx.interaction.guild.id)
+        badges = await db.deck.get_all_badges(ctx.interaction.guild.id)
 
         badges_text = []
         if badges:
@@ -280,25 +282,57 @@ class Badge(commands.Cog):
         badges_text.sort()
 
         nb_per_page = 20
-        badges_pages = []
 
-        for i in range(0, len(badges_text), nb_per_page):
-            embed = discord.Embed(title=f'Badges',
-                                  description='\n'.join([badge for badge in badges_text[i:i+nb_per_page]]))
-            badges_pages.append(embed)
+        def build_page(page):
+            i = page * nb_per_page
+            return discord.Embed(title=f'Badges',
+                                 description='\n'.join([badge for badge in badges_text[i:i+nb_per_page]]))
 
-        paginator = pages.Paginator(pages=badges_pages, show_disabled=True, show_indicator=True)
+        paginator = utils.LazyPaginator(page_count=math.ceil(len(badges_text) / nb_per_page), build_page=build_page)
         await paginator.send(ctx)
 
-    def badge_belongs_to(self, id_server, ids_persos_badge):
-        id_members = DatabaseDeck.get().get_all_member(id_server)
+    @staticmethod
+    async def edit_badge_personalities(ctx, badge_name, personalities, action):
+        """Add, remove or set (action) the personalities separated with "|" in the badge, all at once.
+
+        Names not found or ambiguous are reported, and nothing is changed in this case when setting the badge.
+        """
+        id_badge = await db.deck.get_id_badge(ctx.interaction.guild.id, badge_name)
+        if not id_badge:
+            await ctx.respond(f'Badge {badge_name} not found.')
+            return
+
+        texts = [perso.strip() for perso in personalities.split('|') if perso.strip()]
+        resolved = await db.personality.resolve_personalities(texts)
+
+        errors = ''
+        if resolved['not_found']:
+            errors += f'\nCouldn\'t find {", ".join(resolved["not_found"])}.'
+        for text, candidates in resolved['ambiguous'].items():
+            errors += f'\n**{text}** is ambiguous, please write one of {" | ".join(candidates)}.'
 
-        for id_member in id_members:
-            ids_deck = DatabaseDeck.get().get_user_deck(id_server, id_member)
+        if action == 'set' and errors:
+            await ctx.respond(f'Nothing changed in {badge_name}.{errors}')
+            msg = await ctx.interaction.original_message()
+            await msg.add_reaction(u"\u274C")
+            return
 
-            count = sum([id_perso in ids_deck for id_perso in ids_persos_badge])
-            nb_perso = len(ids_persos_badge)
-            if 0 < nb_perso == count:
-                return id_member
+        if action == 'add':
+            added = await db.deck.add_persos_to_badge(id_badge, resolved['ids'])
+            message = f'Added {len(added)} personalities to {badge_name}'
+            if len(added) < len(resolved['ids']):
+                message += f' ({len(resolved["ids"]) - len(added)} already in it)'
+        elif action == 'remove':
+            removed = await db.deck.remove_persos_from_badge(id_badge, resolved['ids'])
+            message = f'Removed {len(removed)} personalities from {badge_name}'
+            if len(removed) < len(resolved['ids']):
+                message += f' ({len(resolved["ids"]) - len(removed)} were not in it)'
+        else:
+            changes = await db.deck.set_badge_persos(id_badge, resolved['ids'])
+            message = f'{badge_name} now has {len(resolved["ids"])} personalities ' \
+                      f'({len(changes["added"])} added, {len(changes["removed"])} removed)'
 
-        return None
+        # Discord messages are limited to 2000 characters
+        await ctx.respond(f'{message}.{errors}'[:2000])
+        msg = await ctx.interaction.original_message()
+        await msg.add_reaction(u"\u2705")
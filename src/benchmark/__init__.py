@@ -0,0 +1,13 @@
+"""
+Reproducible benchmarks of the database layer (DatabaseDeck and DatabasePersonality).
+
+Synthetic databases are generated from a seed at several scales, then the hot methods are timed on them
+and the results written to a JSON report. The queries run by each method are also checked with
+EXPLAIN QUERY PLAN: a query reading a whole table instead of searching an index is reported as a full scan.
+Two reports can be compared to find regressions.
+
+Usage (from the src folder):
+    python -m benchmark run --scales small medium --output report.json
+    python -m benchmark compare before.json after.json
+    python -m benchmark generate medium --directory data
+"""
@@ -0,0 +1,67 @@
+import argparse
+import json
+import sys
+
+from benchmark import compare, generator, runner
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Benchmarks of the database layer.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Time the hot methods and write a JSON report')
+    run_parser.add_argument('--scales', nargs='+', choices=list(generator.SCALES), default=['small', 'medium'])
+    run_parser.add_argument('--calls', type=int, default=200, help='Timed calls of each method')
+    run_parser.add_argument('--rounds', type=int, default=5, help='Rounds the calls are split in')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--data', default='./benchmark_data', help='Folder of the generated databases')
+    run_parser.add_argument('--output', default='benchmark_report.json')
+    run_parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if a query reads a whole table')
+
+    compare_parser = commands.add_parser('compare', help='Compare two reports, exit with an error on regressions')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.25, help='Slowdown ratio (0.25 for 25%%)')
+    compare_parser.add_argument('--min-delta', type=float, default=5.0, help='Slowdown ignored below (us)')
+    compare_parser.add_argument('--no-normalize', action='store_true',
+                                help='Do not correct the timings by the speed of the machines (reference timing)')
+
+    generate_parser = commands.add_parser('generate', help='Only generate the databases of a scale')
+    generate_parser.add_argument('scale', choices=list(generator.SCALES))
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--directory', required=True)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        report = runner.run(args.scales, args.data, args.calls, args.rounds, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Report written to {args.output}.')
+
+        scans = [(scale, scan) for scale, results in report['scales'].items() for scan in results['full_scans']]
+        for scale, scan in scans:
+            print(f'Full scan in {scan["method"]} ({scale}): {scan["detail"]}\n    {scan["query"]}')
+        if args.fail_on_scan and scans:
+            sys.exit(1)
+
+    elif args.command == 'compare':
+        with open(args.old, 'r') as f:
+            old = json.load(f)
+        with open(args.new, 'r') as f:
+            new = json.load(f)
+
+        rows = compare.compare(old, new, args.threshold, args.min_delta, not args.no_normalize)
+        print(compare.describe(rows))
+        regressions = [row for row in rows if row['status'] == 'regression']
+        if regressions:
+            print(f'{len(regressions)} regressions.')
+            sys.exit(1)
+
+    else:
+        generator.generate(args.directory, generator.SCALES[args.scale], args.seed)
+
+
+if __name__ == '__main__':
+    main()
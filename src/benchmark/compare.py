@@ -0,0 +1,59 @@
+"""
+Comparison of two benchmark reports.
+"""
+
+
+def compare(old, new, threshold=0.25, min_delta_us=5.0, normalize=True):
+    """Return [{scale, method, old_us, new_us, ratio, status}] comparing the medians of the methods in both reports.
+
+    A method is a regression if its median is more than threshold slower (0.25 for 25%) and at least min_delta_us
+    slower, so that the noise of the fastest methods is ignored. A full scan not in the old report is a regression.
+    With normalize, old timings are scaled by the ratio of the reference timings of the reports,
+    to compare runs on machines (or moments) of different speeds.
+    """
+    rows = []
+    for scale, new_results in new['scales'].items():
+        old_results = old['scales'].get(scale)
+        if old_results is None:
+            continue
+
+        speed = 1
+        if normalize and old_results.get('reference_us') and new_results.get('reference_us'):
+            speed = new_results['reference_us'] / old_results['reference_us']
+
+        for method, result in new_results['methods'].items():
+            old_result = old_results['methods'].get(method)
+            if old_result is None:
+                rows.append({'scale': scale, 'method': method, 'old_us': None, 'new_us': result['median_us'],
+                             'ratio': None, 'status': 'new'})
+                continue
+
+            old_us = old_result['median_us'] * speed
+            new_us = result['median_us']
+            ratio = new_us / old_us if old_us else float('inf')
+            status = 'unchanged'
+            if ratio > 1 + threshold and new_us - old_us >= min_delta_us:
+                status = 'regression'
+            elif ratio < 1 / (1 + threshold) and old_us - new_us >= min_delta_us:
+                status = 'improvement'
+            rows.append({'scale': scale, 'method': method, 'old_us': old_us, 'new_us': new_us,
+                         'ratio': ratio, 'status': status})
+
+        old_scans = {(scan['method'], scan['detail']) for scan in old_results.get('full_scans', [])}
+        for scan in new_results.get('full_scans', []):
+            if (scan['method'], scan['detail']) not in old_scans:
+                rows.append({'scale': scale, 'method': f'{scan["method"]} ({scan["detail"]})', 'old_us': None,
+                             'new_us': None, 'ratio': None, 'status': 'regression'})
+
+    return rows
+
+
+def describe(rows):
+    """Return the comparison as a text table."""
+    lines = [f'{"scale":<8} {"method":<45} {"old (us)":>10} {"new (us)":>10} {"ratio":>7}  status']
+    for row in rows:
+        old_us = f'{row["old_us"]:.1f}' if row['old_us'] is not None else '-'
+        new_us = f'{row["new_us"]:.1f}' if row['new_us'] is not None else '-'
+        ratio = f'{row["ratio"]:.2f}' if row['ratio'] is not None else '-'
+        lines.append(f'{row["scale"]:<8} {row["method"]:<45} {old_us:>10} {new_us:>10} {ratio:>7}  {row["status"]}')
+    return '\n'.join(lines)
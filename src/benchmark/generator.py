@@ -0,0 +1,174 @@
+"""
+Generation of synthetic personalities and deck databases.
+
+The same configuration and seed always generate the same databases.
+"""
+
+import json
+import os
+import random
+import sqlite3
+
+from database import DatabaseDeck
+
+SRC_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Schema of database_personality.db
+PERSONALITY_SCHEMA = '''
+CREATE TABLE Personality (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+CREATE TABLE Groups (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+CREATE TABLE PersoGroups (id_groups INT, id_perso INT, PRIMARY KEY (id_groups, id_perso));
+CREATE TABLE Image (url TEXT, id_perso INT, PRIMARY KEY (url, id_perso));
+'''
+
+# deck_distribution is 'exponential' (many small decks and a few big ones) or 'uniform' (0 to twice the mean)
+SCALES = {
+    'small': {'personalities': 2000, 'groups': 100, 'images_per_perso': 3, 'guilds': 5, 'members_per_guild': 50,
+              'deck_mean': 20, 'deck_distribution': 'exponential', 'wishlist_max': 5,
+              'badges_per_guild': 10, 'persos_per_badge': 20},
+    'medium': {'personalities': 20000, 'groups': 1000, 'images_per_perso': 3, 'guilds': 20, 'members_per_guild': 200,
+               'deck_mean': 50, 'deck_distribution': 'exponential', 'wishlist_max': 10,
+               'badges_per_guild': 30, 'persos_per_badge': 30},
+    'large': {'personalities': 100000, 'groups': 5000, 'images_per_perso': 3, 'guilds': 20, 'members_per_guild': 500,
+              'deck_mean': 100, 'deck_distribution': 'exponential', 'wishlist_max': 10,
+              'badges_per_guild': 50, 'persos_per_badge': 50},
+}
+
+SYLLABLES = ['ji', 'min', 'soo', 'yeon', 'ha', 'eun', 'woo', 'seo', 'jin', 'na', 'young', 'hyun', 'da', 'bin',
+             'chae', 'ri', 'so', 'mi', 'kyung', 'hee', 'jae', 'won', 'sung', 'yu', 'ah', 'rin', 'tae', 'ho']
+
+
+def _name(rng, nb_syllables):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(nb_syllables)).capitalize()
+
+
+def generate(directory, config, seed=0):
+    """Create database_personality.db and database_deck.db in directory (replaced if they exist).
+
+    Return the data useful to the benchmark: {servers: {id_server: [id_member]}, badges: {id_server: [id_badge]}}.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for filename in ('database_personality.db', 'database_deck.db'):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(os.path.join(directory, filename + suffix)):
+                os.remove(os.path.join(directory, filename + suffix))
+
+    #### Personalities ####
+
+    groups = {}
+    while len(groups) < config['groups']:
+        groups.setdefault(f'{_name(rng, rng.randint(1, 3))} {rng.randint(1, 99)}', len(groups) + 1)
+
+    names = set()
+    personalities = []
+    while len(personalities) < config['personalities']:
+        name = f'{_name(rng, rng.randint(2, 3))} {_name(rng, 1)}'
+        if name not in names:
+            names.add(name)
+            personalities.append((len(personalities) + 1, name))
+
+    # Some personalities have several groups, a few have none (they are never rolled)
+    links = []
+    images = []
+    for id_perso, _ in personalities:
+        for id_group in rng.sample(range(1, config['groups'] + 1), rng.choices([0, 1, 2], [2, 90, 8])[0]):
+            links.append((id_group, id_perso))
+        for number in range(rng.randint(1, 2 * config['images_per_perso'] - 1)):
+            images.append((f'https://images.example/{id_perso}/{number}.jpg', id_perso))
+
+    db = sqlite3.connect(os.path.join(directory, 'database_personality.db'))
+    db.executescript(PERSONALITY_SCHEMA)
+    db.executemany('''INSERT INTO Groups(name, id) VALUES (?, ?)''', groups.items())
+    db.executemany('''INSERT INTO Personality(id, name) VALUES (?, ?)''', personalities)
+    db.executemany('''INSERT INTO PersoGroups(id_groups, id_perso) VALUES (?, ?)''', links)
+    db.executemany('''INSERT INTO Image(url, id_perso) VALUES (?, ?)''', images)
+    db.commit()
+    db.close()
+
+    #### Decks ####
+
+    images_by_perso = {}
+    for url, id_perso in images:
+        images_by_perso.setdefault(id_perso, []).append(url)
+
+    servers = {}
+    badges = {}
+    deck = []
+    wishlist = []
+    badge_rows = []
+    badge_persos = []
+    for id_server in range(1, config['guilds'] + 1):
+        members = [id_server * 100000 + number for number in range(config['members_per_guild'])]
+        servers[id_server] = members
+
+        # A personality is owned by one member of the server at most
+        free_persos = list(range(1, config['personalities'] + 1))
+        rng.shuffle(free_persos)
+        for id_member in members:
+            if config['deck_distribution'] == 'uniform':
+                size = rng.randint(0, 2 * config['deck_mean'])
+            else:
+                size = int(rng.expovariate(1 / config['deck_mean']))
+            for _ in range(min(size, len(free_persos))):
+                id_perso = free_persos.pop()
+                current_image = rng.choice(images_by_perso[id_perso]) if rng.random() < 0.1 else None
+                deck.append((id_server, id_perso, id_member, current_image))
+
+            for id_perso in rng.sample(range(1, config['personalities'] + 1), rng.randint(0, config['wishlist_max'])):
+                wishlist.append((id_server, id_perso, id_member))
+
+        badges[id_server] = []
+        for number in range(config['badges_per_guild']):
+            id_badge = len(badge_rows) + 1
+            badges[id_server].append(id_badge)
+            badge_rows.append((id_badge, f'Badge {number}', id_server))
+            for id_perso in rng.sample(range(1, config['personalities'] + 1), config['persos_per_badge']):
+                badge_persos.append((id_badge, id_perso))
+
+    db = sqlite3.connect(os.path.join(directory, 'database_deck.db'))
+    with open(os.path.join(SRC_DIRECTORY, 'create_database_deck.sql'), 'r') as f:
+        db.executescript(f.read())
+    # The schema is already the latest one, as in DatabaseDeck.create_if_not_exist
+    db.execute(f'''PRAGMA user_version = {len(DatabaseDeck._migrations())}''')
+    db.executemany('''INSERT INTO Server(id) VALUES (?)''', [(id_server,) for id_server in servers])
+    db.executemany('''INSERT INTO Member(id) VALUES (?)''',
+                   [(id_member,) for members in servers.values() for id_member in members])
+    db.executemany('''INSERT INTO MemberInformation(id_server, id_member) VALUES (?, ?)''',
+                   [(id_server, id_member) for id_server, members in servers.items() for id_member in members])
+    db.executemany('''INSERT INTO Deck(id_server, id_perso, id_member, current_image_url) VALUES (?, ?, ?, ?)''',
+                   deck)
+    db.executemany('''INSERT OR IGNORE INTO Wishlist(id_server, id_perso, id_member) VALUES (?, ?, ?)''', wishlist)
+    db.executemany('''INSERT INTO Badge(id, name, id_server) VALUES (?, ?, ?)''', badge_rows)
+    db.executemany('''INSERT INTO BadgePerso(id_badge, id_perso) VALUES (?, ?)''', badge_persos)
+    db.execute('''INSERT INTO BadgeProgress(id_badge, id_member, id_server, owned)
+                  SELECT B.id, D.id_member, B.id_server, COUNT(*)
+                  FROM Badge AS B
+                  JOIN BadgePerso AS BP ON BP.id_badge = B.id
+                  JOIN Deck AS D ON D.id_server = B.id_server AND D.id_perso = BP.id_perso
+                  WHERE D.id_member IS NOT NULL
+                  GROUP BY B.id, D.id_member''')
+    db.commit()
+    db.close()
+
+    data = {'servers': servers, 'badges': badges}
+    with open(os.path.join(directory, 'benchmark.json'), 'w') as f:
+        json.dump({'config': config, 'seed': seed, 'data': data}, f)
+
+    return data
+
+
+def load_or_generate(directory, config, seed=0):
+    """Return the data of the databases in directory, generated again if their configuration or seed changed."""
+    try:
+        with open(os.path.join(directory, 'benchmark.json'), 'r') as f:
+            generated = json.load(f)
+        if generated['config'] == config and generated['seed'] == seed:
+            data = generated['data']
+            # Keys are strings in json
+            return {'servers': {int(id_server): members for id_server, members in data['servers'].items()},
+                    'badges': {int(id_server): ids for id_server, ids in data['badges'].items()}}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    return generate(directory, config, seed)
@@ -0,0 +1,195 @@
+"""
+Timing of the hot methods of the database layer on generated databases.
+"""
+
+import datetime
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import time
+
+from benchmark import generator
+from database import DatabaseDeck, DatabasePersonality
+
+
+def deck_name_search(id_server, id_member, text):
+    """Same work as utils.deck_name_searcher (the autocompletion of the deck names) without discord."""
+    ids = DatabaseDeck.get().get_user_deck(id_server, id_member)
+    personalities = DatabasePersonality.get().get_multiple_perso_information(ids) or []
+    return [perso['name'] for perso in personalities if text.lower() in perso['name'].lower()]
+
+
+def hot_methods(data, rng):
+    """Return [(name, function, arguments factory)] of the methods to time."""
+    deck = DatabaseDeck.get()
+    personality = DatabasePersonality.get()
+
+    with personality.catalog.lock:
+        names = [perso['name'] for perso in personality.catalog.personalities.values()]
+        groups = list(personality.catalog.groups.values())
+    members = [(id_server, id_member) for id_server, ids in data['servers'].items() for id_member in ids]
+    nb_persos = len(names)
+
+    def perso():
+        return rng.randint(1, nb_persos)
+
+    def member():
+        return rng.choice(members)
+
+    def server():
+        return rng.choice(list(data['servers']))
+
+    def typed(texts):
+        """Beginning of a name, as typed in an autocompleted option."""
+        return rng.choice(texts)[:rng.randint(1, 5)]
+
+    return [
+        ('personality.get_random_perso_id', personality.get_random_perso_id, lambda: ()),
+        ('personality.get_perso_information', personality.get_perso_information, lambda: (perso(),)),
+        ('personality.get_multiple_perso_information', personality.get_multiple_perso_information,
+         lambda: ([perso() for _ in range(20)],)),
+        ('personality.search_personalities', personality.search_personalities, lambda: (typed(names),)),
+        ('personality.search_groups', personality.search_groups, lambda: (typed(groups),)),
+        ('deck.get_user_deck', deck.get_user_deck, member),
+        ('deck.get_deck_page', deck.get_deck_page, member),
+        ('deck.count_deck', deck.count_deck, member),
+        ('deck.get_wishlist', deck.get_wishlist, member),
+        ('deck.get_badges_progress', deck.get_badges_progress, member),
+        ('deck.get_all_badges_with_perso', deck.get_all_badges_with_perso, lambda: (server(),)),
+        ('deck.get_perso_current_image', deck.get_perso_current_image, lambda: (server(), perso())),
+        ('deck.perso_belongs_to', deck.perso_belongs_to, lambda: (server(), perso())),
+        ('deck.get_owners', deck.get_owners, lambda: (server(), [perso() for _ in range(20)])),
+        ('deck.get_roll_context', deck.get_roll_context, lambda: (server(), perso())),
+        ('deck_name_searcher', deck_name_search, lambda: (*member(), typed(names))),
+    ]
+
+
+def full_scans(db, statements):
+    """Return [{detail, query}] for the plan steps of the statements reading a whole table."""
+    scans = []
+    for statement in statements:
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+            continue
+        details = [step[3] for step in db.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()]
+        # Virtual tables (json_each) and subqueries results are not tables of the databases
+        subqueries = {detail.split()[1] for detail in details if detail.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+        for detail in details:
+            if detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail and 'CONSTANT ROW' not in detail \
+                    and not detail.startswith('SCAN (subquery') and detail.split()[1] not in subqueries:
+                scans.append({'detail': detail, 'query': ' '.join(statement.split())})
+    return scans
+
+
+def reference():
+    """Fixed work timed with the methods, to compare reports of machines or runs of different speeds."""
+    sum(range(2000))
+
+
+def statistics_us(rounds):
+    """Return the statistics of the durations (in microseconds) of each round.
+
+    The median is the best median of the rounds: the rounds of all methods are interleaved,
+    so a machine slower for a while does not slow down only some methods.
+    """
+    durations = sorted(duration for durations in rounds for duration in durations)
+    return {'calls': len(durations),
+            'mean_us': statistics.fmean(durations),
+            'median_us': min(statistics.median(durations) for durations in rounds),
+            'p95_us': durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+            'min_us': durations[0]}
+
+
+def time_calls(function, arguments):
+    """Return the durations in microseconds of the calls of function with each arguments."""
+    durations = []
+    for args in arguments:
+        start = time.perf_counter_ns()
+        function(*args)
+        durations.append((time.perf_counter_ns() - start) / 1000)
+    return durations
+
+
+def run_scale(name, directory, calls=200, rounds=5, seed=0):
+    """Generate (if needed) the databases of the scale in directory and return its results.
+
+    Each method is called calls times, split in rounds.
+    """
+    config = generator.SCALES[name]
+    start = time.perf_counter()
+    data = generator.load_or_generate(directory, config, seed)
+    generation_s = time.perf_counter() - start
+
+    # Default paths of the databases are relative, they are the generated ones from the directory
+    os.chdir(directory)
+    DatabasePersonality.get().connect('./database_personality.db')
+    DatabaseDeck.get().connect('./database_deck.db')
+
+    personality = DatabasePersonality.get()
+    start = time.perf_counter()
+    personality.catalog
+    catalog_load_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    personality.refresh_search_indexes()
+    search_indexes_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(seed)
+    personality.seed_rolls(seed)
+    db = DatabaseDeck.get().db
+
+    methods = hot_methods(data, rng)
+    scans = []
+    for method, function, make_arguments in methods:
+        # Queries of a few calls are kept to check their plans, out of the timings
+        statements = []
+        db.set_trace_callback(statements.append)
+        for _ in range(5):
+            function(*make_arguments())
+        db.set_trace_callback(None)
+
+        scans += [{'method': method, **scan} for scan in full_scans(db, dict.fromkeys(statements))]
+
+    # Same arguments in each round, and in each run with the same seed
+    calls_per_round = max(calls // rounds, 1)
+    arguments = {method: [make_arguments() for _ in range(calls_per_round)] for method, _, make_arguments in methods}
+
+    # method: [durations of each round]
+    durations = {method: [] for method, _, _ in methods}
+    durations['reference'] = []
+    for _ in range(rounds):
+        durations['reference'].append(time_calls(reference, [()] * calls_per_round))
+        for method, function, _ in methods:
+            durations[method].append(time_calls(function, arguments[method]))
+
+    results = {method: statistics_us(method_durations) for method, method_durations in durations.items()}
+    for method, result in results.items():
+        print(f'{name:>8} {method:<45} median {result["median_us"]:9.1f}us p95 {result["p95_us"]:9.1f}us')
+
+    return {'config': config,
+            'setup': {'generation_s': generation_s, 'catalog_load_ms': catalog_load_ms,
+                      'search_indexes_ms': search_indexes_ms},
+            'reference_us': results.pop('reference')['median_us'],
+            'methods': results,
+            # Same scan found with other arguments only once
+            'full_scans': list({(scan['method'], scan['detail']): scan for scan in scans}.values())}
+
+
+def run(scales, data_directory, calls=200, rounds=5, seed=0):
+    """Return the report of the scales, the databases being generated in data_directory/scale."""
+    data_directory = os.path.abspath(data_directory)
+    working_directory = os.getcwd()
+
+    report = {'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'sqlite': sqlite3.sqlite_version,
+              'platform': platform.platform(),
+              'seed': seed,
+              'scales': {}}
+    try:
+        for name in scales:
+            report['scales'][name] = run_scale(name, os.path.join(data_directory, name), calls, rounds, seed)
+    finally:
+        os.chdir(working_directory)
+
+    return report
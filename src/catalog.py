@@ -0,0 +1,220 @@
+"""
+In-memory copy of the personalities database.
+
+The catalog is loaded once from the personalities database and then patched by the write methods
+of DatabasePersonality, once their writes are committed. Each change increases its version so that derived structures can know when to rebuild
+(names_version only changes with personalities and groups, not with images).
+Patches and full iterations hold the lock because the catalog is shared by the database threads.
+"""
+
+import random
+import threading
+from collections import defaultdict
+
+
+class RollSampler:
+    """Uniform draw of rollable personalities (the ones with a group) in constant time."""
+
+    def __init__(self, seed=None):
+        self.ids = []
+        # id_perso: index in ids
+        self.positions = {}
+        self.random = random.Random(seed)
+
+    def seed(self, seed):
+        """Seed the draws to get a reproducible sequence of rolls (None to seed from the system)."""
+        self.random.seed(seed)
+
+    def add(self, id_perso):
+        if id_perso in self.positions:
+            return
+        self.positions[id_perso] = len(self.ids)
+        self.ids.append(id_perso)
+
+    def remove(self, id_perso):
+        """Replace the removed id with the last one to keep the array dense."""
+        position = self.positions.pop(id_perso, None)
+        if position is None:
+            return
+
+        last = self.ids.pop()
+        if last != id_perso:
+            self.ids[position] = last
+            self.positions[last] = position
+
+    def clear(self):
+        self.ids.clear()
+        self.positions.clear()
+
+    def choice(self):
+        """Return a random id or None if there is nothing to roll."""
+        if not self.ids:
+            return None
+        return self.ids[self.random.randrange(len(self.ids))]
+
+
+class PersonalityCatalog:
+    def __init__(self):
+        self.version = 0
+        self.names_version = 0
+        self.is_loaded = False
+        self.lock = threading.RLock()
+
+        # id_perso: {id, name, groups=[id_group]}
+        self.personalities = {}
+        # id_group: name
+        self.groups = {}
+        # id_perso: sorted urls
+        self.images = {}
+        # lower name: [id_perso] (ascending)
+        self.ids_by_name = defaultdict(list)
+        # lower group name: id_group
+        self.group_ids_by_name = {}
+        # id_group: [id_perso]
+        self.members = defaultdict(list)
+        self.sampler = RollSampler()
+
+    def load(self, db):
+        """(Re)load the whole catalog from the personalities database connection."""
+        c = db.cursor()
+        c.execute('''SELECT id, name FROM Groups''')
+        groups = c.fetchall()
+        c.execute('''SELECT id, name FROM Personality ORDER BY id ASC''')
+        personalities = c.fetchall()
+        c.execute('''SELECT id_perso, id_groups FROM PersoGroups''')
+        links = c.fetchall()
+        c.execute('''SELECT id_perso, url FROM Image''')
+        images = c.fetchall()
+        c.close()
+
+        with self.lock:
+            self._clear()
+
+            for id_group, name in groups:
+                self._set_group(id_group, name)
+
+            for id_perso, name in personalities:
+                self._set_personality(id_perso, name)
+
+            for id_perso, id_group in links:
+                self._link(id_perso, id_group)
+
+            for id_perso, url in images:
+                self.images.setdefault(id_perso, []).append(url)
+
+            for urls in self.images.values():
+                urls.sort()
+
+            self.is_loaded = True
+            self.version += 1
+            self.names_version += 1
+
+    def invalidate(self):
+        """Force a full reload on next access."""
+        self.is_loaded = False
+
+    #### Patches ####
+
+    def add_personality(self, id_perso, name, id_group):
+        """Return False if the group is unknown (the catalog needs a reload), True otherwise."""
+        with self.lock:
+            if id_group not in self.groups:
+                return False
+
+            if id_perso not in self.personalities:
+                self._set_personality(id_perso, name)
+            self._link(id_perso, id_group)
+            self.version += 1
+            self.names_version += 1
+            return True
+
+    def remove_personality(self, id_perso):
+        with self.lock:
+            perso = self.personalities.get(id_perso)
+
+            if perso:
+                self.sampler.remove(id_perso)
+
+                for id_group in perso['groups']:
+                    self.members[id_group].remove(id_perso)
+
+                ids = self.ids_by_name[perso['name'].lower()]
+                ids.remove(id_perso)
+                if not ids:
+                    del self.ids_by_name[perso['name'].lower()]
+
+            # Removed last so that lookups never find an id without its personality
+            self.images.pop(id_perso, None)
+            self.personalities.pop(id_perso, None)
+
+            self.version += 1
+            self.names_version += 1
+
+    def add_image(self, id_perso, url):
+        with self.lock:
+            urls = self.images.setdefault(id_perso, [])
+            if url not in urls:
+                self.images[id_perso] = sorted(urls + [url])
+            self.version += 1
+
+    def remove_image(self, id_perso, url):
+        with self.lock:
+            urls = self.images.get(id_perso, [])
+            if url in urls:
+                self.images[id_perso] = [other for other in urls if other != url]
+            self.version += 1
+
+    #### Lookups ####
+
+    def get_perso_ids(self, name):
+        return self.ids_by_name.get(name.lower(), [])
+
+    def get_group_id(self, name):
+        return self.group_ids_by_name.get(name.lower())
+
+    def get_perso_information(self, id_perso):
+        """Return personality information with its first group or None if it has no group."""
+        perso = self.personalities.get(id_perso)
+        if not perso or not perso['groups']:
+            return None
+
+        return {'id': id_perso, 'name': perso['name'], 'group': self.groups[perso['groups'][0]]}
+
+    def get_perso_memberships(self, id_perso):
+        """Return one dict {id, name, group} by group of the personality."""
+        perso = self.personalities.get(id_perso)
+        if not perso:
+            return []
+
+        return [{'id': id_perso, 'name': perso['name'], 'group': self.groups[id_group]}
+                for id_group in perso['groups']]
+
+    #### Utilities functions ####
+
+    def _clear(self):
+        self.personalities.clear()
+        self.groups.clear()
+        self.images.clear()
+        self.ids_by_name.clear()
+        self.group_ids_by_name.clear()
+        self.members.clear()
+        self.sampler.clear()
+
+    def _set_group(self, id_group, name):
+        self.groups[id_group] = name
+        self.group_ids_by_name.setdefault(name.lower(), id_group)
+
+    def _set_personality(self, id_perso, name):
+        self.personalities[id_perso] = {'id': id_perso, 'name': name, 'groups': []}
+        ids = self.ids_by_name[name.lower()]
+        ids.append(id_perso)
+        ids.sort()
+
+    def _link(self, id_perso, id_group):
+        perso = self.personalities.get(id_perso)
+        if not perso or id_group not in self.groups or id_group in perso['groups']:
+            return
+
+        perso['groups'].append(id_group)
+        self.members[id_group].append(id_perso)
+        self.sampler.add(id_perso)
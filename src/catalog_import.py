@@ -0,0 +1,41 @@
+"""
+Bulk import of personalities from a catalog dump (CSV or JSON) into the personalities database.
+
+See catalog_sync for the dumps and how they are applied.
+
+Usage (the bot catalog must be reloaded afterwards, the /import_catalog command does it):
+    python catalog_import.py dump.csv [--database ./database_personality.db] [--dry-run]
+"""
+
+import argparse
+import sqlite3
+import time
+
+from catalog_sync import apply_changes, compute_changes, describe, parse_dump
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a catalog dump into the personalities database.')
+    parser.add_argument('dump', help='CSV or JSON file')
+    parser.add_argument('--format', choices=['csv', 'json'], help='Format of the dump (default: file extension)')
+    parser.add_argument('--database', default='./database_personality.db')
+    parser.add_argument('--dry-run', action='store_true', help='Only show the changes')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.dump, 'r', encoding='utf-8') as f:
+        entries = parse_dump(f.read(), args.format or args.dump.rsplit('.', 1)[-1].lower())
+
+    db = sqlite3.connect(args.database, timeout=30)
+    changes = compute_changes(db, entries)
+    if not args.dry_run:
+        with db:
+            apply_changes(db.cursor(), changes)
+    db.close()
+
+    print(f'{len(entries)} personalities read, {describe(changes)}'
+          f'{" (dry run)" if args.dry_run else ""} in {time.perf_counter() - start:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()
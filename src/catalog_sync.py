@@ -0,0 +1,172 @@
+"""
+Synchronization of the personalities database with a catalog dump (CSV or JSON).
+
+The dump is compared with the database and only the differences are written, by batches in one transaction,
+so importing the same dump again does nothing. A personality of the dump is found by its id if given,
+otherwise by its name. Its name, groups and images become the ones of the dump:
+    - new groups and personalities are created,
+    - a personality with an id and another name is renamed,
+    - groups and images not in the dump are removed from the personality.
+      Groups (or images) are kept as they are if the dump has no column for them.
+Personalities missing from the dump are kept (use /remove_personality to remove them).
+
+Dumps:
+    - CSV with the columns name, group, image and optionally id. A personality may span several rows,
+      one for each group and image.
+    - JSON list of {name, groups, images} objects with an optional id ("group" and "image" also accepted).
+
+The bot imports dumps with /import_catalog, catalog_import.py imports them from the command line.
+"""
+
+import csv
+import io
+import json
+
+
+def parse_dump(text, dump_format):
+    """Return the entries [{id, name, groups, images}] of a dump, dump_format being 'csv' or 'json'.
+
+    groups (or images) is None if the dump has no column for them (no key in any object of the personality).
+    """
+    if dump_format == 'csv':
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif dump_format == 'json':
+        rows = json.loads(text)
+    else:
+        raise ValueError(f'Unknown dump format {dump_format}.')
+
+    # id or name: entry, rows of the same personality are merged
+    entries = {}
+    for number, row in enumerate(rows, 1):
+        name = (row.get('name') or '').strip()
+        if not name:
+            raise ValueError(f'Row {number} has no name.')
+
+        id_perso = int(row['id']) if str(row.get('id') or '').strip() else None
+        entry = entries.setdefault(id_perso or name, {'id': id_perso, 'name': name, 'groups': None, 'images': None})
+        if entry['name'] != name:
+            raise ValueError(f'Personality {id_perso} is named both {entry["name"]} and {name}.')
+
+        for key, values in (('groups', _values(row, 'groups', 'group')), ('images', _values(row, 'images', 'image'))):
+            if values is None:
+                continue
+            if entry[key] is None:
+                entry[key] = []
+            for value in values:
+                if value not in entry[key]:
+                    entry[key].append(value)
+
+    return list(entries.values())
+
+
+def _values(row, plural, singular):
+    """Return the values of the column, None if the row does not have it."""
+    values = row.get(plural, row.get(singular))
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return [value.strip() for value in values if value and value.strip()]
+
+
+def compute_changes(db, entries):
+    """Return the changes to apply to the database (a connection) to match the entries.
+
+    Ids of the new groups and personalities are chosen here so that all changes are known before writing.
+    Raise ValueError if the names of the personalities would not be unique anymore.
+    """
+    c = db.cursor()
+    c.execute('''SELECT id, name FROM Groups''')
+    groups = c.fetchall()
+    c.execute('''SELECT id, name FROM Personality''')
+    personalities = dict(c.fetchall())
+    c.execute('''SELECT id_perso, id_groups FROM PersoGroups''')
+    links = set(c.fetchall())
+    c.execute('''SELECT id_perso, url FROM Image''')
+    images = set(c.fetchall())
+    c.close()
+
+    changes = {'groups': [], 'personalities': [], 'renamed': [],
+               'links_added': [], 'links_removed': [], 'images_added': [], 'images_removed': []}
+
+    # Groups are found without case, like the catalog does
+    group_ids = {name.lower(): id_group for id_group, name in groups}
+    next_id_group = max(group_ids.values(), default=0) + 1
+    for entry in entries:
+        for group in entry['groups'] or []:
+            if group.lower() not in group_ids:
+                group_ids[group.lower()] = next_id_group
+                changes['groups'].append((next_id_group, group))
+                next_id_group += 1
+
+    ids_by_name = {name: id_perso for id_perso, name in personalities.items()}
+    next_id_perso = max(personalities, default=0) + 1
+    # id_perso: name once the dump is applied
+    names = dict(personalities)
+    ids_perso = []
+    seen_ids = set()
+    for entry in entries:
+        id_perso = entry['id'] or ids_by_name.get(entry['name']) or next_id_perso
+        next_id_perso = max(next_id_perso, id_perso + 1)
+
+        if id_perso in seen_ids:
+            raise ValueError(f'Personality {entry["name"]} ({id_perso}) is twice in the dump.')
+        if id_perso not in personalities:
+            changes['personalities'].append((id_perso, entry['name']))
+        elif personalities[id_perso] != entry['name']:
+            changes['renamed'].append((entry['name'], id_perso))
+
+        names[id_perso] = entry['name']
+        ids_perso.append(id_perso)
+        seen_ids.add(id_perso)
+
+    if len(set(names.values())) != len(names):
+        ids_by_new_name = {}
+        for id_perso, name in names.items():
+            ids_by_new_name.setdefault(name, []).append(id_perso)
+        raise ValueError('Names would not be unique anymore: ' +
+                         ', '.join(f'{name} {ids}' for name, ids in ids_by_new_name.items() if len(ids) > 1))
+
+    links_by_perso = {}
+    for id_perso, id_group in links:
+        links_by_perso.setdefault(id_perso, set()).add(id_group)
+    images_by_perso = {}
+    for id_perso, url in images:
+        images_by_perso.setdefault(id_perso, set()).add(url)
+
+    for id_perso, entry in zip(ids_perso, entries):
+        # Without their column in the dump, groups or images are kept
+        if entry['groups'] is not None:
+            old_groups = links_by_perso.get(id_perso, set())
+            new_groups = {group_ids[group.lower()] for group in entry['groups']}
+            changes['links_added'] += [(id_group, id_perso) for id_group in new_groups - old_groups]
+            changes['links_removed'] += [(id_group, id_perso) for id_group in old_groups - new_groups]
+
+        if entry['images'] is not None:
+            old_images = images_by_perso.get(id_perso, set())
+            new_images = set(entry['images'])
+            changes['images_added'] += [(url, id_perso) for url in new_images - old_images]
+            changes['images_removed'] += [(url, id_perso) for url in old_images - new_images]
+
+    return changes
+
+
+def apply_changes(c, changes):
+    """Write the changes with the cursor, without commit."""
+    c.executemany('''INSERT INTO Groups(id, name) VALUES (?, ?)''', changes['groups'])
+    # Names are unique, the renamed personalities lose their name first in case they exchange them
+    c.executemany('''UPDATE Personality SET name = NULL WHERE id = ?''',
+                  [(id_perso,) for _, id_perso in changes['renamed']])
+    c.executemany('''UPDATE Personality SET name = ? WHERE id = ?''', changes['renamed'])
+    c.executemany('''INSERT INTO Personality(id, name) VALUES (?, ?)''', changes['personalities'])
+    c.executemany('''DELETE FROM PersoGroups WHERE id_groups = ? AND id_perso = ?''', changes['links_removed'])
+    c.executemany('''INSERT INTO PersoGroups(id_groups, id_perso) VALUES (?, ?)''', changes['links_added'])
+    c.executemany('''DELETE FROM Image WHERE url = ? AND id_perso = ?''', changes['images_removed'])
+    c.executemany('''INSERT INTO Image(url, id_perso) VALUES (?, ?)''', changes['images_added'])
+
+
+def describe(changes):
+    return f'{len(changes["groups"])} new groups, {len(changes["personalities"])} new personalities, ' \
+           f'{len(changes["renamed"])} renamed, ' \
+           f'{len(changes["links_added"])} groups added and {len(changes["links_removed"])} removed, ' \
+           f'{len(changes["images_added"])} images added and {len(changes["images_removed"])} removed'
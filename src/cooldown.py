@@ -0,0 +1,128 @@
+"""
+In-memory state of rolls and claims of members, to know if they can roll or claim without any database access.
+
+The state of a member is read from database on first use, then updated in memory
+and written behind: the write is queued to the database writer without waiting for it.
+The database stays the reference (it computes the same values), so a restart only reloads it.
+"""
+
+import asyncio
+import collections
+import time
+
+from async_database import db
+
+
+def now():
+    """Return the current UTC timestamp in seconds."""
+    return int(time.time())
+
+
+def next_rolls_reset():
+    """Return the timestamp of the next rolls reset (the next UTC hour)."""
+    return (now() // 3600 + 1) * 3600
+
+
+def minutes_until_claim(last_claim, claim_interval):
+    """Return the minutes until the next claim after last_claim (0 if the member can claim now)."""
+    if not last_claim:
+        return 0
+
+    minutes_since_last_claim = (now() - last_claim) // 60
+    return max(claim_interval - minutes_since_last_claim, 0)
+
+
+class CooldownTable:
+    # Members kept in memory, the least recently used ones are forgotten first (they are read again if needed)
+    MAX_MEMBERS = 10000
+
+    def __init__(self, max_members=MAX_MEMBERS):
+        self.max_members = max_members
+        # (id_server, id_member): {last_roll, nb_rolls, last_claim} with timestamps, least recently used first
+        self.members = collections.OrderedDict()
+        # Writes not committed yet, kept to not be garbage collected
+        self.pending_writes = set()
+        # (id_server, id_member): number of writes not committed yet, these members are not forgotten
+        self.pending_members = collections.Counter()
+
+    async def get(self, id_server, id_member):
+        """Return {last_roll, nb_rolls, last_claim} of the member, nb_rolls being the rolls of the current hour."""
+        key = (id_server, id_member)
+        state = self.members.get(key)
+
+        if state is None:
+            cooldown = await db.deck.get_member_cooldown(id_server, id_member)
+            # Might have been loaded by another command meanwhile
+            state = self.members.setdefault(key, cooldown)
+            self._forget_least_recently_used(key)
+        self.members.move_to_end(key)
+
+        if state['last_roll'] is None or state['last_roll'] // 3600 != now() // 3600:
+            state['nb_rolls'] = 0
+
+        return state
+
+    def try_register_roll(self, id_server, id_member, max_rolls):
+        """Count a roll if the member has rolls left this hour and return the rolls before it, None otherwise.
+
+        The member must have just been loaded by get (without await in between). Checking and counting
+        without await keeps the commands of the member running at the same time from all passing the check.
+        """
+        state = self.members[(id_server, id_member)]
+        if state['nb_rolls'] >= max_rolls:
+            return None
+
+        nb_rolls = state['nb_rolls']
+        state['nb_rolls'] += 1
+        state['last_roll'] = now()
+        self._write_behind(id_server, id_member, db.deck.record_roll(id_server, id_member))
+        return nb_rolls
+
+    def try_register_claim(self, id_server, id_member, claim_interval):
+        """Record a claim if the member can claim and return 0, otherwise the minutes until the next claim.
+
+        The member must have just been loaded by get, see try_register_roll. Only the memory is updated,
+        the database is by DatabaseDeck.add_to_deck.
+        """
+        state = self.members[(id_server, id_member)]
+        minutes = minutes_until_claim(state['last_claim'], claim_interval)
+        if minutes == 0:
+            state['last_claim'] = now()
+        return minutes
+
+    async def flush(self):
+        """Wait for the pending writes."""
+        if self.pending_writes:
+            await asyncio.gather(*self.pending_writes, return_exceptions=True)
+
+    def _forget_least_recently_used(self, key):
+        """Forget members until there are at most max_members, except key and the members with pending writes.
+
+        Their database state does not have the pending writes yet, it would be read without them.
+        """
+        nb_forgotten = len(self.members) - self.max_members
+        for old_key in list(self.members):
+            if nb_forgotten <= 0:
+                break
+            if old_key != key and old_key not in self.pending_members:
+                del self.members[old_key]
+                nb_forgotten -= 1
+
+    def _write_behind(self, id_server, id_member, write):
+        task = asyncio.ensure_future(write)
+        self.pending_writes.add(task)
+        self.pending_members[(id_server, id_member)] += 1
+
+        def done(task):
+            self.pending_writes.discard(task)
+            self.pending_members[(id_server, id_member)] -= 1
+            if self.pending_members[(id_server, id_member)] == 0:
+                del self.pending_members[(id_server, id_member)]
+            # Reload the member from database if the write failed
+            if task.cancelled() or task.exception():
+                self.members.pop((id_server, id_member), None)
+
+        task.add_done_callback(done)
+
+
+cooldowns = CooldownTable()
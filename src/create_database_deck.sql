@@ -15,9 +15,9 @@ id INT PRIMARY KEY
 CREATE TABLE MemberInformation (
 id_server INT,
 id_member INT,
-last_claim TEXT DEFAULT NULL, -- date %Y-%m-%d %H:%M:%S
+last_claim_at INT DEFAULT NULL, -- UTC timestamp in seconds
 nb_rolls INT DEFAULT 0,
-last_roll TEXT DEFAULT NULL, -- date %Y-%m-%d %H:%M:%S
+last_roll_at INT DEFAULT NULL, -- UTC timestamp in seconds
 max_wish INT DEFAULT 5,
 id_perso_profile INT DEFAULT NULL, -- Perso shown on profile
 FOREIGN KEY (id_server) REFERENCES Server(id),
@@ -29,12 +29,14 @@ CREATE TABLE Deck (
 id_server INT,
 id_perso INT,
 id_member INT,
-current_image INT DEFAULT 0,
+current_image_url TEXT DEFAULT NULL, -- Image shown for the personality, NULL for the first one
 FOREIGN KEY (id_server) REFERENCES Server(id),
 FOREIGN KEY (id_member) REFERENCES Member(id),
 PRIMARY KEY (id_server, id_perso)
 );
 
+CREATE INDEX DeckMember ON Deck(id_server, id_member, id_perso);
+
 CREATE TABLE Wishlist (
 id_server INT,
 id_perso INT,
@@ -44,6 +46,8 @@ FOREIGN KEY (id_member) REFERENCES Member(id),
 PRIMARY KEY (id_server, id_perso, id_member)
 );
 
+CREATE INDEX WishlistMember ON Wishlist(id_server, id_member, id_perso);
+
 CREATE TABLE ShoppingList (
 id_server INT,
 id_perso INT,
@@ -53,6 +57,8 @@ FOREIGN KEY (id_member) REFERENCES Member(id),
 PRIMARY KEY (id_server, id_perso, id_member)
 );
 
+CREATE INDEX ShoppingListMember ON ShoppingList(id_server, id_member, id_perso);
+
 CREATE TABLE Badge (
 id INTEGER PRIMARY KEY,
 name TEXT,
@@ -67,4 +73,35 @@ id_badge INT,
 id_perso INT,
 FOREIGN KEY (id_badge) REFERENCES Badge(id),
 PRIMARY KEY (id_badge, id_perso)
-);
\ No newline at end of file
+);
+
+CREATE INDEX BadgePersoPerso ON BadgePerso(id_perso, id_badge);
+
+-- Number of personalities of each badge owned by a member, kept up to date by the deck writes
+CREATE TABLE BadgeProgress (
+id_badge INT,
+id_member INT,
+id_server INT,
+owned INT DEFAULT 0,
+FOREIGN KEY (id_badge) REFERENCES Badge(id),
+FOREIGN KEY (id_member) REFERENCES Member(id),
+FOREIGN KEY (id_server) REFERENCES Server(id),
+PRIMARY KEY (id_badge, id_member)
+);
+
+CREATE INDEX BadgeProgressMember ON BadgeProgress(id_server, id_member);
+CREATE INDEX BadgeProgressRanking ON BadgeProgress(id_badge, owned);
+
+-- Append-only log of the claims, read by time range and pruned after a retention period
+CREATE TABLE ClaimEvent (
+id INTEGER PRIMARY KEY,
+id_server INT,
+id_perso INT,
+id_member INT,
+claimed_at INT, -- UTC timestamp in seconds
+FOREIGN KEY (id_server) REFERENCES Server(id),
+FOREIGN KEY (id_member) REFERENCES Member(id)
+);
+
+CREATE INDEX ClaimEventServerTime ON ClaimEvent(id_server, claimed_at);
+CREATE INDEX ClaimEventTime ON ClaimEvent(claimed_at);
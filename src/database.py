@@ -6,9 +6,116 @@ These classes provide functions to access to data in personalities and member da
 
 from __future__ import annotations
 
+import contextlib
+import json
+import os
+import re
 import sqlite3
+import threading
+import time
 from collections import defaultdict
 
+import catalog_sync
+from catalog import PersonalityCatalog
+from search import SearchIndex
+
+
+def write_method(method):
+    """Mark a method which writes in the database (run on the writer thread by the asynchronous layer)."""
+    method.is_write = True
+    return method
+
+
+def memory_method(method):
+    """Mark a method answered from memory (run directly in the event loop by the asynchronous layer).
+
+    While is_memory_loaded() of its database is False, the call runs on a reader thread after load_memory(),
+    as loading reads the database.
+    """
+    method.is_memory = True
+    return method
+
+
+# Must match the defaults of the Server table
+DEFAULT_SERVER_CONFIGURATION = {'claim_interval': 180, 'time_to_claim': 15, 'rolls_per_hour': 5,
+                                'information_channel': None, 'claims_channel': None}
+# Must match the default of the MemberInformation table
+DEFAULT_MAX_WISH = 5
+
+_batch = threading.local()
+
+
+@contextlib.contextmanager
+def deferred_commits():
+    """Database methods called by this thread within the block do not commit, the caller commits the batch.
+
+    Yield the list of functions given to after_commit meanwhile, for the caller to run them once committed.
+    """
+    _batch.active = True
+    _batch.hooks = []
+    try:
+        yield _batch.hooks
+    finally:
+        _batch.active = False
+        _batch.hooks = None
+
+
+def after_commit(function):
+    """Run function once the current writes are committed (right away out of a batch, they already are).
+
+    Memory caches are patched this way, so that they never show writes which are rolled back afterwards.
+    """
+    hooks = getattr(_batch, 'hooks', None)
+    if hooks is None:
+        function()
+    else:
+        hooks.append(function)
+
+
+class Connections:
+    """One connection by thread to the same database file (sqlite connections cannot be shared between threads).
+
+    Other database files can be attached to the connections with their schema name, to be joined in queries.
+    """
+
+    def __init__(self, filename, attached=None):
+        self.filename = filename
+        # schema name: filename
+        self.attached = dict(attached or {})
+        self.generation = 0
+        self.local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        local = self.local
+        if getattr(local, 'generation', None) != self.generation:
+            if getattr(local, 'db', None):
+                local.db.close()
+            local.db = sqlite3.connect(self.filename, timeout=30)
+            # WAL lets readers work while a write transaction is running
+            local.db.execute('PRAGMA journal_mode=WAL')
+            for schema, filename in self.attached.items():
+                local.db.execute('ATTACH DATABASE ? AS ?', (filename, schema))
+                local.db.execute(f'PRAGMA {schema}.journal_mode=WAL')
+            local.generation = self.generation
+        return local.db
+
+    def reset(self, filename=None, attached=None):
+        """Use other files, connections of each thread are replaced on their next use."""
+        if getattr(self.local, 'db', None):
+            self.local.db.close()
+            self.local.db = None
+        if filename:
+            self.filename = filename
+        if attached:
+            self.attached.update(attached)
+        self.generation += 1
+
+
+# Both databases are used through the same connections: the deck database with the personalities one attached,
+# so that queries can join them. A transaction writing in both is only atomic in each file (WAL).
+# Personality tables have distinct names so they are found without the schema name.
+_connections = Connections('./database_deck.db', attached={'personality': './database_personality.db'})
+
 
 class DatabasePersonality:
     __instance = None
@@ -23,196 +130,295 @@ class DatabasePersonality:
         """Virtually private constructor."""
         if DatabasePersonality.__instance is None:
             DatabasePersonality.__instance = self
-            self.db = sqlite3.connect('./database_personality.db')
+            self._connections = _connections
+            self._catalog = PersonalityCatalog()
+            self._name_index = None
+            self._group_index = None
+            self._indexes_version = None
+            self._memory_lock = threading.Lock()
+            self.create_indexes_if_not_exist()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """Connection of the current thread."""
+        return self._connections.get()
 
     def connect(self, filename):
-        if self.db:
-            self.db.close()
-        self.db = sqlite3.connect(filename)
+        self._connections.reset(attached={'personality': filename})
+        self.clear_caches()
+        self.create_indexes_if_not_exist()
 
-    def get_all_personalities(self):
-        """Return all personalities with [0] = name and [1] = group."""
+    def create_indexes_if_not_exist(self):
+        """Index the groups of each personality, read when deck queries join the personalities database."""
         c = self.db.cursor()
-        c.execute(f'''SELECT P.name, G.name
-                             FROM Personality AS P
-                             JOIN PersoGroups AS PG ON PG.id_perso = P.id
-                             JOIN Groups AS G ON PG.id_groups = G.id''')
-        personalities = c.fetchall()
+        c.execute('''CREATE INDEX IF NOT EXISTS personality.PersoGroupsPerso ON PersoGroups(id_perso, id_groups)''')
+        self._commit()
         c.close()
 
+    def clear_caches(self):
+        """Forget the catalog (it will be read again)."""
+        self._catalog.invalidate()
+
+    def is_memory_loaded(self):
+        """Return True if the catalog is loaded and the search indexes are up to date."""
+        return self._catalog.is_loaded and self._indexes_version == self._catalog.names_version
+
+    def load_memory(self):
+        """Load the catalog and rebuild the search indexes if they are outdated."""
+        # Threads needing the memory at the same time wait for one load
+        with self._memory_lock:
+            if self._indexes_version != self.catalog.names_version:
+                self.refresh_search_indexes()
+
+    def _commit(self):
+        if not getattr(_batch, 'active', False):
+            self.db.commit()
+
+    def _patch_catalog(self, patch):
+        """Call patch(catalog) once the writes are committed, if the catalog is loaded (or it reads them)."""
+        def apply():
+            # A load in progress holds the lock, it might have read the database before the commit
+            with self._catalog.lock:
+                if self._catalog.is_loaded:
+                    patch(self._catalog)
+
+        after_commit(apply)
+
+    @property
+    def catalog(self) -> PersonalityCatalog:
+        """Return the in-memory catalog, loaded on first access."""
+        if not self._catalog.is_loaded:
+            with self._catalog.lock:
+                if not self._catalog.is_loaded:
+                    self._catalog.load(self.db)
+        return self._catalog
+
+    def refresh_search_indexes(self):
+        """Rebuild the autocompletion indexes from the catalog."""
+        catalog = self.catalog
+        with catalog.lock:
+            names = [perso['name'] for perso in catalog.personalities.values() if perso['groups']]
+            groups = self.get_all_groups()
+            version = catalog.names_version
+        self._name_index = SearchIndex(names)
+        self._group_index = SearchIndex(groups)
+        self._indexes_version = version
+
+    @memory_method
+    def search_personalities(self, text, limit=25):
+        """Return names of personalities matching text, best matches first."""
+        if self._indexes_version != self.catalog.names_version:
+            self.refresh_search_indexes()
+        return self._name_index.search(text, limit)
+
+    @memory_method
+    def search_groups(self, text, limit=25):
+        """Return names of groups matching text, best matches first."""
+        if self._indexes_version != self.catalog.names_version:
+            self.refresh_search_indexes()
+        return self._group_index.search(text, limit)
+
+    @memory_method
+    def get_all_personalities(self):
+        """Return all personalities with [0] = name and [1] = group."""
+        with self.catalog.lock:
+            personalities = [{'name': perso['name'], 'group': self.catalog.groups[id_group]}
+                             for perso in self.catalog.personalities.values()
+                             for id_group in perso['groups']]
+
         if not personalities:
             return None
 
-        return [{'name': perso[0], 'group': perso[1]} for perso in personalities]
+        return personalities
 
+    @memory_method
     def get_perso_ids_containing_name(self, name):
-        c = self.db.cursor()
-        c.execute('''SELECT P.id FROM Personality AS P WHERE P.name LIKE ? COLLATE NOCASE''', (f'%{name}%',))
-        results = c.fetchall()
-        c.close()
-
-        ids = [r[0] for r in results]
-
-        return ids
+        name = name.lower()
+        with self.catalog.lock:
+            return [perso['id'] for perso in self.catalog.personalities.values() if name in perso['name'].lower()]
 
+    @memory_method
     def get_perso_id(self, name):
-        c = self.db.cursor()
-        c.execute('''SELECT P.id FROM Personality AS P WHERE P.name = ? COLLATE NOCASE''', (name,))
-        results = c.fetchone()
-        c.close()
-
-        return results[0] if results else None
+        ids = self.catalog.get_perso_ids(name)
+        return ids[0] if ids else None
 
+    @memory_method
     def get_group_id(self, name):
-        c = self.db.cursor()
-        c.execute('''SELECT G.id FROM Groups AS G WHERE G.name = ? COLLATE NOCASE''', (name,))
-        results = c.fetchone()
-        c.close()
-
-        return results[0] if results else None
+        return self.catalog.get_group_id(name)
 
+    @memory_method
     def get_perso_group_id(self, name, group):
         """Return the personality with name and group or None otherwise."""
-        c = self.db.cursor()
-        c.execute('''SELECT P.id FROM Personality AS P
-                     JOIN PersoGroups AS PG ON PG.id_perso = P.id 
-                     JOIN Groups AS G ON PG.id_groups = G.id
-                     WHERE G.name = ? COLLATE NOCASE
-                     AND P.name = ? COLLATE NOCASE''', (group, name))
-        id_perso = c.fetchone()
-        c.close()
-
-        return id_perso[0] if id_perso else None
-
+        id_group = self.catalog.get_group_id(group)
+
+        with self.catalog.lock:
+            for id_perso in self.catalog.get_perso_ids(name):
+                if id_group in self.catalog.personalities[id_perso]['groups']:
+                    return id_perso
+
+        return None
+
+    @memory_method
+    def resolve_personalities(self, texts):
+        """Find the personality of each text, a name or "name (group)".
+
+        Return {ids, not_found, ambiguous} with ids in the order of texts (without duplicates), the texts not found
+        and {text: ["name (group)"]} for the names of several personalities (one for each of their groups).
+        """
+        ids = []
+        not_found = []
+        ambiguous = {}
+
+        catalog = self.catalog
+        with catalog.lock:
+            for text in texts:
+                ids_perso = catalog.get_perso_ids(text)
+                group_match = re.fullmatch(r'(.+?)\s*\(([^()]+)\)', text)
+                # Names with parenthesis are kept as they are
+                if not ids_perso and group_match:
+                    id_group = catalog.get_group_id(group_match.group(2).strip())
+                    ids_perso = [id_perso for id_perso in catalog.get_perso_ids(group_match.group(1))
+                                 if id_group in catalog.personalities[id_perso]['groups']]
+
+                if not ids_perso:
+                    not_found.append(text)
+                elif len(ids_perso) > 1:
+                    ambiguous[text] = [f'{catalog.personalities[id_perso]["name"]} ({catalog.groups[id_group]})'
+                                       for id_perso in ids_perso
+                                       for id_group in catalog.personalities[id_perso]['groups']]
+                elif ids_perso[0] not in ids:
+                    ids.append(ids_perso[0])
+
+        return {'ids': ids, 'not_found': not_found, 'ambiguous': ambiguous}
+
+    @memory_method
     def get_all_groups(self):
         """Return all groups."""
-        c = self.db.cursor()
-        c.execute('''SELECT G.name
-                     FROM Groups AS G
-                     ORDER BY G.name ASC''')
-        results = c.fetchall()
-        c.close()
-
-        group = [r[0].title() for r in results]
-
-        return group
+        with self.catalog.lock:
+            return [name.title() for name in sorted(self.catalog.groups.values())]
 
+    @memory_method
     def get_group_members(self, group_name):
         """Return all group members with dict {name, members=[]}."""
-        c = self.db.cursor()
-        c.execute('''SELECT G.name, P.name FROM Personality AS P
-                     JOIN PersoGroups AS PG ON PG.id_perso = P.id 
-                     JOIN Groups AS G ON PG.id_groups = G.id
-                     WHERE G.name LIKE ? COLLATE NOCASE
-                     ORDER BY P.name ASC''', (f'%{group_name}%',))
-        results = c.fetchall()
-        c.close()
+        group_name = group_name.lower()
+        with self.catalog.lock:
+            results = sorted(((self.catalog.personalities[id_perso]['name'], name)
+                              for id_group, name in self.catalog.groups.items() if group_name in name.lower()
+                              for id_perso in self.catalog.members.get(id_group, [])))
 
         group = {}
 
         if results:
             # Name is used to get the right case of the group
-            group['name'] = results[0][0]
-            group['members'] = [r[1] for r in results]
+            group['name'] = results[0][1]
+            group['members'] = [r[0] for r in results]
 
         return group
 
+    @memory_method
     def get_random_perso_id(self):
-        """Return random personality id."""
-        c = self.db.cursor()
-        c.execute('''SELECT Personality.id
-                     FROM Personality
-                     ORDER BY RANDOM() LIMIT 1''')
-        random_perso = c.fetchall()
-        c.close()
+        """Return random personality id among the ones with a group, or None if there is none."""
+        return self.catalog.sampler.choice()
 
-        # first [0] for the number of result (here only 1 because LIMIT)
-        # second [0] for the column in result (here only 1 -> Personality.id)
-        return random_perso[0][0]
+    @memory_method
+    def seed_rolls(self, seed):
+        """Make random personalities reproducible (None to go back to system randomness)."""
+        self.catalog.sampler.seed(seed)
 
+    @memory_method
     def get_perso_information(self, id_perso):
         """Return personality information with dict {name, group, image} format."""
-        c = self.db.cursor()
-        c.execute('''SELECT P.id, P.name, G.name
-                     FROM Personality AS P
-                     JOIN PersoGroups AS PG ON PG.id_perso = P.id
-                     JOIN Groups AS G ON PG.id_groups = G.id
-                     WHERE P.id = ?''', (id_perso,))
-        perso = c.fetchone()
-        c.close()
-
-        if not perso:
-            return None
-
-        return {'id': perso[0], 'name': perso[1], 'group': perso[2]}
+        return self.catalog.get_perso_information(id_perso)
 
+    @memory_method
     def get_multiple_perso_information(self, ids_perso):
-        """Return personalities information with dict {name, group} format."""
-        c = self.db.cursor()
-        c.execute(f'''SELECT P.id, P.name, G.name
-                             FROM Personality AS P
-                             JOIN PersoGroups AS PG ON PG.id_perso = P.id
-                             JOIN Groups AS G ON PG.id_groups = G.id
-                             WHERE P.id IN ({', '.join(['?' for _ in ids_perso])})''', ids_perso)
-        personalities = c.fetchall()
-        c.close()
+        """Return personalities information with dict {id, name, group} format, or None if none is found.
+
+        Personalities are in the order of ids_perso (duplicates removed) with one dict by group.
+        They are read from the catalog, so the number of ids is not limited by the SQL variables.
+        """
+        with self.catalog.lock:
+            personalities = [perso for id_perso in dict.fromkeys(ids_perso)
+                             for perso in self.catalog.get_perso_memberships(id_perso)]
 
         if not personalities:
             return None
 
-        return [{'id': perso[0], 'name': perso[1],
-                 'group': perso[2]} for perso in personalities]
+        return personalities
 
+    @memory_method
     def get_perso_all_images(self, id_perso):
-        c = self.db.cursor()
-        c.execute('''SELECT url
-                     FROM Image
-                     WHERE id_perso = ?''', (id_perso,))
-        urls = c.fetchall()
-        c.close()
-        urls = [url[0] for url in urls]
-        return sorted(urls)
+        return list(self.catalog.images.get(id_perso, []))
 
+    @write_method
     def add_personality(self, name, id_group, url):
         c = self.db.cursor()
         c.execute(''' INSERT OR IGNORE INTO Personality(name) VALUES (?) ''', (name,))
-        id_perso = self.get_perso_id(name)
+        id_perso = c.lastrowid if c.rowcount == 1 else self.get_perso_id(name)
         c.execute(''' INSERT OR IGNORE INTO PersoGroups(id_groups, id_perso) VALUES (?, ?) ''',
                   (id_group, id_perso,))
-        self.add_image(id_perso, url)
-        self.db.commit()
+        self._commit()
         c.close()
 
+        def add(catalog):
+            if not catalog.add_personality(id_perso, name, id_group):
+                catalog.invalidate()
+
+        self._patch_catalog(add)
+
+        self.add_image(id_perso, url)
+
+    @write_method
+    def import_catalog(self, entries, dry_run=False):
+        """Apply the entries of a catalog dump (see catalog_import) in one transaction and return the changes.
+
+        Call clear_caches once committed: the catalog is not patched, it has to be reloaded.
+        """
+        changes = catalog_sync.compute_changes(self.db, entries)
+
+        if not dry_run:
+            c = self.db.cursor()
+            catalog_sync.apply_changes(c, changes)
+            self._commit()
+            c.close()
+
+        return changes
+
+    @write_method
     def remove_personality(self, id_perso):
+        """Remove the personality with its groups and images.
+
+        Remove what references it in the deck database first (DatabaseDeck.remove_perso_references) and wait
+        for it: a transaction is only atomic in each database file, so each file is written by its own commit
+        and a stop in between only leaves a personality without owners.
+        """
         c = self.db.cursor()
         c.execute(''' DELETE FROM Personality WHERE id = ? ''', (id_perso,))
         c.execute(''' DELETE FROM PersoGroups WHERE id_perso = ? ''', (id_perso,))
         c.execute(''' DELETE FROM Image WHERE id_perso = ? ''', (id_perso,))
-        self.db.commit()
+        self._commit()
         c.close()
 
-        # TODO:  <<!! WARNING !!>> This does not handle multiple server <<!! WARNING !!>>
-        # Quick dirty hack to not create multiple functions in DatabaseDeck
-        c = DatabaseDeck.get().db.cursor()
-        c.execute(''' DELETE FROM Deck WHERE id_perso = ? ''', (id_perso,))
-        c.execute(''' DELETE FROM Wishlist WHERE id_perso = ? ''', (id_perso,))
-        c.execute(''' DELETE FROM ShoppingList WHERE id_perso = ? ''', (id_perso,))
-        c.execute(''' DELETE FROM BadgePerso WHERE id_perso = ? ''', (id_perso,))
-        DatabaseDeck.get().db.commit()
-        c.close()
+        self._patch_catalog(lambda catalog: catalog.remove_personality(id_perso))
 
+    @write_method
     def add_image(self, id_perso, url):
         c = self.db.cursor()
         c.execute(''' INSERT OR IGNORE INTO Image(url, id_perso) VALUES (?, ?) ''', (url, id_perso,))
-        self.db.commit()
+        self._commit()
         c.close()
 
+        self._patch_catalog(lambda catalog: catalog.add_image(id_perso, url))
+
+    @write_method
     def remove_image(self, id_perso, url):
         c = self.db.cursor()
         c.execute(''' DELETE FROM Image WHERE url = ? AND id_perso = ? ''', (url, id_perso,))
-        self.db.commit()
+        self._commit()
         c.close()
 
+        self._patch_catalog(lambda catalog: catalog.remove_image(id_perso, url))
+
 
 class DatabaseDeck:
     __instance = None
@@ -227,8 +433,14 @@ class DatabaseDeck:
         """Virtually private constructor."""
         if DatabaseDeck.__instance is None:
             DatabaseDeck.__instance = self
-            self.db = sqlite3.connect('./database_deck.db')
+            self._connections = _connections
+            # id_server: configuration
+            self._servers_configuration = {}
+            self._servers_loaded = False
+            self._servers_lock = threading.Lock()
+            self._known_servers = set()
             self.create_if_not_exist()
+            self.upgrade_schema()
 
     def create_if_not_exist(self):
         c = self.db.cursor()
@@ -236,51 +448,288 @@ class DatabaseDeck:
         c.execute('''SELECT count(name) FROM sqlite_master WHERE type='table' AND name='Server' ''')
 
         if c.fetchone()[0] != 1:
-            with open('create_database_deck.sql', 'r') as f:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_database_deck.sql'), 'r') as f:
                 print("Creating database deck schema...")
                 query = f.read()
 
                 c = self.db.cursor()
                 c.executescript(query)
+                # The schema is already the latest one
+                c.execute(f'''PRAGMA user_version = {len(self._migrations())}''')
                 self.db.commit()
                 c.close()
 
+    @staticmethod
+    def _migrations():
+        """Return the schema migrations in order, the schema version being the number of migrations applied.
+
+        Append new migrations at the end, and change create_database_deck.sql accordingly for new databases.
+        The first ones also check the schema because they were applied without version by older versions.
+        """
+        return [DatabaseDeck.upgrade_member_dates,
+                DatabaseDeck.create_badge_progress_if_not_exist,
+                DatabaseDeck.create_claim_events_if_not_exist,
+                DatabaseDeck.upgrade_current_images,
+                DatabaseDeck.create_member_indexes]
+
+    def upgrade_schema(self):
+        """Apply the migrations not applied yet (PRAGMA user_version), each one committed with its version."""
+        migrations = self._migrations()
+
+        c = self.db.cursor()
+        c.execute('''PRAGMA user_version''')
+        version = c.fetchone()[0]
+
+        for version, migration in enumerate(migrations[version:], version + 1):
+            c.execute('BEGIN')
+            try:
+                migration(c)
+                c.execute(f'''PRAGMA user_version = {version}''')
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+
+        c.execute('''PRAGMA table_info(MemberInformation)''')
+        self._has_member_dates = 'last_claim' in {column[1] for column in c.fetchall()}
+        c.close()
+
+    @staticmethod
+    def upgrade_member_dates(c):
+        """Add the timestamp columns replacing the local dates of MemberInformation in old databases.
+
+        The existing dates are converted afterwards by convert_member_dates.
+        """
+        c.execute('''PRAGMA table_info(MemberInformation)''')
+        columns = {column[1] for column in c.fetchall()}
+
+        if 'last_claim_at' not in columns:
+            print("Adding timestamps to MemberInformation...")
+            c.execute('''ALTER TABLE MemberInformation ADD COLUMN last_claim_at INT DEFAULT NULL''')
+            c.execute('''ALTER TABLE MemberInformation ADD COLUMN last_roll_at INT DEFAULT NULL''')
+
+    @staticmethod
+    def create_badge_progress_if_not_exist(c):
+        """Create BadgeProgress and count the badge personalities already owned."""
+        c.execute('''SELECT count(name) FROM sqlite_master WHERE type='table' AND name='BadgeProgress' ''')
+
+        if c.fetchone()[0] != 1:
+            print("Creating badges progress...")
+            c.execute('''CREATE TABLE BadgeProgress (
+                         id_badge INT,
+                         id_member INT,
+                         id_server INT,
+                         owned INT DEFAULT 0,
+                         FOREIGN KEY (id_badge) REFERENCES Badge(id),
+                         FOREIGN KEY (id_member) REFERENCES Member(id),
+                         FOREIGN KEY (id_server) REFERENCES Server(id),
+                         PRIMARY KEY (id_badge, id_member))''')
+            c.execute('''CREATE INDEX BadgeProgressMember ON BadgeProgress(id_server, id_member)''')
+            c.execute('''CREATE INDEX BadgeProgressRanking ON BadgeProgress(id_badge, owned)''')
+            c.execute('''INSERT INTO BadgeProgress(id_badge, id_member, id_server, owned)
+                         SELECT B.id, D.id_member, B.id_server, COUNT(*)
+                         FROM Badge AS B
+                         JOIN BadgePerso AS BP ON BP.id_badge = B.id
+                         JOIN Deck AS D ON D.id_server = B.id_server AND D.id_perso = BP.id_perso
+                         WHERE D.id_member IS NOT NULL
+                         GROUP BY B.id, D.id_member''')
+
+    @staticmethod
+    def create_claim_events_if_not_exist(c):
+        c.execute('''SELECT count(name) FROM sqlite_master WHERE type='table' AND name='ClaimEvent' ''')
+
+        if c.fetchone()[0] != 1:
+            print("Creating claim events...")
+            c.execute('''CREATE TABLE ClaimEvent (
+                         id INTEGER PRIMARY KEY,
+                         id_server INT,
+                         id_perso INT,
+                         id_member INT,
+                         claimed_at INT,
+                         FOREIGN KEY (id_server) REFERENCES Server(id),
+                         FOREIGN KEY (id_member) REFERENCES Member(id))''')
+            c.execute('''CREATE INDEX ClaimEventServerTime ON ClaimEvent(id_server, claimed_at)''')
+            c.execute('''CREATE INDEX ClaimEventTime ON ClaimEvent(claimed_at)''')
+
+    @staticmethod
+    def upgrade_current_images(c):
+        """Replace the positions of the current images in old databases by their url.
+
+        Positions in the sorted images changed each time an image was added or removed, urls do not.
+        """
+        c.execute('''PRAGMA table_info(Deck)''')
+        columns = {column[1] for column in c.fetchall()}
+
+        if 'current_image_url' not in columns:
+            print("Converting current images to urls...")
+            c.execute('''ALTER TABLE Deck ADD COLUMN current_image_url TEXT DEFAULT NULL''')
+            # Same choice as before: the image at this position, or the last one if there are less images
+            c.execute('''UPDATE Deck
+                         SET current_image_url = coalesce((SELECT I.url FROM personality.Image AS I
+                                                           WHERE I.id_perso = Deck.id_perso
+                                                                 AND (SELECT COUNT(*) FROM personality.Image AS J
+                                                                      WHERE J.id_perso = I.id_perso AND J.url < I.url)
+                                                                     = Deck.current_image),
+                                                          (SELECT max(url) FROM personality.Image
+                                                           WHERE id_perso = Deck.id_perso))
+                         WHERE current_image > 0''')
+
+    @staticmethod
+    def create_member_indexes(c):
+        """Index the personalities of a member (deck, wish list, shopping list) and the badges of a personality."""
+        print("Creating members indexes...")
+        c.execute('''CREATE INDEX IF NOT EXISTS DeckMember ON Deck(id_server, id_member, id_perso)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS WishlistMember ON Wishlist(id_server, id_member, id_perso)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS ShoppingListMember ON ShoppingList(id_server, id_member, id_perso)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS BadgePersoPerso ON BadgePerso(id_perso, id_badge)''')
+
+    @write_method
+    def convert_member_dates(self, batch_size=500):
+        """Convert a batch of old local dates to timestamps and return the number of converted rows.
+
+        Converted dates are set to NULL so that the next batch starts where this one stopped.
+        """
+        if not self._has_member_dates:
+            return 0
+
+        c = self.db.cursor()
+        c.execute('''UPDATE MemberInformation
+                     SET last_claim_at = coalesce(last_claim_at, CAST(strftime('%s', last_claim, 'utc') AS INTEGER)),
+                         last_roll_at = coalesce(last_roll_at, CAST(strftime('%s', last_roll, 'utc') AS INTEGER)),
+                         last_claim = NULL,
+                         last_roll = NULL
+                     WHERE rowid IN (SELECT rowid FROM MemberInformation
+                                     WHERE last_claim IS NOT NULL OR last_roll IS NOT NULL
+                                     LIMIT ?)''', (batch_size,))
+        nb_converted = c.rowcount
+        self._commit()
+        c.close()
+
+        return nb_converted
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """Connection of the current thread."""
+        return self._connections.get()
+
     def connect(self, filename):
-        if self.db:
-            self.db.close()
-        self.db = sqlite3.connect(filename)
+        self._connections.reset(filename)
+        self.clear_caches()
+        self.create_if_not_exist()
+        self.upgrade_schema()
+
+    def clear_caches(self):
+        """Forget everything cached from the database (it will be read again)."""
+        with self._servers_lock:
+            self._servers_loaded = False
+            self._servers_configuration = {}
+        self._known_servers.clear()
+
+    def is_memory_loaded(self):
+        """Return True if the configurations of the servers are loaded."""
+        return self._servers_loaded
+
+    def load_memory(self):
+        """Read the configurations of all servers (a few rows, one by server)."""
+        with self._servers_lock:
+            if self._servers_loaded:
+                return
 
+            c = self.db.cursor()
+            c.execute('''SELECT id, claim_interval, time_to_claim, rolls_per_hour, information_channel, claims_channel
+                         FROM Server''')
+            self._servers_configuration = {server[0]: dict(zip(DEFAULT_SERVER_CONFIGURATION.keys(), server[1:]))
+                                           for server in c.fetchall()}
+            c.close()
+            self._servers_loaded = True
+
+    def _commit(self):
+        if not getattr(_batch, 'active', False):
+            self.db.commit()
+
+    @write_method
     def add_to_deck(self, id_server, id_perso, id_member):
+        """Give the personality to the member and return the badges [{id, name}] it just completed."""
         self.create_server_if_not_exist(id_server)
         self.create_member_if_not_exist(id_member)
+        id_previous_owner = self.perso_belongs_to(id_server, id_perso)
         c = self.db.cursor()
-        c.execute('''UPDATE Deck SET id_member = ? WHERE id_server = ? AND id_perso = ? ''',
-                  (id_member, id_server, id_perso))
-        # c.execute('''INSERT INTO Deck(id_server, id_perso, id_member)
-        #             VALUES(?, ?, ?)''', (id_server, id_perso, id_member))
-        self.db.commit()
+        # The Deck row might not exist yet if the personality has never been shown on this server
+        c.execute('''INSERT INTO Deck(id_server, id_perso, id_member) VALUES (?, ?, ?)
+                     ON CONFLICT(id_server, id_perso) DO UPDATE SET id_member = excluded.id_member''',
+                  (id_server, id_perso, id_member))
+
+        unlocked_badges = []
+        if id_previous_owner != id_member:
+            self._update_badges_progress(c, id_server, id_perso, id_previous_owner, -1)
+            self._update_badges_progress(c, id_server, id_perso, id_member, 1)
+            unlocked_badges = self._get_badges_completed_with(c, id_server, id_perso, id_member)
+        c.execute('''INSERT INTO ClaimEvent(id_server, id_perso, id_member, claimed_at) VALUES (?, ?, ?, ?)''',
+                  (id_server, id_perso, id_member, int(time.time())))
+        self._commit()
         c.close()
 
         self.update_last_claim(id_server, id_member)
 
+        return unlocked_badges
+
+    @staticmethod
+    def _update_badges_progress(c, id_server, id_perso, id_member, delta):
+        """Add delta to the progress of the member in all badges of the server with the personality."""
+        if id_member is None:
+            return
+
+        c.execute('''INSERT INTO BadgeProgress(id_badge, id_member, id_server, owned)
+                     SELECT B.id, ?, B.id_server, ?
+                     FROM Badge AS B
+                     JOIN BadgePerso AS BP ON BP.id_badge = B.id
+                     WHERE B.id_server = ? AND BP.id_perso = ?
+                     ON CONFLICT(id_badge, id_member) DO UPDATE SET owned = owned + excluded.owned''',
+                  (id_member, delta, id_server, id_perso))
+
+    @staticmethod
+    def _get_badges_completed_with(c, id_server, id_perso, id_member):
+        """Return the badges [{id, name}] with the personality which are completed by the member."""
+        c.execute('''SELECT B.id, B.name
+                     FROM Badge AS B
+                     JOIN BadgePerso AS BP ON BP.id_badge = B.id
+                     JOIN BadgeProgress AS P ON P.id_badge = B.id AND P.id_member = ?
+                     WHERE B.id_server = ? AND BP.id_perso = ?
+                           AND P.owned = (SELECT COUNT(*) FROM BadgePerso WHERE id_badge = B.id)''',
+                  (id_member, id_server, id_perso))
+
+        return [{'id': badge[0], 'name': badge[1]} for badge in c.fetchall()]
+
+    @write_method
     def update_last_claim(self, id_server, id_member):
         c = self.db.cursor()
         c.execute('''INSERT OR IGNORE INTO MemberInformation(id_server, id_member)
                      VALUES (?, ?)''', (id_server, id_member))
         c.execute('''UPDATE MemberInformation
-                     SET last_claim = datetime('now', 'localtime')
-                     WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
-        self.db.commit()
+                     SET last_claim_at = ?
+                     WHERE id_server = ? AND id_member = ?''', (int(time.time()), id_server, id_member))
+        self._commit()
         c.close()
 
+    @memory_method
     def get_server_configuration(self, id_server):
-        self.create_server_if_not_exist(id_server)
-        c = self.db.cursor()
-        c.execute('''SELECT claim_interval, time_to_claim, rolls_per_hour FROM Server WHERE id = ?''', (id_server,))
-        config = c.fetchone()
-        c.close()
+        """Return the server configuration, from memory once the configurations of all servers are loaded."""
+        if not self._servers_loaded:
+            self.load_memory()
+
+        # The server is created on its first write, until then it has the default configuration
+        return dict(self._servers_configuration.get(id_server, DEFAULT_SERVER_CONFIGURATION))
 
-        return {'claim_interval': config[0], 'time_to_claim': config[1], 'rolls_per_hour': config[2]}
+    def _update_server_configuration(self, id_server, key, value):
+        """Update the configuration in memory once the write in Server table is committed."""
+        def update():
+            # A load in progress holds the lock, it might have read the database before the commit
+            with self._servers_lock:
+                if self._servers_loaded:
+                    config = self._servers_configuration.setdefault(id_server, dict(DEFAULT_SERVER_CONFIGURATION))
+                    config[key] = value
+
+        after_commit(update)
 
     def get_servers_with_info_and_claims_channels(self):
         c = self.db.cursor()
@@ -294,155 +743,276 @@ class DatabaseDeck:
 
         return servers
 
-    def get_last_claim(self, id_server, id_member):
-        """Return last claim date or -1 otherwise."""
+    def get_claim_events(self, id_server, since):
+        """Return claims [{id_perso, id_member, claimed_at}] of the server since the timestamp, oldest first."""
         c = self.db.cursor()
-        c.execute('''SELECT last_claim
-                     FROM MemberInformation
-                     WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
-        last_claim = c.fetchone()
+        c.execute('''SELECT id_perso, id_member, claimed_at
+                     FROM ClaimEvent
+                     WHERE id_server = ? AND claimed_at >= ?
+                     ORDER BY claimed_at ASC''', (id_server, since))
+        res = c.fetchall()
         c.close()
 
-        if not last_claim:
-            return None
+        return [{'id_perso': claim[0], 'id_member': claim[1], 'claimed_at': claim[2]} for claim in res]
+
+    @write_method
+    def prune_claim_events(self, before):
+        """Delete claims older than the timestamp and return the number of deleted claims."""
+        c = self.db.cursor()
+        c.execute('''DELETE FROM ClaimEvent WHERE claimed_at < ?''', (before,))
+        nb_deleted = c.rowcount
+        self._commit()
+        c.close()
 
-        return last_claim[0]
+        return nb_deleted
 
+    @write_method
+    def remove_perso_references(self, id_perso):
+        """Remove the personality from decks, wish lists, shopping lists and badges on all servers."""
+        c = self.db.cursor()
+        self._remove_perso_references(c, '{} = ?', (id_perso,))
+        self._commit()
+        c.close()
+
+    @write_method
+    def remove_orphans(self):
+        """Remove the references to personalities which do not exist anymore and return their number.
+
+        They are left by a removal of personality stopped between its two commits, or by older versions.
+        """
+        c = self.db.cursor()
+        nb_removed = self._remove_perso_references(c, '{} NOT IN (SELECT id FROM Personality)', ())
+        self._commit()
+        c.close()
+
+        return nb_removed
+
+    @staticmethod
+    def _remove_perso_references(c, condition, params):
+        """Remove the references to the personalities matching condition, {} being their id column.
+
+        Return the number of removed rows.
+        """
+        c.execute(f'''UPDATE BadgeProgress
+                      SET owned = owned - 1
+                      WHERE (id_badge, id_member) IN (SELECT BP.id_badge, D.id_member
+                                                      FROM BadgePerso AS BP
+                                                      JOIN Badge AS B ON B.id = BP.id_badge
+                                                      JOIN Deck AS D ON D.id_server = B.id_server
+                                                                        AND D.id_perso = BP.id_perso
+                                                      WHERE {condition.format('BP.id_perso')})''', params)
+        nb_removed = 0
+        for table in ('Deck', 'Wishlist', 'ShoppingList', 'BadgePerso'):
+            c.execute(f'''DELETE FROM {table} WHERE {condition.format('id_perso')}''', params)
+            nb_removed += c.rowcount
+
+        return nb_removed
+
+    def get_member_cooldown(self, id_server, id_member):
+        """Return {last_roll, nb_rolls, last_claim} as stored in database, with timestamps."""
+        c = self.db.cursor()
+        # Dates of old databases not converted yet are read as timestamps
+        if self._has_member_dates:
+            c.execute('''SELECT coalesce(last_roll_at, CAST(strftime('%s', last_roll, 'utc') AS INTEGER)),
+                                nb_rolls,
+                                coalesce(last_claim_at, CAST(strftime('%s', last_claim, 'utc') AS INTEGER))
+                         FROM MemberInformation
+                         WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
+        else:
+            c.execute('''SELECT last_roll_at, nb_rolls, last_claim_at
+                         FROM MemberInformation
+                         WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
+        cooldown = c.fetchone()
+        c.close()
+
+        if not cooldown:
+            return {'last_roll': None, 'nb_rolls': 0, 'last_claim': None}
+
+        return {'last_roll': cooldown[0], 'nb_rolls': cooldown[1], 'last_claim': cooldown[2]}
+
+    @write_method
     def create_server_if_not_exist(self, id_server):
+        if id_server in self._known_servers:
+            return
+
         c = self.db.cursor()
         c.execute('''INSERT OR IGNORE INTO Server(id) VALUES (?)''', (id_server,))
-        self.db.commit()
+        self._commit()
         c.close()
+        after_commit(lambda: self._known_servers.add(id_server))
 
+    @write_method
     def create_member_if_not_exist(self, id_member):
         c = self.db.cursor()
         c.execute('''INSERT OR IGNORE INTO Member(id) VALUES (?)''', (id_member,))
-        self.db.commit()
-        c.close()
-
-    def create_active_image_if_not_exist(self, id_server, id_perso):
-        c = self.db.cursor()
-        c.execute('''INSERT OR IGNORE INTO Deck(id_server, id_perso, current_image)
-                     VALUES (?, ?, ?)''', (id_server, id_perso, 0))
-        self.db.commit()
+        self._commit()
         c.close()
 
+    @write_method
     def create_member_information_if_not_exist(self, id_server, id_member):
         c = self.db.cursor()
         c.execute('''INSERT OR IGNORE INTO MemberInformation(id_server, id_member)
                      VALUES (?, ?)''', (id_server, id_member))
-        self.db.commit()
+        self._commit()
         c.close()
 
+    @write_method
     def set_information_channel(self, id_server, id_channel):
         self.create_server_if_not_exist(id_server)
         c = self.db.cursor()
         c.execute('''UPDATE Server
                      SET information_channel = ?
                      WHERE id = ?''', (id_channel, id_server))
-        self.db.commit()
+        self._commit()
         c.close()
+        self._update_server_configuration(id_server, 'information_channel', id_channel)
 
+    @write_method
     def set_claims_channel(self, id_server, id_channel):
         self.create_server_if_not_exist(id_server)
         c = self.db.cursor()
         c.execute('''UPDATE Server
                      SET claims_channel = ?
                      WHERE id = ?''', (id_channel, id_server))
-        self.db.commit()
+        self._commit()
         c.close()
+        self._update_server_configuration(id_server, 'claims_channel', id_channel)
 
+    @write_method
     def set_claiming_interval(self, id_server, interval):
         self.create_server_if_not_exist(id_server)
         c = self.db.cursor()
         c.execute('''UPDATE Server
                      SET claim_interval = ?
                      WHERE id = ?''', (interval, id_server))
-        self.db.commit()
+        self._commit()
         c.close()
+        self._update_server_configuration(id_server, 'claim_interval', interval)
 
+    @write_method
     def set_nb_rolls_per_hour(self, id_server, nb_rolls):
         self.create_server_if_not_exist(id_server)
         c = self.db.cursor()
         c.execute('''UPDATE Server
                      SET rolls_per_hour = ?
                      WHERE id = ?''', (nb_rolls, id_server))
-        self.db.commit()
+        self._commit()
         c.close()
+        self._update_server_configuration(id_server, 'rolls_per_hour', nb_rolls)
 
+    @write_method
     def set_time_to_claim(self, id_server, time_to_claim):
         self.create_server_if_not_exist(id_server)
         c = self.db.cursor()
         c.execute('''UPDATE Server
                      SET time_to_claim = ?
                      WHERE id = ?''', (time_to_claim, id_server))
-        self.db.commit()
+        self._commit()
         c.close()
+        self._update_server_configuration(id_server, 'time_to_claim', time_to_claim)
 
+    @write_method
     def set_max_wish(self, id_server, id_member, max_wish):
         c = self.db.cursor()
         self.create_member_information_if_not_exist(id_server, id_member)
         c.execute('''UPDATE MemberInformation
                      SET max_wish = ?
                      WHERE id_server = ? AND id_member = ?''', (max_wish, id_server, id_member))
-        self.db.commit()
+        self._commit()
         c.close()
 
-    def get_all_member(self, id_server):
-        """Return a list of member."""
-        c = self.db.cursor()
-        c.execute('''SELECT id_member
-                     FROM MemberInformation
-                     WHERE id_server = ?''', (id_server,))
-        ids = c.fetchall()
-        c.close()
-        return [id_member[0] for id_member in ids]
+    # Sort orders of the personality pages: sort name: columns (the personality id ends all of them)
+    PAGE_SORTS = {'name': ('P.name', 'G.name'), 'group': ('G.name', 'P.name')}
 
-    def get_user_deck(self, id_server, id_member):
-        """Return a list of personality ids."""
-        c = self.db.cursor()
-        c.execute('''SELECT id_perso
-                     FROM Deck
-                     WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
-        ids = c.fetchall()
-        c.close()
-        return [id_perso[0] for id_perso in ids]
+    def get_deck_page(self, id_server, id_member, sort='name', group=None, id_badge=None,
+                      after=None, offset=0, limit=20):
+        """Return a page of the deck with dict {id, name, group} format (one by group of the personality).
 
-    def get_last_roll(self, id_server, id_member):
-        """Return last roll date or None otherwise."""
-        c = self.db.cursor()
-        c.execute('''SELECT last_roll
-                     FROM MemberInformation
-                     WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
-        last_roll = c.fetchone()
+        Personalities are sorted by name or group and can be filtered by group name or badge.
+        after is the last personality of the previous page (keyset pagination), offset is only used without it.
+        """
+        return self._get_personalities_page('Deck', id_server, id_member, sort, group, id_badge, after, offset, limit)
+
+    def count_deck(self, id_server, id_member, group=None, id_badge=None):
+        """Return the number of entries of the deck pages with these filters."""
+        return self._count_personalities('Deck', id_server, id_member, group, id_badge)
+
+    def get_wishlist_page(self, id_server, id_member, sort='name', after=None, offset=0, limit=20):
+        """Return a page of the wish list with dict {id, name, group, id_owner} format, see get_deck_page.
+
+        A limit of -1 returns the whole list.
+        """
+        return self._get_personalities_page('Wishlist', id_server, id_member, sort, None, None, after, offset, limit,
+                                            with_owner=True)
+
+    @staticmethod
+    def _personalities_filters(table, id_server, id_member, group, id_badge):
+        """Return the FROM and WHERE clauses with their parameters for the personalities of a member in table."""
+        query = f'''FROM {table} AS X
+                    JOIN personality.Personality AS P ON P.id = X.id_perso
+                    JOIN personality.PersoGroups AS PG ON PG.id_perso = X.id_perso
+                    JOIN personality.Groups AS G ON G.id = PG.id_groups
+                    WHERE X.id_server = ? AND X.id_member = ?'''
+        params = [id_server, id_member]
+
+        if group:
+            query += ''' AND G.name = ? COLLATE NOCASE'''
+            params.append(group)
+        if id_badge:
+            query += ''' AND X.id_perso IN (SELECT id_perso FROM BadgePerso WHERE id_badge = ?)'''
+            params.append(id_badge)
+
+        return query, params
+
+    def _get_personalities_page(self, table, id_server, id_member, sort, group, id_badge, after, offset, limit,
+                                with_owner=False):
+        first, second = self.PAGE_SORTS[sort]
+        query, params = self._personalities_filters(table, id_server, id_member, group, id_badge)
+
+        if after:
+            query += f''' AND ({first}, {second}, X.id_perso) > (?, ?, ?)'''
+            keys = {'P.name': after['name'], 'G.name': after['group']}
+            params += [keys[first], keys[second], after['id']]
+            offset = 0
+
+        owner = '''(SELECT id_member FROM Deck WHERE id_server = X.id_server AND id_perso = X.id_perso)''' \
+            if with_owner else '''NULL'''
+
+        c = self.db.cursor()
+        c.execute(f'''SELECT X.id_perso, P.name, G.name, {owner} {query}
+                      ORDER BY {first}, {second}, X.id_perso
+                      LIMIT ? OFFSET ?''', params + [limit, offset])
+        res = c.fetchall()
         c.close()
 
-        if not last_roll:
-            return None
+        personalities = []
+        for perso in res:
+            personality = {'id': perso[0], 'name': perso[1], 'group': perso[2]}
+            if with_owner:
+                personality['id_owner'] = perso[3]
+            personalities.append(personality)
+
+        return personalities
 
-        return last_roll[0]
+    def _count_personalities(self, table, id_server, id_member, group, id_badge):
+        query, params = self._personalities_filters(table, id_server, id_member, group, id_badge)
 
-    def update_last_roll(self, id_server, id_member):
         c = self.db.cursor()
-        self.create_member_information_if_not_exist(id_server, id_member)
-        c.execute('''UPDATE MemberInformation
-                     SET last_roll = datetime('now', 'localtime')
-                     WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
-        self.db.commit()
+        c.execute(f'''SELECT COUNT(*) {query}''', params)
+        count = c.fetchone()[0]
         c.close()
 
-    def get_nb_rolls(self, id_server, id_member):
+        return count
+
+    def get_user_deck(self, id_server, id_member):
+        """Return a list of personality ids."""
         c = self.db.cursor()
-        c.execute('''SELECT nb_rolls
-                     FROM MemberInformation
+        c.execute('''SELECT id_perso
+                     FROM Deck
                      WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
-        nb_rolls = c.fetchone()
+        ids = c.fetchall()
         c.close()
-
-        if not nb_rolls:
-            return 0
-
-        return nb_rolls[0]
+        return [id_perso[0] for id_perso in ids]
 
     def get_id_perso_profile(self, id_server, id_member):
         c = self.db.cursor()
@@ -457,41 +1027,23 @@ class DatabaseDeck:
 
         return id_perso_profile[0]
 
+    @write_method
     def set_id_perso_profile(self, id_server, id_member, value):
         c = self.db.cursor()
         self.create_member_information_if_not_exist(id_server, id_member)
         c.execute('''UPDATE MemberInformation
                      SET id_perso_profile = ?
                      WHERE id_server = ? AND id_member = ?''', (value, id_server, id_member))
-        self.db.commit()
-        c.close()
-
-    def set_nb_rolls(self, id_server, id_member, value):
-        c = self.db.cursor()
-        self.create_member_information_if_not_exist(id_server, id_member)
-        c.execute('''UPDATE MemberInformation
-                     SET nb_rolls = ?
-                     WHERE id_server = ? AND id_member = ?''', (value, id_server, id_member))
-        self.db.commit()
+        self._commit()
         c.close()
 
+    @memory_method
     def get_rolls_per_hour(self, id_server):
-        self.create_server_if_not_exist(id_server)
-        c = self.db.cursor()
-        c.execute('''SELECT rolls_per_hour FROM Server WHERE id = ?''', (id_server,))
-        rolls_per_hour = c.fetchone()
-        c.close()
-
-        return rolls_per_hour[0]
+        return self.get_server_configuration(id_server)['rolls_per_hour']
 
+    @memory_method
     def get_time_to_claim(self, id_server):
-        self.create_server_if_not_exist(id_server)
-        c = self.db.cursor()
-        c.execute('''SELECT time_to_claim FROM Server WHERE id = ?''', (id_server,))
-        time_to_claim = c.fetchone()
-        c.close()
-
-        return time_to_claim[0]
+        return self.get_server_configuration(id_server)['time_to_claim']
 
     def perso_belongs_to(self, id_server, id_perso):
         """Return the owner of the personality or None otherwise."""
@@ -505,6 +1057,31 @@ class DatabaseDeck:
 
         return owner
 
+    def get_owners(self, id_server, ids_perso):
+        """Return {id_perso: id_member} for the personalities of ids_perso owned by a member."""
+        c = self.db.cursor()
+        # The personalities are looked up one by one (CROSS JOIN keeps this order), not read among the whole server
+        c.execute('''SELECT D.id_perso, D.id_member
+                     FROM (SELECT DISTINCT value FROM json_each(?)) AS J
+                     CROSS JOIN Deck AS D ON D.id_server = ? AND D.id_perso = J.value
+                     WHERE D.id_member IS NOT NULL''',
+                  (json.dumps(list(ids_perso)), id_server))
+        owners = dict(c.fetchall())
+        c.close()
+
+        return owners
+
+    def get_personalities_with_owners(self, id_server, ids_perso):
+        """Return personalities information with dict {id, name, group, id_owner} format, in ids_perso order."""
+        personalities = DatabasePersonality.get().get_multiple_perso_information(ids_perso) or []
+        owners = self.get_owners(id_server, ids_perso)
+
+        for perso in personalities:
+            perso['id_owner'] = owners.get(perso['id'])
+
+        return personalities
+
+    @write_method
     def add_to_wishlist(self, id_server, id_perso, id_member):
         """Return true if success, false otherwise."""
         c = self.db.cursor()
@@ -516,11 +1093,12 @@ class DatabaseDeck:
                          VALUES (?,?,?)''', (id_server, id_perso, id_member))
         except sqlite3.IntegrityError:
             is_success = False
-        self.db.commit()
+        self._commit()
         c.close()
 
         return is_success
 
+    @write_method
     def remove_from_wishlist(self, id_server, id_perso, id_member):
         """Return true if success, false otherwise."""
         c = self.db.cursor()
@@ -539,21 +1117,24 @@ class DatabaseDeck:
                      AND id_perso = ?
                      AND id_member = ?''', (id_server, id_perso, id_member))
 
-        self.db.commit()
+        self._commit()
         c.close()
 
         return True
 
     def get_max_wish(self, id_server, id_member):
-        self.create_member_information_if_not_exist(id_server, id_member)
         c = self.db.cursor()
         c.execute('''SELECT max_wish
                      FROM MemberInformation
                      WHERE id_server = ? AND id_member = ?''', (id_server, id_member))
-        max_wish = c.fetchone()[0]
+        max_wish = c.fetchone()
         c.close()
 
-        return max_wish
+        # Members without information yet have the default of the table
+        if not max_wish:
+            return DEFAULT_MAX_WISH
+
+        return max_wish[0]
 
     def get_nb_wish(self, id_server, id_member):
         c = self.db.cursor()
@@ -591,6 +1172,7 @@ class DatabaseDeck:
 
         return members
 
+    @write_method
     def add_to_shopping_list(self, id_server, id_perso, id_member):
         """Return true if success, false otherwise."""
         c = self.db.cursor()
@@ -602,11 +1184,12 @@ class DatabaseDeck:
                          VALUES (?,?,?)''', (id_server, id_perso, id_member))
         except sqlite3.IntegrityError:
             is_success = False
-        self.db.commit()
+        self._commit()
         c.close()
 
         return is_success
 
+    @write_method
     def remove_from_shopping_list(self, id_server, id_perso, id_member):
         """Return true if success, false otherwise."""
         c = self.db.cursor()
@@ -625,7 +1208,7 @@ class DatabaseDeck:
                      AND id_perso = ?
                      AND id_member = ?''', (id_server, id_perso, id_member))
 
-        self.db.commit()
+        self._commit()
         c.close()
 
         return True
@@ -643,6 +1226,7 @@ class DatabaseDeck:
 
         return shopping_list
 
+    @write_method
     def give_to(self, id_server, id_perso, id_giver, id_receiver):
         """Give an personality to another player."""
         c = self.db.cursor()
@@ -651,65 +1235,195 @@ class DatabaseDeck:
                      WHERE id_server = ? AND
                            id_perso = ? AND
                            id_member = ?''', (id_receiver, id_server, id_perso, id_giver))
-        self.db.commit()
+        if c.rowcount:
+            self._update_badges_progress(c, id_server, id_perso, id_giver, -1)
+            self._update_badges_progress(c, id_server, id_perso, id_receiver, 1)
+        self._commit()
+        c.close()
+
+    @write_method
+    def transfer_many(self, id_server, ids_perso, id_giver, id_receiver):
+        """Give the personalities of ids_perso owned by the giver to the receiver (None to discard them).
+
+        Return the number of personalities given.
+        """
+        c = self.db.cursor()
+        nb_given = self._transfer(c, id_server, ids_perso, id_giver, id_receiver)
+        self._commit()
         c.close()
 
-    def update_perso_current_image(self, id_server, id_perso, current_image):
+        return nb_given
+
+    @write_method
+    def swap(self, id_server, id_perso_1, id_member_1, id_perso_2, id_member_2):
+        """Exchange two personalities between their members.
+
+        Return False without changing anything if one of them is not owned by its member anymore, True otherwise.
+        """
+        c = self.db.cursor()
+        c.execute('''SELECT COUNT(*)
+                     FROM Deck
+                     WHERE id_server = ? AND ((id_perso = ? AND id_member = ?) OR (id_perso = ? AND id_member = ?))''',
+                  (id_server, id_perso_1, id_member_1, id_perso_2, id_member_2))
+        is_owned = c.fetchone()[0] == 2
+
+        if is_owned:
+            self._transfer(c, id_server, [id_perso_1], id_member_1, id_member_2)
+            self._transfer(c, id_server, [id_perso_2], id_member_2, id_member_1)
+            self._commit()
+        c.close()
+
+        return is_owned
+
+    @write_method
+    def release_deck(self, id_server, id_member):
+        """Discard all personalities of the member and return their number."""
         c = self.db.cursor()
+        c.execute('''UPDATE BadgeProgress SET owned = 0 WHERE id_server = ? AND id_member = ?''',
+                  (id_server, id_member))
+        c.execute('''UPDATE Deck SET id_member = NULL WHERE id_server = ? AND id_member = ?''',
+                  (id_server, id_member))
+        nb_released = c.rowcount
+        self._commit()
+        c.close()
+
+        return nb_released
+
+    @staticmethod
+    def _transfer(c, id_server, ids_perso, id_giver, id_receiver):
+        """Move the personalities owned by the giver to the receiver without commit, return their number."""
+        ids_perso = json.dumps(list(ids_perso))
+
+        # Badges progress is counted with the personalities still owned by the giver
+        for id_member, delta in ((id_giver, -1), (id_receiver, 1)):
+            if id_member is None:
+                continue
+            c.execute('''INSERT INTO BadgeProgress(id_badge, id_member, id_server, owned)
+                         SELECT B.id, ?, B.id_server, ? * COUNT(*)
+                         FROM Badge AS B
+                         JOIN BadgePerso AS BP ON BP.id_badge = B.id
+                         JOIN Deck AS D ON D.id_server = B.id_server AND D.id_perso = BP.id_perso
+                         WHERE B.id_server = ? AND D.id_member = ?
+                               AND D.id_perso IN (SELECT value FROM json_each(?))
+                         GROUP BY B.id
+                         ON CONFLICT(id_badge, id_member) DO UPDATE SET owned = owned + excluded.owned''',
+                      (id_member, delta, id_server, id_giver, ids_perso))
+
         c.execute('''UPDATE Deck
-                     SET current_image = ?
-                     WHERE id_server = ? AND id_perso = ?''', (current_image, id_server, id_perso))
-        self.db.commit()
+                     SET id_member = ?
+                     WHERE id_server = ? AND id_member = ?
+                           AND id_perso IN (SELECT value FROM json_each(?))''',
+                  (id_receiver, id_server, id_giver, ids_perso))
+
+        return c.rowcount
+
+    @write_method
+    def update_perso_current_image(self, id_server, id_perso, url):
+        """Show the image url for the personality on the server."""
+        self.create_server_if_not_exist(id_server)
+        c = self.db.cursor()
+        # The Deck row might not exist yet if the personality has never been claimed on this server
+        c.execute('''INSERT INTO Deck(id_server, id_perso, current_image_url) VALUES (?, ?, ?)
+                     ON CONFLICT(id_server, id_perso) DO UPDATE SET current_image_url = excluded.current_image_url''',
+                  (id_server, id_perso, url))
+        self._commit()
         c.close()
 
     def get_perso_current_image(self, id_server, id_perso):
-        """Get the current url image associated to the personality (or the last one if bigger) or None if no images."""
-        self.create_active_image_if_not_exist(id_server, id_perso)
+        """Get the current url image associated to the personality (or the first one) or None if no images."""
         c = self.db.cursor()
-        c.execute('''SELECT current_image
+        c.execute('''SELECT current_image_url
                      FROM Deck
                      WHERE id_server = ? AND id_perso = ?''', (id_server, id_perso))
-        current_image = c.fetchone()[0]
+        current_image = c.fetchone()
         c.close()
 
-        images = DatabasePersonality.get().get_perso_all_images(id_perso)
+        return self._select_image(id_perso, current_image[0] if current_image else None)
+
+    @staticmethod
+    def _select_image(id_perso, url):
+        """Return url if it is still an image of the personality, the first image otherwise (or None)."""
+        images = DatabasePersonality.get().catalog.images.get(id_perso)
         if not images:
             return None
 
-        current_image = min(len(images), current_image)
-
-        return images[current_image]
-
+        return url if url in images else images[0]
+
+    def get_roll_context(self, id_server, id_perso):
+        """Return everything shown when rolling a personality with one query.
+
+        Dict {id_owner, wished_by=[id_member], badges=[{id, name, description}], current_image}.
+        The rolls of the member are counted by the cooldown table (cooldown.py).
+        """
+        c = self.db.cursor()
+        c.execute('''SELECT (SELECT id_member FROM Deck WHERE id_server = :server AND id_perso = :perso),
+                            (SELECT current_image_url FROM Deck WHERE id_server = :server AND id_perso = :perso),
+                            (SELECT json_group_array(id_member) FROM Wishlist
+                             WHERE id_server = :server AND id_perso = :perso),
+                            (SELECT json_group_array(json_object('id', B.id, 'name', B.name,
+                                                                 'description', B.description))
+                             FROM Badge AS B
+                             JOIN BadgePerso AS BP ON BP.id_badge = B.id
+                             WHERE B.id_server = :server AND BP.id_perso = :perso)
+                  ''', {'server': id_server, 'perso': id_perso})
+        context = c.fetchone()
+        c.close()
+
+        return {'id_owner': context[0],
+                'current_image': self._select_image(id_perso, context[1]),
+                'wished_by': json.loads(context[2]),
+                'badges': json.loads(context[3])}
+
+    @write_method
+    def record_roll(self, id_server, id_member):
+        """Count one more roll for the member (the first of a new UTC hour resets the count) and update the last roll."""
+        c = self.db.cursor()
+        c.execute('''INSERT INTO MemberInformation(id_server, id_member, nb_rolls, last_roll_at)
+                     VALUES (?, ?, 1, ?)
+                     ON CONFLICT(id_server, id_member) DO UPDATE
+                     SET nb_rolls = CASE WHEN last_roll_at / 3600 = excluded.last_roll_at / 3600
+                                         THEN nb_rolls + 1
+                                         ELSE 1 END,
+                         last_roll_at = excluded.last_roll_at''',
+                  (id_server, id_member, int(time.time())))
+        self._commit()
+        c.close()
+
+    @write_method
     def add_badge(self, id_server, name, description=''):
         """Add a new badge to the server and return if the operation was successful"""
         try:
             c = self.db.cursor()
             c.execute(''' INSERT INTO Badge(id_server, name, description) 
                           VALUES (?, ?, ?) ''', (id_server, name, description,))
-            self.db.commit()
+            self._commit()
             c.close()
         except sqlite3.IntegrityError as e:
             return False
 
         return True
 
+    @write_method
     def remove_badge(self, id_badge):
         c = self.db.cursor()
+        c.execute(''' DELETE FROM BadgeProgress WHERE id_badge = ? ''', (id_badge,))
         c.execute(''' DELETE FROM BadgePerso WHERE id_badge = ? ''', (id_badge,))
         c.execute(''' DELETE FROM Badge WHERE id = ? ''', (id_badge,))
-        self.db.commit()
+        self._commit()
         c.close()
 
+    @write_method
     def set_badge_description(self, id_badge, description):
         c = self.db.cursor()
         c.execute(''' UPDATE Badge SET description = ? WHERE id = ? ''', (description, id_badge,))
-        self.db.commit()
+        self._commit()
         c.close()
 
+    @write_method
     def set_badge_name(self, id_badge, new_name):
         c = self.db.cursor()
         c.execute(''' UPDATE Badge SET name = ? WHERE id = ? ''', (new_name, id_badge,))
-        self.db.commit()
+        self._commit()
         c.close()
 
     def get_all_badges(self, id_server):
@@ -741,6 +1455,42 @@ class DatabaseDeck:
 
         return badges
 
+    def get_badges_progress(self, id_server, id_member):
+        """Return [{id, name, owned, nb_perso}] for each badge of the server with at least one personality."""
+        c = self.db.cursor()
+        c.execute('''SELECT B.id, B.name, coalesce(P.owned, 0), COUNT(BP.id_perso)
+                     FROM Badge AS B
+                     JOIN BadgePerso AS BP ON BP.id_badge = B.id
+                     LEFT JOIN BadgeProgress AS P ON P.id_badge = B.id AND P.id_member = ?
+                     WHERE B.id_server = ?
+                     GROUP BY B.id''', (id_member, id_server))
+        res = c.fetchall()
+        c.close()
+
+        return [{'id': badge[0], 'name': badge[1], 'owned': badge[2], 'nb_perso': badge[3]} for badge in res]
+
+    def get_badge_ranking(self, id_badge, limit=5):
+        """Return {id_owner, nb_perso, closest=[{id_member, owned}]} with the limit members owning most of the badge.
+
+        id_owner is the member owning all personalities of the badge or None.
+        """
+        c = self.db.cursor()
+        c.execute('''SELECT COUNT(*) FROM BadgePerso WHERE id_badge = ?''', (id_badge,))
+        nb_perso = c.fetchone()[0]
+        c.execute('''SELECT id_member, owned
+                     FROM BadgeProgress
+                     WHERE id_badge = ? AND owned > 0
+                     ORDER BY owned DESC
+                     LIMIT ?''', (id_badge, limit))
+        closest = [{'id_member': member[0], 'owned': member[1]} for member in c.fetchall()]
+        c.close()
+
+        id_owner = None
+        if closest and closest[0]['owned'] == nb_perso:
+            id_owner = closest[0]['id_member']
+
+        return {'id_owner': id_owner, 'nb_perso': nb_perso, 'closest': closest}
+
     def get_id_badge(self, id_server, name):
         c = self.db.cursor()
         c.execute('''SELECT id
@@ -769,19 +1519,114 @@ class DatabaseDeck:
 
         return badge
 
+    @write_method
     def add_perso_to_badge(self, id_badge, id_perso):
         c = self.db.cursor()
         c.execute(''' INSERT OR IGNORE INTO BadgePerso(id_badge, id_perso) 
                               VALUES (?, ?) ''', (id_badge, id_perso,))
-        self.db.commit()
-        c.close()
-
+        if c.rowcount:
+            # The owner of the personality progresses in the badge
+            c.execute('''INSERT INTO BadgeProgress(id_badge, id_member, id_server, owned)
+                         SELECT B.id, D.id_member, B.id_server, 1
+                         FROM Badge AS B
+                         JOIN Deck AS D ON D.id_server = B.id_server
+                         WHERE B.id = ? AND D.id_perso = ? AND D.id_member IS NOT NULL
+                         ON CONFLICT(id_badge, id_member) DO UPDATE SET owned = owned + 1''', (id_badge, id_perso))
+        self._commit()
+        c.close()
+
+    @write_method
     def remove_perso_from_badge(self, id_badge, id_perso):
         c = self.db.cursor()
         c.execute(''' DELETE FROM BadgePerso WHERE id_badge = ? AND id_perso = ? ''', (id_badge, id_perso,))
-        self.db.commit()
+        if c.rowcount:
+            c.execute('''UPDATE BadgeProgress
+                         SET owned = owned - 1
+                         WHERE id_badge = ? AND id_member = (SELECT D.id_member
+                                                             FROM Deck AS D
+                                                             JOIN Badge AS B ON B.id_server = D.id_server
+                                                             WHERE B.id = ? AND D.id_perso = ?)''',
+                      (id_badge, id_badge, id_perso))
+        self._commit()
+        c.close()
+
+    @write_method
+    def add_persos_to_badge(self, id_badge, ids_perso):
+        """Add the personalities to the badge and return the ones which were not in it."""
+        c = self.db.cursor()
+        added = self._add_persos_to_badge(c, id_badge, ids_perso)
+        self._commit()
+        c.close()
+
+        return added
+
+    @write_method
+    def remove_persos_from_badge(self, id_badge, ids_perso):
+        """Remove the personalities from the badge and return the ones which were in it."""
+        c = self.db.cursor()
+        removed = self._remove_persos_from_badge(c, id_badge, ids_perso)
+        self._commit()
         c.close()
 
+        return removed
+
+    @write_method
+    def set_badge_persos(self, id_badge, ids_perso):
+        """Replace the personalities of the badge, return the added and removed ones as {added, removed}."""
+        c = self.db.cursor()
+        c.execute('''SELECT id_perso FROM BadgePerso WHERE id_badge = ?''', (id_badge,))
+        kept = set(ids_perso)
+        removed = [row[0] for row in c.fetchall() if row[0] not in kept]
+
+        self._remove_persos_from_badge(c, id_badge, removed)
+        added = self._add_persos_to_badge(c, id_badge, ids_perso)
+        self._commit()
+        c.close()
+
+        return {'added': added, 'removed': removed}
+
+    def _add_persos_to_badge(self, c, id_badge, ids_perso):
+        c.execute('''SELECT DISTINCT value
+                     FROM json_each(?)
+                     WHERE value NOT IN (SELECT id_perso FROM BadgePerso WHERE id_badge = ?)''',
+                  (json.dumps(list(ids_perso)), id_badge))
+        added = [row[0] for row in c.fetchall()]
+
+        c.executemany('''INSERT INTO BadgePerso(id_badge, id_perso) VALUES (?, ?)''',
+                      [(id_badge, id_perso) for id_perso in added])
+        self._update_badge_progress_with(c, id_badge, added, 1)
+
+        return added
+
+    def _remove_persos_from_badge(self, c, id_badge, ids_perso):
+        c.execute('''SELECT id_perso
+                     FROM BadgePerso
+                     WHERE id_badge = ? AND id_perso IN (SELECT value FROM json_each(?))''',
+                  (id_badge, json.dumps(list(ids_perso))))
+        removed = [row[0] for row in c.fetchall()]
+
+        self._update_badge_progress_with(c, id_badge, removed, -1)
+        c.executemany('''DELETE FROM BadgePerso WHERE id_badge = ? AND id_perso = ?''',
+                      [(id_badge, id_perso) for id_perso in removed])
+
+        return removed
+
+    @staticmethod
+    def _update_badge_progress_with(c, id_badge, ids_perso, delta):
+        """Add delta to the progress in the badge of the owners of the personalities, for each one they own."""
+        if not ids_perso:
+            return
+
+        c.execute('''INSERT INTO BadgeProgress(id_badge, id_member, id_server, owned)
+                     SELECT B.id, D.id_member, B.id_server, ? * COUNT(*)
+                     FROM (SELECT DISTINCT value FROM json_each(?)) AS J
+                     CROSS JOIN Badge AS B
+                     CROSS JOIN Deck AS D ON D.id_server = B.id_server AND D.id_perso = J.value
+                     WHERE B.id = ? AND D.id_member IS NOT NULL
+                     GROUP BY D.id_member
+                     ON CONFLICT(id_badge, id_member) DO UPDATE SET owned = owned + excluded.owned''',
+                  (delta, json.dumps(list(ids_perso)), id_badge))
+
     def get_badges_with(self, id_server, id_perso):
         c = self.db.cursor()
         c.execute('''SELECT B.id, B.name, B.description
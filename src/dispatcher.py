@@ -0,0 +1,54 @@
+"""
+Send a scheduled report to many servers at once.
+
+Servers are handled concurrently, at most max_concurrency at a time so that Discord rate limits are not hit in burst,
+and each one starts after a random delay in the jitter window to spread the requests.
+A failing or slow server only fails its own report, the time taken by each server is kept in last_run.
+"""
+
+import asyncio
+import random
+import time
+
+
+class ReportDispatcher:
+    def __init__(self, name, max_concurrency=10, jitter=10.0, timeout=60.0):
+        """jitter is the window (in seconds) over which the servers start, timeout the limit for one server."""
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.timeout = timeout
+        # id_server: {duration, error} of the last dispatch
+        self.last_run = {}
+
+    async def dispatch(self, servers, send):
+        """Await send(server) for each server dict with an id and return {id_server: {duration, error}}."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        start = time.perf_counter()
+
+        async def send_to(server):
+            await asyncio.sleep(random.uniform(0, self.jitter))
+
+            async with semaphore:
+                server_start = time.perf_counter()
+                error = None
+                try:
+                    await asyncio.wait_for(send(server), self.timeout)
+                except Exception as e:
+                    error = e
+
+                return server['id'], {'duration': time.perf_counter() - server_start, 'error': error}
+
+        self.last_run = dict(await asyncio.gather(*[send_to(server) for server in servers]))
+
+        for id_server, result in self.last_run.items():
+            if result['error']:
+                print(f'{self.name}: server {id_server} failed after {result["duration"]:.2f}s '
+                      f'({result["error"]!r})')
+
+        nb_sent = sum(not result['error'] for result in self.last_run.values())
+        slowest = max((result['duration'] for result in self.last_run.values()), default=0)
+        print(f'{self.name}: sent to {nb_sent}/{len(self.last_run)} servers '
+              f'in {time.perf_counter() - start:.1f}s (slowest server {slowest:.2f}s)')
+
+        return self.last_run
@@ -2,7 +2,7 @@ import discord
 from discord.ext import commands
 from discord.commands import slash_command, Option
 
-from database import DatabasePersonality, DatabaseDeck
+from async_database import db
 import utils
 
 class Images(commands.Cog):
@@ -18,7 +18,7 @@ class Images(commands.Cog):
                         url: str):
         name = name.strip()
 
-        id_perso = DatabasePersonality.get().get_perso_id(name)
+        id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}** not found.')
@@ -26,7 +26,7 @@ class Images(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        DatabasePersonality.get().add_image(id_perso, url)
+        await db.personality.add_image(id_perso, url)
         # Green mark
         await ctx.respond('Done.')
         msg = await ctx.interaction.original_message()
@@ -38,7 +38,7 @@ class Images(commands.Cog):
                            url: str):
         name = name.strip()
 
-        id_perso = DatabasePersonality.get().get_perso_id(name)
+        id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}** not found.')
@@ -46,7 +46,7 @@ class Images(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        DatabasePersonality.get().remove_image(id_perso, url)
+        await db.personality.remove_image(id_perso, url)
         # Green mark
         await ctx.respond('Done.')
         msg = await ctx.interaction.original_message()
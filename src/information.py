@@ -1,7 +1,7 @@
 import asyncio
 import secrets
 import math
-import datetime
+import time
 
 import discord
 from discord.ext import commands, pages
@@ -9,18 +9,24 @@ from discord.commands import slash_command, Option
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from database import DatabasePersonality, DatabaseDeck
+from async_database import db
+from dispatcher import ReportDispatcher
 import utils
 
+# Claims are kept one week for /last_claims and the daily report
+CLAIMS_RETENTION = 7 * 24 * 3600
+
 
 class Information(commands.Cog):
 
     def __init__(self, bot):
         """Initial the cog with the bot."""
         self.bot = bot
+        self.last_claims_dispatcher = ReportDispatcher('Last claims report')
 
         scheduler = AsyncIOScheduler()
         scheduler.add_job(self.send_last_claims_on_servers, CronTrigger(hour=8, minute=0, second=0))
+        scheduler.add_job(self.prune_claims, CronTrigger(hour=4, minute=0, second=0))
         scheduler.start()
 
     #### Commands ####
@@ -35,9 +41,9 @@ class Information(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+            id_perso = await db.personality.get_perso_group_id(name, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(name)
+            id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             msg = f'I searched everywhere for **{name}**'
@@ -47,20 +53,18 @@ class Information(commands.Cog):
             await ctx.respond(msg)
             return
 
-        current_image = DatabaseDeck.get().get_perso_current_image(ctx.guild.id, id_perso)
-        perso = DatabasePersonality.get().get_perso_information(id_perso)
-        images = DatabasePersonality.get().get_perso_all_images(id_perso)
+        current_image = await db.deck.get_perso_current_image(ctx.guild.id, id_perso)
+        perso = await db.personality.get_perso_information(id_perso)
+        images = await db.personality.get_perso_all_images(id_perso)
 
-        id_owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, id_perso)
+        id_owner = await db.deck.perso_belongs_to(ctx.guild.id, id_perso)
         owner = None
         if id_owner:
             owner = ctx.guild.get_member(id_owner)
 
-        badges_with_perso = DatabaseDeck.get().get_badges_with(ctx.guild.id, id_perso)
-
-        images_pages = []
+        badges_with_perso = await db.deck.get_badges_with(ctx.guild.id, id_perso)
 
-        for i in range(0, len(images)):
+        def build_page(i):
             embed = discord.Embed(title=perso['name'], description=perso['group'], colour=secrets.randbelow(0xffffff))
             if badges_with_perso:
                 embed.add_field(name=f'Badge{"s" if len(badges_with_perso) > 1 else ""}',
@@ -74,7 +78,7 @@ class Information(commands.Cog):
 
             embed.set_image(url=images[i])
 
-            images_pages.append(embed)
+            return embed
 
         class SetDefaultButton(discord.ui.View):
             def __init__(self, timeout: int = 180):
@@ -89,7 +93,8 @@ class Information(commands.Cog):
                 if not self.paginator:
                     await ctx.send(f'Error while setting the image, contact the administrator.', delete_after=5)
                 else:
-                    DatabaseDeck.get().update_perso_current_image(ctx.guild.id, id_perso, self.paginator.current_page)
+                    await db.deck.update_perso_current_image(ctx.guild.id, id_perso,
+                                                             images[self.paginator.current_page])
                     await ctx.send(f'Set image {self.paginator.current_page+1} as default image.', delete_after=5)
 
             async def on_timeout(self):
@@ -102,22 +107,22 @@ class Information(commands.Cog):
             current_image_index = images.index(current_image)
         except ValueError:
             current_image_index = 0
-        paginator = utils.PaginatorCustomStartPage(pages=images_pages, first_page=current_image_index,
-                                                   custom_view=button)
+        paginator = utils.LazyPaginator(page_count=len(images), build_page=build_page, first_page=current_image_index,
+                                        custom_view=button)
         button.set_paginator(paginator)
         await paginator.respond(ctx)
 
     @slash_command(description='List all personalities with its name',
                    guild_ids=utils.get_authorized_guild_ids())
     async def list(self, ctx, name: str):
-        ids = DatabasePersonality.get().get_perso_ids_containing_name(name)
+        ids = await db.personality.get_perso_ids_containing_name(name)
 
         if not ids:
             await ctx.respond(f'No *{name}* personality found')
             return
 
         persos_text = []
-        personalities = DatabasePersonality.get().get_multiple_perso_information(ids)
+        personalities = await db.personality.get_multiple_perso_information(ids)
         if personalities:
             for perso in personalities:
                 persos_text.append(f'**{perso["name"]}** *{perso["group"]}*')
@@ -125,88 +130,97 @@ class Information(commands.Cog):
         persos_text.sort()
 
         nb_per_page = 20
-        persos_pages = []
 
-        for i in range(0, len(persos_text), nb_per_page):
-            embed = discord.Embed(title=f'*{name}* personality',
-                                  description='\n'.join([perso for perso in persos_text[i:i + nb_per_page]]))
-            persos_pages.append(embed)
+        def build_page(page):
+            i = page * nb_per_page
+            return discord.Embed(title=f'*{name}* personality',
+                                 description='\n'.join([perso for perso in persos_text[i:i + nb_per_page]]))
 
-        paginator = pages.Paginator(pages=persos_pages, show_disabled=True, show_indicator=True)
+        paginator = utils.LazyPaginator(page_count=math.ceil(len(persos_text) / nb_per_page), build_page=build_page)
         await paginator.send(ctx)
 
     @slash_command(description='Show all members of a group',
                    guild_ids=utils.get_authorized_guild_ids())
     async def group(self, ctx, group_name: Option(str, "Pick a group or write yours", autocomplete=utils.personalities_group_searcher)):
-        group = DatabasePersonality.get().get_group_members(group_name)
+        group = await db.personality.get_group_members(group_name)
 
         if not group:
             await ctx.respond(f'No *{group_name}* group found.')
             return
 
         nb_per_page = 20
-        persos_pages = []
 
-        for i in range(0, len(group['members']), nb_per_page):
-            embed = discord.Embed(title=f'*{group["name"]}* group',
-                                  description='\n'.join([f'**{member}**' for member in group['members'][i:i+nb_per_page]]))
-            persos_pages.append(embed)
+        def build_page(page):
+            i = page * nb_per_page
+            return discord.Embed(title=f'*{group["name"]}* group',
+                                 description='\n'.join([f'**{member}**' for member in group['members'][i:i+nb_per_page]]))
 
-        paginator = pages.Paginator(pages=persos_pages, show_disabled=True, show_indicator=True)
+        paginator = utils.LazyPaginator(page_count=math.ceil(len(group['members']) / nb_per_page),
+                                        build_page=build_page)
         await paginator.send(ctx)
 
     @slash_command(description='Show all groups available',
                    guild_ids=utils.get_authorized_guild_ids())
     async def list_groups(self, ctx):
-        groups = DatabasePersonality.get().get_all_groups()
+        groups = await db.personality.get_all_groups()
 
         if not groups:
             await ctx.respond(f'No group found. This is probably an error.')
             return
 
         nb_per_page = 20
-        persos_pages = []
 
-        for i in range(0, len(groups), nb_per_page):
-            embed = discord.Embed(title=f'All groups',
-                                  description='\n'.join([f'**{group}**' for group in groups[i:i+nb_per_page]]))
-            persos_pages.append(embed)
+        def build_page(page):
+            i = page * nb_per_page
+            return discord.Embed(title=f'All groups',
+                                 description='\n'.join([f'**{group}**' for group in groups[i:i+nb_per_page]]))
 
-        paginator = pages.Paginator(pages=persos_pages, show_disabled=True, show_indicator=True)
+        paginator = utils.LazyPaginator(page_count=math.ceil(len(groups) / nb_per_page), build_page=build_page)
         await paginator.send(ctx)
 
-    @slash_command(description='Show last claims of the last 24h of the current channel.',
+    @slash_command(description='Show last claims of the last 24h of the server.',
                    guild_ids=utils.get_authorized_guild_ids())
     async def last_claims(self, ctx):
-        await ctx.defer()
-        embed = await self.last_claims_function(ctx.channel)
+        embed = await self.last_claims_function(ctx.guild)
         await ctx.respond(content='', embed=embed)
 
     async def send_last_claims_on_servers(self):
-        servers = DatabaseDeck.get().get_servers_with_info_and_claims_channels()
-        for server in servers:
-            guild = self.bot.get_guild(server['id'])
-            embed = await self.last_claims_function(guild.get_channel(server['claims_channel']))
-            await guild.get_channel(server['information_channel']).send(embed=embed)
-
-    # Get last claims in channel and return an embed
-    async def last_claims_function(self, channel: discord.TextChannel):
-        yesterday = datetime.datetime.utcnow().today() - datetime.timedelta(days=1)
+        servers = await db.deck.get_servers_with_info_and_claims_channels()
+        await self.last_claims_dispatcher.dispatch(servers, self.send_last_claims)
+
+    async def send_last_claims(self, server):
+        guild = self.bot.get_guild(server['id'])
+        # The bot might have been removed from the server or the channel deleted
+        if not guild:
+            raise LookupError('server not found')
+        channel = guild.get_channel(server['information_channel'])
+        if not channel:
+            raise LookupError('information channel not found')
+
+        embed = await self.last_claims_function(guild)
+        await channel.send(embed=embed)
+
+    async def prune_claims(self):
+        await db.deck.prune_claim_events(int(time.time()) - CLAIMS_RETENTION)
+
+    # Get last claims of the server and return an embed
+    async def last_claims_function(self, guild: discord.Guild):
+        events = await db.deck.get_claim_events(guild.id, int(time.time()) - 24 * 3600)
+        personalities = await db.personality.get_multiple_perso_information([event['id_perso'] for event in events])
+        names = {perso['id']: perso['name'] for perso in personalities or []}
         claims = []
 
-        async for message in channel.history(limit=None, after=yesterday, oldest_first=True):
-            if message.author != self.bot.user:
+        for event in events:
+            # The personality might have been removed since
+            if event['id_perso'] not in names:
                 continue
 
-            if ' claims ' in message.content and message.content.endswith('!'):
-                s = message.content.split(' claims ')
-                owner = s[0]
-                # Remove '!'
-                personality = s[1][:-1]
-                claims.append(f'**{personality}** - {owner}')
+            member = guild.get_member(event['id_member'])
+            owner = (member.name if not member.nick else member.nick) if member else f'<@{event["id_member"]}>'
+            claims.append(f'**{names[event["id_perso"]]}** - {owner}')
 
         embed = discord.Embed(title='Last 24h claims', description='\n'.join(claims) if claims else 'No one has claimed anything...')
-        embed.set_footer(text=f'Channel {channel.name}')
+        embed.set_footer(text=f'Server {guild.name}')
 
         return embed
 
@@ -14,6 +14,7 @@ from images import Images
 from badge import Badge
 from shopping_list import ShoppingList
 from personalities_handler import PersonalitiesHandler
+from async_database import db
 import utils
 
 intents = discord.Intents.default()
@@ -54,6 +55,24 @@ async def on_ready():
     for guild in utils.get_authorized_guild_ids():
         print(bot.get_guild(guild))
 
+    # Load the catalog, autocompletion indexes and servers configuration outside of the event loop
+    await db.personality.refresh_search_indexes()
+    await db.deck.load_memory()
+
+    # Repair the deck database if a removal of personality was stopped halfway
+    nb_orphans = await db.deck.remove_orphans()
+    if nb_orphans:
+        print(f'Removed {nb_orphans} references to personalities which do not exist anymore.')
+
+    # Convert the dates of old databases by batches, so that commands are still served meanwhile
+    while await db.deck.convert_member_dates():
+        pass
+
+
+@bot.event
+async def on_guild_join(guild):
+    await db.deck.create_server_if_not_exist(guild.id)
+
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -74,4 +93,8 @@ async def on_command_error(ctx, error):
 
 #### Launch bot ####
 
-bot.run(BOT_TOKEN)
+try:
+    bot.run(BOT_TOKEN)
+finally:
+    # Commit the queued writes and stop the database threads
+    db.close()
@@ -2,7 +2,8 @@ import discord
 from discord.ext import commands
 from discord.commands import slash_command, Option, permissions
 
-from database import DatabasePersonality
+from async_database import db
+import catalog_sync
 import utils
 
 
@@ -22,7 +23,7 @@ class PersonalitiesHandler(commands.Cog):
                               image_url: str):
         name = name.strip()
 
-        id_group = DatabasePersonality.get().get_group_id(group)
+        id_group = await db.personality.get_group_id(group)
 
         if not id_group:
             await ctx.respond(f'Group **{name}** not found.')
@@ -30,7 +31,8 @@ class PersonalitiesHandler(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        DatabasePersonality.get().add_personality(name, id_group, image_url)
+        await db.personality.add_personality(name, id_group, image_url)
+        await db.personality.refresh_search_indexes()
         # Green mark
         await ctx.respond(f'{name} in the group {group} has been added.')
         msg = await ctx.interaction.original_message()
@@ -46,7 +48,7 @@ class PersonalitiesHandler(commands.Cog):
                                          autocomplete=utils.personalities_group_searcher)):
         name = name.strip()
 
-        id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+        id_perso = await db.personality.get_perso_group_id(name, group)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}** in the group *{group}* not found.')
@@ -69,9 +71,38 @@ class PersonalitiesHandler(commands.Cog):
             await ctx.send('Timeout : discard is cancelled.')
             await msg.edit(view=accept_view)
         elif accept_view.is_accepted:
-            DatabasePersonality.get().remove_personality(id_perso)
+            # The deck database first, see DatabasePersonality.remove_personality
+            await db.deck.remove_perso_references(id_perso)
+            await db.personality.remove_personality(id_perso)
+            await db.personality.refresh_search_indexes()
             original_msg = await ctx.interaction.original_message()
             await original_msg.add_reaction(u"\u2705")
             await msg.add_reaction(u"\u2705")
         else:
             await ctx.send('Discard is cancelled.')
+
+    @slash_command(description='Import personalities, groups and images from a CSV or JSON catalog dump.',
+                   guild_ids=utils.get_authorized_guild_ids())
+    @permissions.has_role("PersonalitiesWarsAdmin")
+    async def import_catalog(self, ctx, dump: Option(discord.Attachment, "CSV or JSON file (see catalog_sync.py)"),
+                             dry_run: Option(bool, "Only show the changes", required=False, default=False)):
+        await ctx.defer()
+
+        try:
+            entries = catalog_sync.parse_dump((await dump.read()).decode('utf-8'),
+                                              dump.filename.rsplit('.', 1)[-1].lower())
+            changes = await db.personality.import_catalog(entries, dry_run)
+        except (ValueError, UnicodeDecodeError) as e:
+            await ctx.respond(f'The catalog has not been imported: {e}')
+            msg = await ctx.interaction.original_message()
+            await msg.add_reaction(u"\u274C")
+            return
+
+        if not dry_run:
+            await db.personality.clear_caches()
+            await db.personality.refresh_search_indexes()
+
+        await ctx.respond(f'{len(entries)} personalities read{" (nothing changed)" if dry_run else ""}: '
+                          f'{catalog_sync.describe(changes)}.')
+        msg = await ctx.interaction.original_message()
+        await msg.add_reaction(u"\u2705")
@@ -1,4 +1,3 @@
-from datetime import datetime, timedelta
 import asyncio
 import math
 from collections import defaultdict
@@ -7,7 +6,8 @@ import discord
 from discord.ext import commands, pages
 from discord.commands import slash_command, Option
 
-from database import DatabaseDeck, DatabasePersonality
+from async_database import db
+from cooldown import cooldowns, next_rolls_reset, now
 from roll import min_until_next_claim
 import utils
 
@@ -23,23 +23,23 @@ class Profile(commands.Cog):
                    guild_ids=utils.get_authorized_guild_ids())
     async def profile(self, ctx, member: Option(discord.Member, required=False, default=None)):
         profile_owner = member or ctx.author
-        id_perso_profile = DatabaseDeck.get().get_id_perso_profile(ctx.guild.id, profile_owner.id)
+        id_perso_profile = await db.deck.get_id_perso_profile(ctx.guild.id, profile_owner.id)
 
         image = profile_owner.avatar.url if profile_owner.avatar else None
 
         if id_perso_profile:
-            current_image = DatabaseDeck.get().get_perso_current_image(ctx.guild.id, id_perso_profile)
-            perso = DatabasePersonality.get().get_perso_information(id_perso_profile)
+            current_image = await db.deck.get_perso_current_image(ctx.guild.id, id_perso_profile)
+            perso = await db.personality.get_perso_information(id_perso_profile)
 
             # Show profile's perso only if user owns the personality (might not be the case with trade, give, discard)
-            owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, perso['id'])
+            owner = await db.deck.perso_belongs_to(ctx.guild.id, perso['id'])
             if owner and owner == profile_owner.id and current_image:
                 image = current_image
 
-        ids_deck = DatabaseDeck.get().get_user_deck(ctx.guild.id, profile_owner.id)
+        ids_deck = await db.deck.get_user_deck(ctx.guild.id, profile_owner.id)
 
         groups_count = defaultdict(int)  # Default value of 0
-        personalities = DatabasePersonality.get().get_multiple_perso_information(ids_deck)
+        personalities = await db.personality.get_multiple_perso_information(ids_deck)
         if personalities:
             for perso in personalities:
                 groups_count[perso["group"]] += 1
@@ -48,11 +48,8 @@ class Profile(commands.Cog):
         groups = sorted(groups_count.items(), key=lambda item: item[1], reverse=True)[:10]
 
         # Badges
-        owned_badges = []
-        badges = DatabaseDeck.get().get_all_badges_with_perso(ctx.guild.id)
-        for badge_name in badges:
-            if all(id_perso in ids_deck for id_perso in badges[badge_name]):
-                owned_badges.append(badge_name)
+        owned_badges = [badge['name'] for badge in await db.deck.get_badges_progress(ctx.guild.id, profile_owner.id)
+                        if badge['owned'] == badge['nb_perso']]
         badges_embed_msg = 'You don\'t own any badge...'
         if owned_badges:
             badges_embed_msg = '\n'.join(owned_badges)
@@ -71,33 +68,52 @@ class Profile(commands.Cog):
 
     @slash_command(description='Show the user deck or yours if no user given.',
                    guild_ids=utils.get_authorized_guild_ids())
-    async def deck(self, ctx, member: Option(discord.Member, required=False, default=None)):
+    async def deck(self, ctx, member: Option(discord.Member, required=False, default=None),
+                   group: Option(str, 'Only show this group', autocomplete=utils.personalities_group_searcher,
+                                 required=False, default=None),
+                   badge: Option(str, 'Only show this badge', autocomplete=utils.badges_name_searcher,
+                                 required=False, default=None),
+                   sort: Option(str, 'Sort by name or group', choices=['name', 'group'],
+                                required=False, default='name')):
         deck_owner = member or ctx.author
 
-        ids_deck = DatabaseDeck.get().get_user_deck(ctx.guild.id, deck_owner.id)
+        id_badge = None
+        if badge:
+            id_badge = await db.deck.get_id_badge(ctx.guild.id, badge.strip())
+            if not id_badge:
+                await ctx.respond(f'Badge {badge} not found.')
+                return
 
-        persos_text = []
-        personalities = DatabasePersonality.get().get_multiple_perso_information(ids_deck)
-        if personalities:
-            for perso in personalities:
-                persos_text.append(f'**{perso["name"]}** *{perso["group"]}*')
-
-        persos_text.sort()
-
-        if not persos_text:
-            persos_text = ['This deck is empty... Gotta catch \'em all!']
+        if group:
+            group = group.strip()
 
         nb_per_page = 20
-        persos_pages = []
+        nb_persos = await db.deck.count_deck(ctx.guild.id, deck_owner.id, group, id_badge)
+        # Last personality of each page already read, to read the next one from there
+        last_persos = {}
+
+        async def build_page(page):
+            if page - 1 in last_persos:
+                personalities = await db.deck.get_deck_page(ctx.guild.id, deck_owner.id, sort, group, id_badge,
+                                                            after=last_persos[page - 1], limit=nb_per_page)
+            else:
+                personalities = await db.deck.get_deck_page(ctx.guild.id, deck_owner.id, sort, group, id_badge,
+                                                            offset=page * nb_per_page, limit=nb_per_page)
+            if personalities:
+                last_persos[page] = personalities[-1]
+
+            persos_text = [f'**{perso["name"]}** *{perso["group"]}*' for perso in personalities]
+            if not persos_text:
+                persos_text = ['This deck is empty... Gotta catch \'em all!']
 
-        for i in range(0, len(persos_text), nb_per_page):
             embed = discord.Embed(title=deck_owner.name if deck_owner.nick is None else deck_owner.nick,
-                                  description='\n'.join([perso for perso in persos_text[i:i + nb_per_page]]))
+                                  description='\n'.join(persos_text))
             if deck_owner.avatar:
                 embed.set_thumbnail(url=deck_owner.avatar.url)
-            persos_pages.append(embed)
+            return embed
 
-        paginator = pages.Paginator(pages=persos_pages, show_disabled=True, show_indicator=True)
+        paginator = await utils.LazyPaginator.create(page_count=max(math.ceil(nb_persos / nb_per_page), 1),
+                                                     build_page=build_page)
         await paginator.send(ctx)
 
     @slash_command(description='Set the profile displayed personality.\n'
@@ -109,7 +125,7 @@ class Profile(commands.Cog):
                                               autocomplete=utils.personalities_group_searcher, required=False,
                                               default=None)):
         if name is None:
-            DatabaseDeck.get().set_id_perso_profile(ctx.guild.id, ctx.author.id, None)
+            await db.deck.set_id_perso_profile(ctx.guild.id, ctx.author.id, None)
             await ctx.respond('I removed your profile\'s personality.')
             return
 
@@ -119,26 +135,26 @@ class Profile(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+            id_perso = await db.personality.get_perso_group_id(name, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(name)
+            id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}**{" from *" + group + "* " if group else ""} not found.')
             return
 
-        owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, id_perso)
+        owner = await db.deck.perso_belongs_to(ctx.guild.id, id_perso)
         if not owner or owner != ctx.author.id:
             await ctx.respond(f'You don\'t own **{name}**{" from *" + group + "* " if group else ""}...')
             return None
 
-        DatabaseDeck.get().set_id_perso_profile(ctx.guild.id, ctx.author.id, id_perso)
+        await db.deck.set_id_perso_profile(ctx.guild.id, ctx.author.id, id_perso)
         await ctx.respond(f'Set your perso profile to {name} {group if group else ""}')
 
     @slash_command(description='Show time before next rolls and claim reset.',
                    guild_ids=utils.get_authorized_guild_ids())
     async def time(self, ctx):
-        next_claim = min_until_next_claim(ctx.guild.id, ctx.author.id)
+        next_claim = await min_until_next_claim(ctx.guild.id, ctx.author.id)
 
         username = ctx.author.name if ctx.author.nick is None else ctx.author.nick
 
@@ -148,23 +164,13 @@ class Profile(commands.Cog):
         else:
             time = divmod(next_claim, 60)
             msg += f'can\'t claim yet. ' \
-                   f'Ready **<t:{int((datetime.now() + timedelta(minutes=next_claim)).timestamp())}:R>**.'
-
-        user_nb_rolls = DatabaseDeck.get().get_nb_rolls(ctx.guild.id, ctx.author.id)
-        max_rolls = DatabaseDeck.get().get_rolls_per_hour(ctx.guild.id)
-
-        last_roll = DatabaseDeck.get().get_last_roll(ctx.guild.id, ctx.author.id)
-        if not last_roll:
-            user_nb_rolls = 0
-        else:
-            last_roll = datetime.strptime(last_roll, '%Y-%m-%d %H:%M:%S')
-            now = datetime.now()
+                   f'Ready **<t:{now() + next_claim * 60}:R>**.'
 
-            # If a new hour began
-            if now.date() != last_roll.date() or (now.date() == last_roll.date() and now.hour != last_roll.hour):
-                user_nb_rolls = 0
+        # The number of rolls is already reset if a new hour began
+        user_nb_rolls = (await cooldowns.get(ctx.guild.id, ctx.author.id))['nb_rolls']
+        max_rolls = await db.deck.get_rolls_per_hour(ctx.guild.id)
 
         msg += f'\nYou have **{max_rolls - user_nb_rolls}** rolls left.\n' \
-               f'Next rolls reset **<t:{int((datetime.now().replace(minute=0) + timedelta(hours=1)).timestamp())}:R>**.'
+               f'Next rolls reset **<t:{next_rolls_reset()}:R>**.'
 
         await ctx.respond(msg)
@@ -0,0 +1,84 @@
+"""
+Prebuilt index used by autocompletion.
+
+Names are normalized (case and accents) and ranked in three tiers:
+prefix matches, then matches at the beginning of a word, then any substring match.
+Prefix and substring matches are sorted by name, word matches by the matched word.
+"""
+
+import bisect
+import unicodedata
+from array import array
+
+
+def normalize(text):
+    """Return text without case and accents."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+class SearchIndex:
+    # Substring search uses the postings of 1, 2 and 3 characters grams
+    NGRAM = 3
+
+    def __init__(self, names):
+        entries = sorted({(normalize(name), name) for name in names})
+
+        self.names = [entry[1] for entry in entries]
+        self.keys = [entry[0] for entry in entries]
+
+        # Suffixes starting at a word (other than the first one) with the index of their name
+        words = []
+        for i, key in enumerate(self.keys):
+            for start in range(1, len(key)):
+                if key[start].isalnum() and not key[start - 1].isalnum():
+                    words.append((key[start:], i))
+        words.sort()
+        self.word_keys = [word[0] for word in words]
+        self.word_ids = array('I', [word[1] for word in words])
+
+        postings = {}
+        for i, key in enumerate(self.keys):
+            grams = {key[start:start + n] for n in range(1, self.NGRAM + 1) for start in range(len(key) - n + 1)}
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: array('I', ids) for gram, ids in postings.items()}
+
+    def search(self, query, limit=25):
+        """Return at most limit names matching query, best matches first."""
+        query = normalize(query.strip())
+        results = []
+        seen = set()
+
+        def add(i):
+            if i not in seen:
+                seen.add(i)
+                results.append(self.names[i])
+            return len(results) >= limit
+
+        # Prefix matches
+        start = bisect.bisect_left(self.keys, query)
+        for i in range(start, len(self.keys)):
+            if not self.keys[i].startswith(query) or add(i):
+                break
+
+        if len(results) >= limit:
+            return results
+
+        # Word matches, sorted by matched word
+        start = bisect.bisect_left(self.word_keys, query)
+        for i in range(start, len(self.word_keys)):
+            if not self.word_keys[i].startswith(query) or add(self.word_ids[i]):
+                break
+
+        if len(results) >= limit:
+            return results
+
+        # Substring matches, from the rarest gram of the query
+        grams = [query[i:i + self.NGRAM] for i in range(max(len(query) - self.NGRAM + 1, 1))]
+        candidates = min((self.postings.get(gram, ()) for gram in grams), key=len)
+        for i in candidates:
+            if query in self.keys[i] and add(i):
+                break
+
+        return results
@@ -4,7 +4,7 @@ import discord
 from discord.ext import commands, pages
 from discord.commands import slash_command, Option
 
-from database import DatabasePersonality, DatabaseDeck
+from async_database import db
 import utils
 
 
@@ -27,9 +27,9 @@ class ShoppingList(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+            id_perso = await db.personality.get_perso_group_id(name, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(name)
+            id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}**{" from *" + group + "* " if group else ""} not found.')
@@ -37,7 +37,7 @@ class ShoppingList(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        id_owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, id_perso)
+        id_owner = await db.deck.perso_belongs_to(ctx.guild.id, id_perso)
         if not id_owner:
             await ctx.respond(f'Unfortunately, {name} does not belong to anyone. '
                               f'You can only add the personalities of other members.')
@@ -45,7 +45,7 @@ class ShoppingList(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        if DatabaseDeck.get().add_to_shopping_list(ctx.guild.id, id_perso, ctx.author.id):
+        if await db.deck.add_to_shopping_list(ctx.guild.id, id_perso, ctx.author.id):
             # Green mark
             await ctx.respond(f'{name} added.')
             msg = await ctx.interaction.original_message()
@@ -70,9 +70,9 @@ class ShoppingList(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+            id_perso = await db.personality.get_perso_group_id(name, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(name)
+            id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}**{" from *" + group + "* " if group else ""} not found.')
@@ -80,7 +80,7 @@ class ShoppingList(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        if DatabaseDeck.get().remove_from_shopping_list(ctx.guild.id, id_perso, ctx.author.id):
+        if await db.deck.remove_from_shopping_list(ctx.guild.id, id_perso, ctx.author.id):
             # Green mark
             await ctx.respond(f'{name} removed.')
             msg = await ctx.interaction.original_message()
@@ -98,21 +98,17 @@ class ShoppingList(commands.Cog):
         await ctx.defer()
         shopping_list_owner = member or ctx.author
 
-        ids = DatabaseDeck.get().get_shopping_list(ctx.guild.id, shopping_list_owner.id)
+        ids = await db.deck.get_shopping_list(ctx.guild.id, shopping_list_owner.id)
 
         shopping_list_dict = defaultdict(list)
         username = shopping_list_owner.name if shopping_list_owner.nick is None else shopping_list_owner.nick
 
-        personalities = DatabasePersonality.get().get_multiple_perso_information(ids)
-        if personalities:
-            for i, perso in enumerate(personalities):
-                id_owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, ids[i])
+        for perso in await db.deck.get_personalities_with_owners(ctx.guild.id, ids):
+            # Do not show if the personality belongs to nobody. May be the case with discard.
+            if not perso['id_owner']:
+                continue
 
-                # Do not show if the personality belongs to nobody. May be the case with discard.
-                if not id_owner:
-                    continue
-
-                shopping_list_dict[id_owner].append(f'**{perso["name"]}** *{perso["group"]}*')
+            shopping_list_dict[perso['id_owner']].append(f'**{perso["name"]}** *{perso["group"]}*')
 
         for user in shopping_list_dict.keys():
             shopping_list_dict[user].sort()
@@ -0,0 +1,13 @@
+"""
+Offline load simulator of the bot: simulated users of several guilds send roll, claim, trade, wish, deck, profile,
+badge and autocomplete traffic at the same time to the real cogs (Roll, Trade, Wishlist, Profile and Badge),
+with stand-ins of the discord objects instead of Discord.
+
+The latency of each step (a command invoked, a button clicked, a keystroke in an autocompleted option)
+is measured until the bot answers, as well as the time the event loop was stalled (busy with one task only).
+The databases are copies of the benchmark ones, generated from a seed.
+
+Usage (from the src folder):
+    python -m simulator --scale medium --guilds 10 --users 200 --duration 60 --output simulation.json
+    python -m simulator --mix roll=60 trade=10 autocomplete=30 --think 0.5
+"""
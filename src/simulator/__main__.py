@@ -0,0 +1,74 @@
+import argparse
+import json
+import sys
+
+from benchmark import generator
+from simulator import traffic
+
+
+def mix(text):
+    """Parse action=weight."""
+    action, _, weight = text.partition('=')
+    if action not in traffic.DEFAULT_MIX:
+        raise argparse.ArgumentTypeError(f'unknown action {action} (one of {", ".join(traffic.DEFAULT_MIX)})')
+    try:
+        return action, float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid weight of {action}: {weight}')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m simulator',
+                                     description='Simulate the traffic of many users on the cogs, without Discord.')
+    parser.add_argument('--scale', choices=list(generator.SCALES), default='small', help='Size of the databases')
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--users', type=int, default=50, help='Concurrent users, spread over the guilds')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds during which users start actions')
+    parser.add_argument('--mix', type=mix, nargs='+', default=list(traffic.DEFAULT_MIX.items()),
+                        help='Weights of the actions, as action=weight (actions not given are never run)')
+    parser.add_argument('--think', type=float, default=1.0, help='Mean seconds between two actions of a user')
+    parser.add_argument('--claim-ratio', type=float, default=0.5, help='Part of the rolls claimed')
+    parser.add_argument('--accept-ratio', type=float, default=0.8, help='Part of the trades accepted')
+    parser.add_argument('--claim-window', type=float, default=2.0,
+                        help='Seconds to claim a roll (instead of the time to claim of the server)')
+    parser.add_argument('--keystroke-interval', type=float, default=0.05,
+                        help='Seconds between two keystrokes in an autocompleted option')
+    parser.add_argument('--api-delay', type=float, default=0.0, help='Seconds of each call to the Discord API')
+    parser.add_argument('--real-cooldowns', action='store_true',
+                        help='Keep the rolls per hour and claim interval of the servers (most rolls are refused)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', default='./benchmark_data', help='Folder of the generated databases')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--max-p99', type=float, help='Exit with an error if the p99 latency of steps is over (ms)')
+    parser.add_argument('--max-stall', type=float, help='Exit with an error if a stall is longer (ms)')
+    args = parser.parse_args()
+
+    if args.users < args.guilds:
+        parser.error('there must be at least one user per guild')
+
+    report = traffic.run(args.scale, args.data, args.guilds, args.users, args.duration, args.seed,
+                         not args.real_cooldowns, mix=dict(args.mix), think=args.think,
+                         claim_ratio=args.claim_ratio, accept_ratio=args.accept_ratio,
+                         claim_window=args.claim_window, keystroke_interval=args.keystroke_interval,
+                         api_delay=args.api_delay)
+    print(traffic.describe(report))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Report written to {args.output}.')
+
+    failures = [f'{sum(report["errors"].values())} commands failed'] if report['errors'] else []
+    for label, sample in report['error_samples'].items():
+        print(f'First error of {label}:\n{sample}')
+    if args.max_p99 is not None and report['totals']['steps'].get('p99_ms', 0) > args.max_p99:
+        failures.append(f'p99 latency over {args.max_p99}ms')
+    if args.max_stall is not None and report['event_loop']['max_stall_ms'] > args.max_stall:
+        failures.append(f'event loop stalled more than {args.max_stall}ms')
+    if failures:
+        print(f'Failed: {", ".join(failures)}.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
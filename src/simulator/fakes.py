@@ -0,0 +1,195 @@
+"""
+Stand-ins of the discord objects used by the cogs (guilds, members, messages, interactions and contexts).
+
+They keep what the bot sends instead of calling Discord, and measure the latency of each step of a command:
+the time between the step (a command invoked, a button clicked) and the first message the bot answers with.
+Deferring an interaction or editing a message does not answer a step, as the user is still waiting for the result.
+"""
+
+import asyncio
+import time
+
+import discord
+from discord.ext import commands
+
+
+class FakeMember:
+    def __init__(self, id_member, name):
+        self.id = id_member
+        self.name = name
+        self.nick = None
+        self.avatar = None
+        self.bot = False
+
+    @property
+    def mention(self):
+        return f'<@{self.id}>'
+
+    def __repr__(self):
+        return f'<FakeMember id={self.id} name={self.name}>'
+
+
+class FakeGuild:
+    def __init__(self, id_server, members):
+        self.id = id_server
+        self.members = {member.id: member for member in members}
+
+    def get_member(self, id_member):
+        return self.members.get(id_member)
+
+
+class FakeMessage:
+    def __init__(self, ctx, content=None, embed=None, embeds=None, view=None, **kwargs):
+        self.ctx = ctx
+        self.content = content
+        self.embeds = embeds or ([embed] if embed else [])
+        self.view = view
+        self.reactions = []
+
+    async def edit(self, **kwargs):
+        await self.ctx.call_api()
+        self.content = kwargs.get('content', self.content)
+        if 'embed' in kwargs:
+            self.embeds = [kwargs['embed']] if kwargs['embed'] else []
+        self.embeds = kwargs.get('embeds', self.embeds)
+        self.view = kwargs.get('view', self.view)
+        return self
+
+    async def add_reaction(self, emoji):
+        self.ctx.answer()
+        await self.ctx.call_api()
+        self.reactions.append(emoji)
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._responded = False
+
+    def is_done(self):
+        return self._responded
+
+    async def send_message(self, content=None, **kwargs):
+        self._responded = True
+        message = await self.interaction.ctx.post(content, **kwargs)
+        self.interaction.original = message
+        return self.interaction
+
+    async def edit_message(self, **kwargs):
+        self._responded = True
+        if self.interaction.message:
+            await self.interaction.message.edit(**kwargs)
+        else:
+            await self.interaction.ctx.call_api()
+
+    async def defer(self, **kwargs):
+        self._responded = True
+        await self.interaction.ctx.call_api()
+
+
+class FakeInteraction:
+    """Interaction of a user with the command of ctx, message being the message of the clicked button."""
+
+    def __init__(self, ctx, user, guild, message=None):
+        self.ctx = ctx
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = None
+        self.message = message
+        self.original = None
+        self.response = FakeResponse(self)
+
+    async def original_message(self):
+        await self.ctx.call_api()
+        if self.original is None:
+            # Deferred then never answered, Discord shows a placeholder message
+            self.original = FakeMessage(self.ctx)
+        return self.original
+
+
+class FakeContext(commands.Context):
+    """Context of a command, usable by prefix commands (Context) as well as slash commands (ApplicationContext).
+
+    api_delay is the time waited by each call to Discord, messages are only kept in self.messages.
+    """
+
+    def __init__(self, recorder, guild, author, api_delay=0.0):
+        self.recorder = recorder
+        self.api_delay = api_delay
+        self._guild = guild
+        self._author = author
+        self.interaction = FakeInteraction(self, author, guild)
+        self.messages = []
+        self.changed = asyncio.Event()
+        # (label, start) of the step waiting for an answer
+        self.pending = None
+
+    @property
+    def author(self):
+        return self._author
+
+    @property
+    def guild(self):
+        return self._guild
+
+    @property
+    def channel(self):
+        return self.interaction.channel
+
+    def expect(self, label):
+        """Start a step, its latency is recorded on the next answer of the bot."""
+        self.pending = (label, time.perf_counter())
+
+    def answer(self):
+        if self.pending:
+            label, start = self.pending
+            self.pending = None
+            self.recorder.add(label, time.perf_counter() - start)
+
+    async def call_api(self):
+        # Other tasks run meanwhile, as with a real request
+        await asyncio.sleep(self.api_delay)
+
+    async def post(self, content=None, **kwargs):
+        self.answer()
+        await self.call_api()
+        message = FakeMessage(self, content, **kwargs)
+        self.messages.append(message)
+        self.changed.set()
+        return message
+
+    async def send(self, content=None, **kwargs):
+        return await self.post(content, **kwargs)
+
+    async def respond(self, content=None, **kwargs):
+        if not self.interaction.response.is_done():
+            return await self.interaction.response.send_message(content, **kwargs)
+        return await self.post(content, **kwargs)
+
+    async def defer(self, **kwargs):
+        await self.interaction.response.defer(**kwargs)
+
+    async def wait_message(self, task, predicate):
+        """Return the first message sent matching predicate, None if task (the command) ended before."""
+        index = 0
+        while True:
+            for message in self.messages[index:]:
+                if predicate(message):
+                    return message
+            index = len(self.messages)
+            if task.done():
+                return None
+
+            self.changed.clear()
+            changed = asyncio.ensure_future(self.changed.wait())
+            await asyncio.wait([task, changed], return_when=asyncio.FIRST_COMPLETED)
+            changed.cancel()
+
+
+def autocomplete_context(ctx, value):
+    """Return the discord.AutocompleteContext of a keystroke of the author of ctx."""
+    autocomplete = discord.AutocompleteContext(None, ctx.interaction)
+    autocomplete.value = value
+    autocomplete.options = {}
+    return autocomplete
@@ -0,0 +1,382 @@
+"""
+Simulated users sending commands to the cogs, and the statistics of their latencies.
+"""
+
+import asyncio
+import collections
+import datetime
+import math
+import os
+import platform
+import random
+import sqlite3
+import time
+import traceback
+
+from benchmark import generator
+from database import DatabaseDeck, DatabasePersonality
+from async_database import db
+from cooldown import cooldowns
+from simulator.fakes import FakeContext, FakeGuild, FakeInteraction, FakeMember, autocomplete_context
+from badge import Badge
+from profile import Profile
+from roll import Roll
+from trade import Trade
+from wishlist import Wishlist
+import utils
+
+# Relative weights of the actions of a user
+DEFAULT_MIX = {'roll': 40, 'trade': 5, 'wish': 5, 'deck': 10, 'profile': 5, 'badge': 5, 'autocomplete': 30}
+
+AUTOCOMPLETE_SEARCHERS = {'deck_name': utils.deck_name_searcher,
+                          'personalities_name': utils.personalities_name_searcher,
+                          'personalities_group': utils.personalities_group_searcher,
+                          'badges_name': utils.badges_name_searcher}
+
+
+class Recorder:
+    def __init__(self):
+        # label: [latencies in seconds]
+        self.latencies = collections.defaultdict(list)
+        self.actions = collections.Counter()
+        self.errors = collections.Counter()
+        # label: traceback of its first error
+        self.error_samples = {}
+
+    def add(self, label, seconds):
+        self.latencies[label].append(seconds)
+
+    def add_error(self, label):
+        self.errors[label] += 1
+        self.error_samples.setdefault(label, traceback.format_exc())
+
+
+def statistics_ms(latencies):
+    """Return the statistics of the latencies (in seconds) in milliseconds."""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'count': 0}
+
+    def percentile(q):
+        return latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+
+    return {'count': len(latencies), 'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99), 'max_ms': latencies[-1] * 1000}
+
+
+async def monitor_event_loop(stop: asyncio.Event, interval=0.01, threshold=0.05):
+    """Measure the event loop stalls until stop is set.
+
+    The monitor sleeps interval seconds again and again, waking up late means the loop was busy:
+    a delay over threshold seconds is a stall (no other task could run meanwhile).
+    """
+    loop = asyncio.get_running_loop()
+    delays = []
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        delays.append(max(loop.time() - start - interval, 0))
+
+    stalls = [delay for delay in delays if delay > threshold]
+    return {'checks': len(delays),
+            'delay_p99_ms': statistics_ms(delays).get('p99_ms', 0),
+            'stalls': len(stalls),
+            'stalled_ms': sum(stalls) * 1000,
+            'max_stall_ms': max(delays, default=0) * 1000}
+
+
+class Simulation:
+    """Users of several guilds sending commands to the cogs (as the bot would run them) at the same time.
+
+    A user runs an action (weighted by mix), waits about think seconds then runs another one, until the end.
+    A rolled personality is claimed with claim_ratio probability, and a trade accepted with accept_ratio.
+    """
+
+    def __init__(self, data, users, mix, think=1.0, claim_ratio=0.5, accept_ratio=0.8, claim_window=2.0,
+                 keystroke_interval=0.05, api_delay=0.0, seed=0):
+        self.mix = mix
+        self.think = think
+        self.claim_ratio = claim_ratio
+        self.accept_ratio = accept_ratio
+        self.claim_window = claim_window
+        self.keystroke_interval = keystroke_interval
+        self.api_delay = api_delay
+        self.rng = random.Random(seed)
+        self.recorder = Recorder()
+
+        # Cogs are the ones of the bot, one instance shared by all users
+        self.roll = Roll(None)
+        self.trade = Trade(None)
+        self.wishlist = Wishlist(None)
+        self.profile = Profile(None)
+        self.badge = Badge(None)
+
+        personality = DatabasePersonality.get()
+        with personality.catalog.lock:
+            # Personalities without group have no information (they are never rolled)
+            self.names = {id_perso: perso['name'] for id_perso, perso in personality.catalog.personalities.items()
+                          if perso['groups']}
+            self.groups = list(personality.catalog.groups.values())
+        self.ids_perso = list(self.names)
+
+        self.guilds = [FakeGuild(id_server, [FakeMember(id_member, f'member{id_member}') for id_member in members])
+                       for id_server, members in data['servers'].items()]
+        self.badges = {id_server: [f'Badge {number}' for number in range(len(ids))]
+                       for id_server, ids in data['badges'].items()}
+
+        # Users are spread over the guilds
+        self.users = []
+        members = {guild.id: list(guild.members.values()) for guild in self.guilds}
+        for number in range(users):
+            guild = self.guilds[number % len(self.guilds)]
+            self.users.append((guild, members[guild.id][number // len(self.guilds)]))
+
+    def context(self, guild, member):
+        return FakeContext(self.recorder, guild, member, self.api_delay)
+
+    async def command(self, label, ctx, cog, name, *args):
+        """Run the command name of cog as the bot would, its answer latency being recorded as label."""
+        ctx.expect(label)
+        try:
+            await getattr(type(cog), name).callback(cog, ctx, *args)
+        except Exception:
+            self.recorder.add_error(label)
+
+    def click(self, ctx, label, message, item, user):
+        """Click on the button item of the view of message."""
+        ctx.expect(label)
+        message.view._dispatch_item(item, FakeInteraction(ctx, user, ctx.guild, message))
+
+    async def deck_names(self, guild, member):
+        ids = await db.deck.get_user_deck(guild.id, member.id)
+        return [self.names[id_perso] for id_perso in ids if id_perso in self.names]
+
+    #### Actions ####
+
+    async def do_roll(self, guild, member):
+        ctx = self.context(guild, member)
+        task = asyncio.create_task(self.command('roll', ctx, self.roll, 'roll'))
+        message = await ctx.wait_message(task, lambda message: message.view is not None)
+
+        if message:
+            if self.rng.random() < self.claim_ratio:
+                await asyncio.sleep(self.rng.uniform(0.1, 1) * self.claim_window)
+                # Usually claimed by the member who rolled, sometimes by another one
+                claimer = member if self.rng.random() < 0.7 else self.rng.choice(list(guild.members.values()))
+                self.click(ctx, 'roll.claim', message, message.view.children[0], claimer)
+            else:
+                await asyncio.sleep(self.claim_window)
+                message.view._dispatch_timeout()
+
+        await task
+
+    async def do_trade(self, guild, member):
+        partner = self.rng.choice(list(guild.members.values()))
+        if partner is member:
+            return False
+        names = await self.deck_names(guild, member)
+        partner_names = await self.deck_names(guild, partner)
+        if not names or not partner_names:
+            return False
+
+        ctx = self.context(guild, member)
+        task = asyncio.create_task(self.command('trade', ctx, self.trade, 'trade', partner,
+                                                self.rng.choice(names), None))
+        if await ctx.wait_message(task, lambda message: message.content and 'wants to trade' in message.content):
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+            await self.command('rtrade', self.context(guild, partner), self.trade, 'rtrade',
+                               self.rng.choice(partner_names), None)
+
+            message = await ctx.wait_message(task, lambda message: message.view is not None)
+            if message:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think))
+                button = message.view.children[0 if self.rng.random() < self.accept_ratio else 1]
+                self.click(ctx, 'trade.answer', message, button, member)
+
+        await task
+        return True
+
+    async def do_wish(self, guild, member):
+        await self.command('wish', self.context(guild, member), self.wishlist, 'wish',
+                           self.names[self.rng.choice(self.ids_perso)], None)
+
+    async def do_deck(self, guild, member):
+        owner = member if self.rng.random() < 0.7 else self.rng.choice(list(guild.members.values()))
+        await self.command('deck', self.context(guild, member), self.profile, 'deck', owner, None, None, 'name')
+
+    async def do_profile(self, guild, member):
+        await self.command('profile', self.context(guild, member), self.profile, 'profile', None)
+
+    async def do_badge(self, guild, member):
+        if self.badges.get(guild.id) and self.rng.random() < 0.5:
+            await self.command('show_badge', self.context(guild, member), self.badge, 'show_badge',
+                               self.rng.choice(self.badges[guild.id]))
+        else:
+            await self.command('badges_progression', self.context(guild, member), self.badge,
+                               'badges_progression', None)
+
+    async def do_autocomplete(self, guild, member):
+        """Type a whole name in an autocompleted option, each keystroke asking for the suggestions."""
+        name = self.rng.choice(list(AUTOCOMPLETE_SEARCHERS))
+        if name == 'deck_name':
+            texts = await self.deck_names(guild, member) or [self.names[self.rng.choice(self.ids_perso)]]
+        elif name == 'personalities_group':
+            texts = self.groups
+        elif name == 'badges_name':
+            texts = self.badges.get(guild.id) or ['Badge']
+        else:
+            texts = [self.names[self.rng.choice(self.ids_perso)]]
+        text = self.rng.choice(texts)
+
+        ctx = self.context(guild, member)
+        label = f'autocomplete.{name}'
+
+        async def keystroke(value):
+            start = time.perf_counter()
+            try:
+                await AUTOCOMPLETE_SEARCHERS[name](autocomplete_context(ctx, value))
+            except Exception:
+                self.recorder.add_error(label)
+            else:
+                self.recorder.add(label, time.perf_counter() - start)
+
+        # Keystrokes do not wait for the suggestions of the previous ones
+        keystrokes = []
+        for length in range(1, len(text) + 1):
+            keystrokes.append(asyncio.create_task(keystroke(text[:length])))
+            await asyncio.sleep(self.keystroke_interval)
+        await asyncio.gather(*keystrokes)
+
+    async def user(self, guild, member, deadline):
+        loop = asyncio.get_running_loop()
+        actions = list(self.mix)
+        weights = [self.mix[action] for action in actions]
+
+        # Users do not all start at the same time
+        await asyncio.sleep(self.rng.uniform(0, self.think))
+        while loop.time() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            if await getattr(self, f'do_{action}')(guild, member) is False:
+                self.recorder.actions[f'{action}.skipped'] += 1
+            else:
+                self.recorder.actions[action] += 1
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+    async def run(self, duration, lift_cooldowns=True):
+        """Run the users during duration seconds (and wait for their last actions), return the results."""
+        if lift_cooldowns:
+            # Members roll and claim as much as they want, otherwise most rolls are refused
+            for guild in self.guilds:
+                await db.deck.set_nb_rolls_per_hour(guild.id, 1000000)
+                await db.deck.set_claiming_interval(guild.id, 0)
+
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(monitor_event_loop(stop))
+
+        start = loop.time()
+        await asyncio.gather(*[self.user(guild, member, start + duration) for guild, member in self.users])
+        await cooldowns.flush()
+        elapsed = loop.time() - start
+
+        stop.set()
+        event_loop = await monitor
+
+        latencies = self.recorder.latencies
+        commands = [latency for label, values in latencies.items() if not label.startswith('autocomplete.')
+                    for latency in values]
+        keystrokes = [latency for label, values in latencies.items() if label.startswith('autocomplete.')
+                      for latency in values]
+
+        return {'duration_s': elapsed,
+                'users': len(self.users),
+                'guilds': len({guild.id for guild, _ in self.users}),
+                'actions': dict(self.recorder.actions),
+                'throughput': {'steps_per_s': len(commands) / elapsed, 'keystrokes_per_s': len(keystrokes) / elapsed},
+                'totals': {'steps': statistics_ms(commands), 'autocomplete': statistics_ms(keystrokes)},
+                'latencies': {label: statistics_ms(values) for label, values in sorted(latencies.items())},
+                'event_loop': event_loop,
+                'errors': dict(self.recorder.errors),
+                'error_samples': self.recorder.error_samples}
+
+
+def copy_databases(source, directory):
+    """Copy the databases of source in directory, so that the simulation does not change the generated ones."""
+    os.makedirs(directory, exist_ok=True)
+    for filename in ('database_personality.db', 'database_deck.db'):
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(os.path.join(directory, filename + suffix)):
+                os.remove(os.path.join(directory, filename + suffix))
+        origin = sqlite3.connect(os.path.join(source, filename))
+        copy = sqlite3.connect(os.path.join(directory, filename))
+        origin.backup(copy)
+        copy.close()
+        origin.close()
+
+
+def run(scale, data_directory, guilds, users, duration, seed=0, lift_cooldowns=True, **options):
+    """Return the report of a simulation on the databases of the scale (generated in data_directory if needed).
+
+    options are the ones of Simulation. Generated databases are the ones of the benchmark (shared with it),
+    unless there are more guilds or users than in the scale.
+    """
+    config = dict(generator.SCALES[scale])
+    config['guilds'] = max(config['guilds'], guilds)
+    config['members_per_guild'] = max(config['members_per_guild'], math.ceil(users / guilds))
+    name = scale if config == generator.SCALES[scale] else f'{scale}-{config["guilds"]}-{config["members_per_guild"]}'
+
+    data_directory = os.path.abspath(data_directory)
+    data = generator.load_or_generate(os.path.join(data_directory, name), config, seed)
+    # Only the guilds of the simulation
+    data = {key: {id_server: values[id_server] for id_server in list(data['servers'])[:guilds]}
+            for key, values in data.items()}
+
+    working_directory = os.getcwd()
+    simulation_directory = os.path.join(data_directory, 'simulation')
+    copy_databases(os.path.join(data_directory, name), simulation_directory)
+
+    try:
+        # Default paths of the databases are relative, they are the copied ones from the directory
+        os.chdir(simulation_directory)
+        DatabasePersonality.get().connect('./database_personality.db')
+        DatabaseDeck.get().connect('./database_deck.db')
+        personality = DatabasePersonality.get()
+        personality.refresh_search_indexes()
+        personality.seed_rolls(seed)
+
+        simulation = Simulation(data, users, seed=seed, **options)
+        results = asyncio.run(simulation.run(duration, lift_cooldowns))
+    finally:
+        db.close()
+        os.chdir(working_directory)
+
+    return {'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'scale': scale,
+            'seed': seed,
+            'options': {'duration': duration, 'lift_cooldowns': lift_cooldowns, **options},
+            **results}
+
+
+def describe(report):
+    """Return the main results of the report as text."""
+    lines = [f'{report["users"]} users in {report["guilds"]} guilds during {report["duration_s"]:.1f}s',
+             f'{report["throughput"]["steps_per_s"]:.1f} steps/s, '
+             f'{report["throughput"]["keystrokes_per_s"]:.1f} autocomplete keystrokes/s',
+             '',
+             f'{"step":<35} {"count":>7} {"p50 (ms)":>9} {"p95 (ms)":>9} {"p99 (ms)":>9} {"max (ms)":>9}']
+    for label, stats in [*report['latencies'].items(), *report['totals'].items()]:
+        if stats['count']:
+            lines.append(f'{label:<35} {stats["count"]:>7} {stats["p50_ms"]:>9.1f} {stats["p95_ms"]:>9.1f} '
+                         f'{stats["p99_ms"]:>9.1f} {stats["max_ms"]:>9.1f}')
+
+    event_loop = report['event_loop']
+    lines += ['',
+              f'Event loop: {event_loop["stalls"]} stalls, {event_loop["stalled_ms"]:.1f}ms stalled, '
+              f'longest {event_loop["max_stall_ms"]:.1f}ms, p99 delay {event_loop["delay_p99_ms"]:.1f}ms',
+              f'Actions: {", ".join(f"{action} {count}" for action, count in sorted(report["actions"].items()))}']
+    if report['errors']:
+        lines.append(f'Errors: {", ".join(f"{label} {count}" for label, count in report["errors"].items())}')
+    return '\n'.join(lines)
@@ -6,7 +6,7 @@ import discord
 from discord.ext import commands
 from discord.commands import slash_command, Option
 
-from database import DatabasePersonality, DatabaseDeck
+from async_database import db
 import utils
 
 
@@ -54,7 +54,7 @@ class Trade(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        perso_receive = DatabasePersonality.get().get_perso_information(id_perso_receive)
+        perso_receive = await db.personality.get_perso_information(id_perso_receive)
 
         accept_view = utils.ConfirmView(ctx.author)
         msg = await ctx.send(f'{user.mention} trades **{perso_receive["name"]}** for **{name}**.\n'
@@ -69,9 +69,13 @@ class Trade(commands.Cog):
             await msg.add_reaction(u"\u274C")
             await msg.edit(view=accept_view)
         elif accept_view.is_accepted:
-            DatabaseDeck.get().give_to(ctx.guild.id, id_perso_give, ctx.author.id, user.id)
-            DatabaseDeck.get().give_to(ctx.guild.id, id_perso_receive, user.id, ctx.author.id)
             original_msg = await ctx.interaction.original_message()
+            # Both personalities are exchanged or none if one of them changed hands meanwhile
+            if not await db.deck.swap(ctx.guild.id, id_perso_give, ctx.author.id, id_perso_receive, user.id):
+                await ctx.send('Trade is cancelled, one of the personalities is not owned anymore.')
+                await original_msg.add_reaction(u"\u274C")
+                await msg.add_reaction(u"\u274C")
+                return
             await original_msg.add_reaction(u"\u2705")
             await msg.add_reaction(u"\u2705")
         else:
@@ -123,7 +127,7 @@ class Trade(commands.Cog):
             await ctx.send('Too late... Give is cancelled.')
             await msg.edit(view=accept_view)
         elif accept_view.is_accepted:
-            DatabaseDeck.get().give_to(ctx.guild.id, id_perso, ctx.author.id, user.id)
+            await db.deck.give_to(ctx.guild.id, id_perso, ctx.author.id, user.id)
             original_msg = await ctx.interaction.original_message()
             await original_msg.add_reaction(u"\u2705")
             await msg.add_reaction(u"\u2705")
@@ -152,7 +156,7 @@ class Trade(commands.Cog):
             await ctx.send('Timeout : discard is cancelled.')
             await msg.edit(view=accept_view)
         elif accept_view.is_accepted:
-            DatabaseDeck.get().give_to(ctx.guild.id, id_perso, ctx.author.id, None)
+            await db.deck.give_to(ctx.guild.id, id_perso, ctx.author.id, None)
             original_msg = await ctx.interaction.original_message()
             await original_msg.add_reaction(u"\u2705")
             await msg.add_reaction(u"\u2705")
@@ -191,10 +195,7 @@ class Trade(commands.Cog):
                 await ctx.send('Discard all is cancelled.')
                 return
 
-            ids_deck = DatabaseDeck.get().get_user_deck(ctx.guild.id, ctx.author.id)
-
-            for id_perso in ids_deck:
-                DatabaseDeck.get().give_to(ctx.guild.id, id_perso, ctx.author.id, None)
+            await db.deck.release_deck(ctx.guild.id, ctx.author.id)
 
             original_msg = await ctx.interaction.original_message()
             await original_msg.add_reaction(u"\u2705")
@@ -209,9 +210,9 @@ class Trade(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+            id_perso = await db.personality.get_perso_group_id(name, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(name)
+            id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             msg = f'I searched everywhere for **{name}**'
@@ -224,7 +225,7 @@ class Trade(commands.Cog):
             return None
 
         # Check if perso belongs to author
-        owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, id_perso)
+        owner = await db.deck.perso_belongs_to(ctx.guild.id, id_perso)
         if not owner or owner != author.id:
             await ctx.send(f'You don\'t own **{name}**{" from *" + group + "* " if group else ""}...')
             msg = await ctx.interaction.original_message()
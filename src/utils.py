@@ -1,11 +1,13 @@
-from typing import Dict, List, Optional, Union
+from typing import Callable, Dict, List, Optional, Union
+from collections.abc import Sequence
 import contextlib
 import asyncio
+import inspect
 
 import discord
 from discord.ext import pages
 
-from database import DatabasePersonality, DatabaseDeck
+from async_database import db
 
 
 # Set authorized guilds for slash command (return [] for global command - might take up to 1h to register)
@@ -14,37 +16,36 @@ def get_authorized_guild_ids():
 
 
 async def personalities_name_searcher(ctx: discord.AutocompleteContext):
-    return [perso['name'] for perso in DatabasePersonality.get().get_all_personalities()
-            if ctx.value.lower() in perso['name'].lower()]
+    return await db.personality.search_personalities(ctx.value)
 
 
 async def personalities_group_searcher(ctx: discord.AutocompleteContext):
-    return [group for group in DatabasePersonality.get().get_all_groups() if ctx.value.lower() in group.lower()]
+    return await db.personality.search_groups(ctx.value)
 
 
 async def wishlist_name_searcher(ctx: discord.AutocompleteContext):
-    ids = DatabaseDeck.get().get_wishlist(ctx.interaction.guild.id, ctx.interaction.user.id)
-    personalities = DatabasePersonality.get().get_multiple_perso_information(ids)
+    ids = await db.deck.get_wishlist(ctx.interaction.guild.id, ctx.interaction.user.id)
+    personalities = await db.personality.get_multiple_perso_information(ids) or []
     return [perso['name'] for perso in personalities
             if ctx.value.lower() in perso['name'].lower()]
 
 
 async def shopping_list_name_searcher(ctx: discord.AutocompleteContext):
-    ids = DatabaseDeck.get().get_shopping_list(ctx.interaction.guild.id, ctx.interaction.user.id)
-    personalities = DatabasePersonality.get().get_multiple_perso_information(ids)
+    ids = await db.deck.get_shopping_list(ctx.interaction.guild.id, ctx.interaction.user.id)
+    personalities = await db.personality.get_multiple_perso_information(ids) or []
     return [perso['name'] for perso in personalities
             if ctx.value.lower() in perso['name'].lower()]
 
 
 async def deck_name_searcher(ctx: discord.AutocompleteContext):
-    ids = DatabaseDeck.get().get_user_deck(ctx.interaction.guild.id, ctx.interaction.user.id)
-    personalities = DatabasePersonality.get().get_multiple_perso_information(ids)
+    ids = await db.deck.get_user_deck(ctx.interaction.guild.id, ctx.interaction.user.id)
+    personalities = await db.personality.get_multiple_perso_information(ids) or []
     return [perso['name'] for perso in personalities
             if ctx.value.lower() in perso['name'].lower()]
 
 
 async def badges_name_searcher(ctx: discord.AutocompleteContext):
-    badges = DatabaseDeck.get().get_all_badges(ctx.interaction.guild.id)
+    badges = await db.deck.get_all_badges(ctx.interaction.guild.id)
     return [badge['name'] for badge in badges if ctx.value.lower() in badge['name'].lower()]
 
 
@@ -144,6 +145,76 @@ class PaginatorCustomStartPage(pages.Paginator):
         return self.message
 
 
+class LazyPages(Sequence):
+    """Pages built by build_page(index) only when they are shown, then kept.
+
+    build_page can be a coroutine function (to read the page from the database), pages must then be loaded
+    with load before being shown. Reading a page not loaded yet returns NOT_LOADED, as the paginator also reads
+    pages it does not show (to check whether they are page groups).
+    """
+
+    NOT_LOADED = 'Loading...'
+
+    def __init__(self, page_count: int, build_page: Callable[[int], Union[str, discord.Embed]],
+                 built_pages: Optional[Dict[int, Union[str, discord.Embed]]] = None):
+        self.page_count = page_count
+        self.build_page = build_page
+        self.is_async = inspect.iscoroutinefunction(build_page)
+        self.cache = dict(built_pages or {})
+
+    def __len__(self):
+        return self.page_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.page_count))]
+
+        if index < 0:
+            index += self.page_count
+        if not 0 <= index < self.page_count:
+            raise IndexError('page index out of range')
+
+        if index not in self.cache:
+            if self.is_async:
+                return self.NOT_LOADED
+            self.cache[index] = self.build_page(index)
+
+        return self.cache[index]
+
+    async def load(self, index):
+        if index not in self.cache and 0 <= index < self.page_count:
+            page = self.build_page(index)
+            self.cache[index] = await page if self.is_async else page
+
+
+class LazyPaginator(PaginatorCustomStartPage):
+    """Paginator building its pages on demand, so that its cost does not depend on the number of pages."""
+
+    def __init__(
+        self,
+        page_count: int,
+        build_page: Callable[[int], Union[str, discord.Embed]],
+        author_check=True,
+        custom_view: Optional[discord.ui.View] = None,
+        timeout: Optional[float] = 180.0,
+        first_page: int = 0,
+        built_pages: Optional[Dict[int, Union[str, discord.Embed]]] = None
+    ) -> None:
+        super().__init__(pages=LazyPages(page_count, build_page, built_pages), author_check=author_check,
+                         custom_view=custom_view, timeout=timeout, first_page=first_page)
+
+    @classmethod
+    async def create(cls, page_count: int, build_page: Callable, first_page: int = 0, **kwargs):
+        """Create a paginator from an asynchronous build_page, the page shown first is built beforehand."""
+        first_page = min(max(first_page, 0), page_count - 1)
+        built_pages = {first_page: await build_page(first_page)} if page_count else {}
+        return cls(page_count, build_page, first_page=first_page, built_pages=built_pages, **kwargs)
+
+    async def goto_page(self, page_number=0, *args, **kwargs):
+        await self.pages.load(page_number)
+        return await super().goto_page(page_number, *args, **kwargs)
+
+
 # https://stackoverflow.com/questions/49622924/wait-for-timeout-or-event-being-set-for-asyncio-event
 async def event_wait(event: asyncio.Event, timeout: float):
     # suppress TimeoutError because we'll return False in case of timeout
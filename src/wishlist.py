@@ -2,7 +2,7 @@ import discord
 from discord.ext import commands
 from discord.commands import slash_command, Option
 
-from database import DatabasePersonality, DatabaseDeck
+from async_database import db
 import utils
 
 
@@ -25,9 +25,9 @@ class Wishlist(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+            id_perso = await db.personality.get_perso_group_id(name, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(name)
+            id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}**{" from *" + group + "* " if group else ""} not found.')
@@ -35,8 +35,8 @@ class Wishlist(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        nb_wish = DatabaseDeck.get().get_nb_wish(ctx.guild.id, ctx.author.id)
-        max_wish = DatabaseDeck.get().get_max_wish(ctx.guild.id, ctx.author.id)
+        nb_wish = await db.deck.get_nb_wish(ctx.guild.id, ctx.author.id)
+        max_wish = await db.deck.get_max_wish(ctx.guild.id, ctx.author.id)
 
         if nb_wish >= max_wish:
             # Red cross
@@ -45,7 +45,7 @@ class Wishlist(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        if DatabaseDeck.get().add_to_wishlist(ctx.guild.id, id_perso, ctx.author.id):
+        if await db.deck.add_to_wishlist(ctx.guild.id, id_perso, ctx.author.id):
             # Green mark
             await ctx.respond(f'I added {name}.')
             msg = await ctx.interaction.original_message()
@@ -69,9 +69,9 @@ class Wishlist(commands.Cog):
             group = group.strip()
 
         if group:
-            id_perso = DatabasePersonality.get().get_perso_group_id(name, group)
+            id_perso = await db.personality.get_perso_group_id(name, group)
         else:
-            id_perso = DatabasePersonality.get().get_perso_id(name)
+            id_perso = await db.personality.get_perso_id(name)
 
         if not id_perso:
             await ctx.respond(f'Personality **{name}**{" from *" + group + "* " if group else ""} not found.')
@@ -79,7 +79,7 @@ class Wishlist(commands.Cog):
             await msg.add_reaction(u"\u274C")
             return
 
-        if DatabaseDeck.get().remove_from_wishlist(ctx.guild.id, id_perso, ctx.author.id):
+        if await db.deck.remove_from_wishlist(ctx.guild.id, id_perso, ctx.author.id):
             # Green mark
             await ctx.respond(f'I removed {name}.')
             msg = await ctx.interaction.original_message()
@@ -96,26 +96,22 @@ class Wishlist(commands.Cog):
     async def wishlist(self, ctx, member: Option(discord.Member, required=False, default=None)):
         wishlist_owner = member or ctx.author
 
-        ids = DatabaseDeck.get().get_wishlist(ctx.guild.id, wishlist_owner.id)
-
         description = ''
         username = wishlist_owner.name if wishlist_owner.nick is None else wishlist_owner.nick
 
-        nb_wish = DatabaseDeck.get().get_nb_wish(ctx.guild.id, wishlist_owner.id)
-        max_wish = DatabaseDeck.get().get_max_wish(ctx.guild.id, wishlist_owner.id)
-
-        personalities = DatabasePersonality.get().get_multiple_perso_information(ids)
-        if personalities:
-            for i, perso in enumerate(personalities):
-                id_owner = DatabaseDeck.get().perso_belongs_to(ctx.guild.id, ids[i])
-                emoji = ''
-
-                if id_owner:
-                    if id_owner == wishlist_owner.id:
-                        emoji = u"\u2705"
-                    else:
-                        emoji = u"\u274C"
-                description += f'**{perso["name"]}** *{perso["group"]}* {emoji}\n'
+        nb_wish = await db.deck.get_nb_wish(ctx.guild.id, wishlist_owner.id)
+        max_wish = await db.deck.get_max_wish(ctx.guild.id, wishlist_owner.id)
+
+        # The whole list is shown in one embed
+        for perso in await db.deck.get_wishlist_page(ctx.guild.id, wishlist_owner.id, limit=-1):
+            emoji = ''
+
+            if perso['id_owner']:
+                if perso['id_owner'] == wishlist_owner.id:
+                    emoji = u"\u2705"
+                else:
+                    emoji = u"\u274C"
+            description += f'**{perso["name"]}** *{perso["group"]}* {emoji}\n'
 
         # TODO: crash if description is over 2000 characters
         await ctx.respond(embed=discord.Embed(title=f'Wish list of {username} ({nb_wish}/{max_wish})',
@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Modules of the bot import each other from src, as when it runs from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from async_database import db  # noqa: E402
+from benchmark.generator import PERSONALITY_SCHEMA  # noqa: E402
+from database import DatabaseDeck, DatabasePersonality  # noqa: E402
+
+
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    """Connect the databases to new empty ones in tmp_path, the database threads are stopped afterwards."""
+    monkeypatch.chdir(tmp_path)
+    personality = sqlite3.connect('database_personality.db')
+    personality.executescript(PERSONALITY_SCHEMA)
+    personality.close()
+
+    DatabasePersonality.get().connect('./database_personality.db')
+    DatabaseDeck.get().connect('./database_deck.db')
+    yield tmp_path
+    db.close()
+    # Do not keep the files of tmp_path open
+    DatabaseDeck.get()._connections.reset()
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+
+import pytest
+
+from benchmark.generator import PERSONALITY_SCHEMA
+from catalog_sync import apply_changes, compute_changes, parse_dump
+
+DUMP = '''id,name,group,image
+,Jin,Group A,https://images.example/jin/1.jpg
+,Jin,Group B,https://images.example/jin/2.jpg
+,Minji,Group A,https://images.example/minji/1.jpg
+'''
+
+
+@pytest.fixture
+def personality_db():
+    db = sqlite3.connect(':memory:')
+    db.executescript(PERSONALITY_SCHEMA)
+    yield db
+    db.close()
+
+
+def sync(db, text, dump_format='csv'):
+    changes = compute_changes(db, parse_dump(text, dump_format))
+    with db:
+        apply_changes(db.cursor(), changes)
+    return changes
+
+
+def groups_and_images(db, name):
+    groups = db.execute('''SELECT G.name FROM Personality AS P
+                           JOIN PersoGroups AS PG ON PG.id_perso = P.id
+                           JOIN Groups AS G ON G.id = PG.id_groups
+                           WHERE P.name = ? ORDER BY G.name''', (name,)).fetchall()
+    images = db.execute('''SELECT I.url FROM Personality AS P
+                           JOIN Image AS I ON I.id_perso = P.id
+                           WHERE P.name = ? ORDER BY I.url''', (name,)).fetchall()
+    return [group[0] for group in groups], [image[0] for image in images]
+
+
+def nb_changes(changes):
+    return sum(len(rows) for rows in changes.values())
+
+
+def test_new_personalities_groups_and_images(personality_db):
+    changes = sync(personality_db, DUMP)
+
+    assert sorted(name for _, name in changes['groups']) == ['Group A', 'Group B']
+    assert sorted(name for _, name in changes['personalities']) == ['Jin', 'Minji']
+    assert groups_and_images(personality_db, 'Jin') == (
+        ['Group A', 'Group B'], ['https://images.example/jin/1.jpg', 'https://images.example/jin/2.jpg'])
+
+
+def test_same_dump_changes_nothing(personality_db):
+    sync(personality_db, DUMP)
+
+    assert nb_changes(compute_changes(personality_db, parse_dump(DUMP, 'csv'))) == 0
+
+
+def test_groups_and_images_not_in_the_dump_are_removed(personality_db):
+    sync(personality_db, DUMP)
+    changes = sync(personality_db, 'name,group,image\nJin,group a,https://images.example/jin/3.jpg\n')
+
+    # Groups are found without case
+    assert changes['groups'] == []
+    assert len(changes['links_removed']) == 1
+    assert groups_and_images(personality_db, 'Jin') == (['Group A'], ['https://images.example/jin/3.jpg'])
+    # Personalities missing from the dump are kept
+    assert groups_and_images(personality_db, 'Minji') == (['Group A'], ['https://images.example/minji/1.jpg'])
+
+
+def test_missing_columns_keep_groups_and_images(personality_db):
+    sync(personality_db, DUMP)
+    jin = groups_and_images(personality_db, 'Jin')
+
+    assert nb_changes(sync(personality_db, 'name,image\nJin,https://images.example/jin/1.jpg\n'
+                                           'Jin,https://images.example/jin/2.jpg\n')) == 0
+    assert nb_changes(sync(personality_db, 'name,group\nJin,Group A\nJin,Group B\n')) == 0
+    assert nb_changes(sync(personality_db, json.dumps([{'name': 'Jin'}]), 'json')) == 0
+    assert groups_and_images(personality_db, 'Jin') == jin
+
+    # An empty list is in the dump: the images are removed
+    sync(personality_db, json.dumps([{'name': 'Jin', 'images': []}]), 'json')
+    assert groups_and_images(personality_db, 'Jin') == (jin[0], [])
+
+
+def test_rename_by_id(personality_db):
+    sync(personality_db, DUMP)
+    id_jin = personality_db.execute('''SELECT id FROM Personality WHERE name = 'Jin' ''').fetchone()[0]
+
+    changes = sync(personality_db, json.dumps([{'id': id_jin, 'name': 'Jinny'}]), 'json')
+
+    assert changes['renamed'] == [('Jinny', id_jin)]
+    assert groups_and_images(personality_db, 'Jinny')[0] == ['Group A', 'Group B']
+
+
+def test_names_must_stay_unique(personality_db):
+    sync(personality_db, DUMP)
+    id_jin = personality_db.execute('''SELECT id FROM Personality WHERE name = 'Jin' ''').fetchone()[0]
+
+    with pytest.raises(ValueError):
+        compute_changes(personality_db, parse_dump(json.dumps([{'id': id_jin, 'name': 'Minji'}]), 'json'))
+    with pytest.raises(ValueError):
+        parse_dump('name,group\n,Group A\n', 'csv')
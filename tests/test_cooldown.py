@@ -0,0 +1,65 @@
+import asyncio
+
+from cooldown import CooldownTable, now
+from database import DatabaseDeck
+
+ID_SERVER = 1
+ID_MEMBER = 2
+
+
+async def roll(cooldowns, max_rolls):
+    """Check and count a roll as the roll command does, then give control back as it does meanwhile."""
+    await cooldowns.get(ID_SERVER, ID_MEMBER)
+    nb_rolls = cooldowns.try_register_roll(ID_SERVER, ID_MEMBER, max_rolls)
+    await asyncio.sleep(0.01)
+    return nb_rolls
+
+
+def test_concurrent_rolls_do_not_exceed_the_limit(databases):
+    async def run():
+        cooldowns = CooldownTable()
+        results = await asyncio.gather(*[roll(cooldowns, 3) for _ in range(10)])
+        await cooldowns.flush()
+        return results
+
+    results = asyncio.run(run())
+
+    assert sorted(nb_rolls for nb_rolls in results if nb_rolls is not None) == [0, 1, 2]
+    assert DatabaseDeck.get().get_member_cooldown(ID_SERVER, ID_MEMBER)['nb_rolls'] == 3
+
+
+def test_concurrent_claims_pass_once(databases):
+    async def claim(cooldowns):
+        await cooldowns.get(ID_SERVER, ID_MEMBER)
+        return cooldowns.try_register_claim(ID_SERVER, ID_MEMBER, 60)
+
+    async def run():
+        cooldowns = CooldownTable()
+        return await asyncio.gather(*[claim(cooldowns) for _ in range(5)]), cooldowns
+
+    results, cooldowns = asyncio.run(run())
+
+    assert results.count(0) == 1
+    assert all(0 < minutes <= 60 for minutes in results if minutes != 0)
+    assert cooldowns.members[(ID_SERVER, ID_MEMBER)]['last_claim'] >= now() - 1
+
+
+def test_least_recently_used_members_are_forgotten_after_their_writes(databases):
+    async def run():
+        cooldowns = CooldownTable(max_members=2)
+        write = asyncio.get_running_loop().create_future()
+        await cooldowns.get(ID_SERVER, 1)
+        cooldowns._write_behind(ID_SERVER, 1, write)
+        await cooldowns.get(ID_SERVER, 2)
+        await cooldowns.get(ID_SERVER, 3)
+        while_pending = list(cooldowns.members)
+
+        write.set_result(None)
+        await cooldowns.flush()
+        await cooldowns.get(ID_SERVER, 4)
+        return while_pending, list(cooldowns.members)
+
+    while_pending, after_write = asyncio.run(run())
+
+    assert while_pending == [(ID_SERVER, 1), (ID_SERVER, 3)]
+    assert after_write == [(ID_SERVER, 3), (ID_SERVER, 4)]
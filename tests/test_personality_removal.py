@@ -0,0 +1,62 @@
+from database import DatabaseDeck, DatabasePersonality
+
+ID_SERVER = 1
+ID_MEMBER = 2
+
+
+def create_personality(name):
+    personality = DatabasePersonality.get()
+    personality.db.execute('''INSERT OR IGNORE INTO Groups(id, name) VALUES (1, 'Group')''')
+    personality.add_personality(name, 1, f'https://images.example/{name}.jpg')
+    return personality.get_perso_id(name)
+
+
+def claim_in_badge(id_perso):
+    """Give the personality to the member, wish it and put it in a badge, return the badge."""
+    deck = DatabaseDeck.get()
+    deck.add_badge(ID_SERVER, f'Badge {id_perso}')
+    id_badge = deck.get_id_badge(ID_SERVER, f'Badge {id_perso}')
+    deck.add_perso_to_badge(id_badge, id_perso)
+    deck.add_to_deck(ID_SERVER, id_perso, ID_MEMBER)
+    deck.add_to_wishlist(ID_SERVER, id_perso, ID_MEMBER)
+    return id_badge
+
+
+def owned(id_badge):
+    return {badge['id']: badge['owned'] for badge in DatabaseDeck.get().get_badges_progress(ID_SERVER, ID_MEMBER)} \
+        .get(id_badge, 0)
+
+
+def test_remove_personality_and_references(databases):
+    id_perso = create_personality('Removed')
+    id_badge = claim_in_badge(id_perso)
+    assert owned(id_badge) == 1
+
+    DatabaseDeck.get().remove_perso_references(id_perso)
+    DatabasePersonality.get().remove_personality(id_perso)
+
+    deck = DatabaseDeck.get()
+    assert deck.get_user_deck(ID_SERVER, ID_MEMBER) == []
+    assert deck.get_wishlist(ID_SERVER, ID_MEMBER) == []
+    assert deck.get_perso_in_badge(id_badge) == []
+    assert owned(id_badge) == 0
+    assert DatabasePersonality.get().get_perso_id('Removed') is None
+
+
+def test_remove_orphans_repairs_a_removal_stopped_halfway(databases):
+    id_kept = create_personality('Kept')
+    id_removed = create_personality('Removed')
+    claim_in_badge(id_kept)
+    id_badge = claim_in_badge(id_removed)
+
+    # Stopped after the commit of the personalities database
+    DatabasePersonality.get().remove_personality(id_removed)
+
+    deck = DatabaseDeck.get()
+    # Deck, wish list and badge rows
+    assert deck.remove_orphans() == 3
+    assert deck.get_user_deck(ID_SERVER, ID_MEMBER) == [id_kept]
+    assert deck.get_wishlist(ID_SERVER, ID_MEMBER) == [id_kept]
+    assert deck.get_perso_in_badge(id_badge) == []
+    assert owned(id_badge) == 0
+    assert deck.remove_orphans() == 0
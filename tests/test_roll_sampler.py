@@ -0,0 +1,96 @@
+import collections
+import sqlite3
+
+from benchmark.generator import PERSONALITY_SCHEMA
+from catalog import PersonalityCatalog, RollSampler
+from database import DatabasePersonality
+
+
+def draws(sampler, nb_draws):
+    return [sampler.choice() for _ in range(nb_draws)]
+
+
+def assert_uniform(sampler, ids, nb_draws=9000):
+    """Check that every id is drawn close to nb_draws / len(ids) times, and no other id."""
+    counts = collections.Counter(draws(sampler, nb_draws))
+    assert set(counts) == set(ids)
+    expected = nb_draws / len(ids)
+    for id_perso in ids:
+        assert abs(counts[id_perso] - expected) < 0.2 * expected, (id_perso, counts[id_perso], expected)
+
+
+def test_same_seed_gives_the_same_rolls():
+    first = RollSampler(seed=42)
+    second = RollSampler(seed=42)
+    for id_perso in range(1, 101):
+        first.add(id_perso)
+        second.add(id_perso)
+
+    assert draws(first, 50) == draws(second, 50)
+
+    # Seeding again restarts the sequence
+    first.seed(7)
+    sequence = draws(first, 50)
+    first.seed(7)
+    assert draws(first, 50) == sequence
+
+
+def test_empty_sampler_draws_nothing():
+    sampler = RollSampler(seed=0)
+    assert sampler.choice() is None
+
+    sampler.add(1)
+    sampler.remove(1)
+    assert sampler.choice() is None
+
+
+def test_rolls_stay_uniform_after_add_and_remove():
+    sampler = RollSampler(seed=1)
+    for id_perso in range(1, 11):
+        sampler.add(id_perso)
+    assert_uniform(sampler, range(1, 11))
+
+    # The first, a middle and the last ids are replaced by the last one of the array
+    for id_perso in (1, 5, 10):
+        sampler.remove(id_perso)
+    sampler.add(11)
+    # Adding twice does not make an id more likely
+    sampler.add(11)
+    # Removing an unknown id does nothing
+    sampler.remove(42)
+
+    ids = [2, 3, 4, 6, 7, 8, 9, 11]
+    assert sorted(sampler.ids) == ids
+    assert all(sampler.ids[position] == id_perso for id_perso, position in sampler.positions.items())
+    assert_uniform(sampler, ids)
+
+
+def test_catalog_rolls_only_personalities_with_a_group():
+    db = sqlite3.connect(':memory:')
+    db.executescript(PERSONALITY_SCHEMA)
+    db.execute('''INSERT INTO Groups(id, name) VALUES (1, 'Group')''')
+    db.executemany('''INSERT INTO Personality(id, name) VALUES (?, ?)''',
+                   [(id_perso, f'Perso {id_perso}') for id_perso in range(1, 7)])
+    # The last personality has no group
+    db.executemany('''INSERT INTO PersoGroups(id_groups, id_perso) VALUES (1, ?)''',
+                   [(id_perso,) for id_perso in range(1, 6)])
+    catalog = PersonalityCatalog()
+    catalog.load(db)
+    catalog.remove_personality(3)
+    catalog.add_personality(7, 'Perso 7', 1)
+    catalog.sampler.seed(3)
+
+    assert_uniform(catalog.sampler, [1, 2, 4, 5, 7])
+
+
+def test_seed_rolls_makes_random_personalities_reproducible(databases):
+    personality = DatabasePersonality.get()
+    personality.db.execute('''INSERT INTO Groups(id, name) VALUES (1, 'Group')''')
+    for number in range(20):
+        personality.add_personality(f'Perso {number}', 1, f'https://images.example/{number}.jpg')
+
+    personality.seed_rolls(5)
+    sequence = [personality.get_random_perso_id() for _ in range(30)]
+    personality.seed_rolls(5)
+    assert [personality.get_random_perso_id() for _ in range(30)] == sequence
+    assert len(set(sequence)) > 1
@@ -0,0 +1,121 @@
+"""
+Query plans of the member reads, on a new database and on a baseline database brought up to date by the migrations.
+
+Every access to the member tables must search an index: a scan reads the whole table, whatever the member,
+and a search on the server alone reads the tables of all the members of the server.
+"""
+
+import os
+import re
+import sqlite3
+
+import pytest
+
+from benchmark.generator import PERSONALITY_SCHEMA
+from database import DatabaseDeck, DatabasePersonality
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'baseline_database_deck.sql')
+
+MEMBER_TABLES = {'Deck', 'Wishlist', 'ShoppingList', 'BadgePerso'}
+
+ID_SERVER = 1
+ID_MEMBER = 2
+ID_PERSO = 3
+ID_BADGE = 4
+AFTER = {'id': ID_PERSO, 'name': 'Name', 'group': 'Group'}
+
+
+def member_reads(deck):
+    """Return the reads whose query plans are checked, called with arguments of a member."""
+    return [
+        lambda: deck.get_user_deck(ID_SERVER, ID_MEMBER),
+        lambda: deck.get_deck_page(ID_SERVER, ID_MEMBER),
+        lambda: deck.get_deck_page(ID_SERVER, ID_MEMBER, sort='group'),
+        lambda: deck.get_deck_page(ID_SERVER, ID_MEMBER, group='Group'),
+        lambda: deck.get_deck_page(ID_SERVER, ID_MEMBER, id_badge=ID_BADGE),
+        lambda: deck.get_deck_page(ID_SERVER, ID_MEMBER, after=AFTER),
+        lambda: deck.get_deck_page(ID_SERVER, ID_MEMBER, sort='group', after=AFTER),
+        lambda: deck.count_deck(ID_SERVER, ID_MEMBER, group='Group', id_badge=ID_BADGE),
+        lambda: deck.get_wishlist(ID_SERVER, ID_MEMBER),
+        lambda: deck.get_wishlist_page(ID_SERVER, ID_MEMBER),
+        lambda: deck.get_shopping_list(ID_SERVER, ID_MEMBER),
+        lambda: deck.get_badges_with(ID_SERVER, ID_PERSO),
+        lambda: deck.get_perso_in_badge(ID_BADGE),
+    ]
+
+
+def create_personality_database(directory):
+    db = sqlite3.connect(os.path.join(directory, 'database_personality.db'))
+    db.executescript(PERSONALITY_SCHEMA)
+    db.close()
+
+
+def create_baseline_database(directory):
+    db = sqlite3.connect(os.path.join(directory, 'database_deck.db'))
+    with open(BASELINE_SCHEMA, 'r') as f:
+        db.executescript(f.read())
+    db.close()
+
+
+@pytest.fixture(params=['new', 'baseline'])
+def deck(request, tmp_path, monkeypatch):
+    """Return the deck database connected to a new database, or to a baseline one upgraded by the migrations."""
+    monkeypatch.chdir(tmp_path)
+    create_personality_database(tmp_path)
+    if request.param == 'baseline':
+        create_baseline_database(tmp_path)
+
+    DatabasePersonality.get().connect('./database_personality.db')
+    deck = DatabaseDeck.get()
+    deck.connect('./database_deck.db')
+    yield deck
+    # Do not keep the files of tmp_path open
+    deck._connections.reset()
+
+
+def traced_statements(deck, read):
+    """Return the statements run by read, with their parameters."""
+    statements = []
+    deck.db.set_trace_callback(statements.append)
+    try:
+        read()
+    finally:
+        deck.db.set_trace_callback(None)
+    return statements
+
+
+def table_aliases(statement):
+    """Return {name or alias: table} of the tables read by the statement."""
+    aliases = {}
+    for table, alias in re.findall(r'(?:FROM|JOIN)\s+(?:\w+\.)?(\w+)(?:\s+AS\s+(\w+))?', statement, re.IGNORECASE):
+        aliases[alias or table] = table
+    return aliases
+
+
+def member_table_steps(db, statement):
+    """Return the steps of the query plan of the statement which read a member table."""
+    aliases = table_aliases(statement)
+    steps = []
+    for step in db.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall():
+        detail = step[3]
+        words = detail.split()
+        if words[0] in ('SCAN', 'SEARCH') and aliases.get(words[1]) in MEMBER_TABLES:
+            steps.append(detail)
+    return steps
+
+
+def test_schema_is_up_to_date(deck):
+    version = deck.db.execute('''PRAGMA user_version''').fetchone()[0]
+    assert version == len(deck._migrations())
+
+
+def test_member_reads_search_indexes(deck):
+    for read in member_reads(deck):
+        statements = traced_statements(deck, read)
+        assert statements
+        for statement in statements:
+            steps = member_table_steps(deck.db, statement)
+            assert steps, statement
+            for step in steps:
+                assert re.match(r'SEARCH \w+ USING (COVERING )?INDEX ', step), f'{step} in {statement}'
+                assert not step.endswith('(id_server=?)'), f'{step} in {statement}'
@@ -0,0 +1,57 @@
+from database import DatabasePersonality
+from search import SearchIndex
+
+NAMES = ['Jin', 'Jinny', 'Jinsoo', 'Park Jimin', 'Kim Jinwoo', 'Seojin', 'Lee Hajin', 'Minji']
+
+
+def test_tiers_are_exact_then_prefix_then_word_then_substring():
+    index = SearchIndex(NAMES)
+
+    assert index.search('jin') == [
+        # Exact and prefix matches, by name
+        'Jin', 'Jinny', 'Jinsoo',
+        # Matches at the beginning of a word, by matched word
+        'Kim Jinwoo',
+        # Other substrings
+        'Lee Hajin', 'Seojin',
+    ]
+
+
+def test_words_are_sorted_by_matched_word():
+    index = SearchIndex(['Zed Abby', 'Alpha Abel', 'Beta Abe'])
+
+    assert index.search('ab') == ['Zed Abby', 'Beta Abe', 'Alpha Abel']
+
+
+def test_case_accents_and_limit():
+    index = SearchIndex(['Éloïse', 'Eloise Kim', 'Hélène'])
+
+    assert index.search('ELOI') == ['Éloïse', 'Eloise Kim']
+    assert index.search(' eloi ', limit=1) == ['Éloïse']
+    assert index.search('lene') == ['Hélène']
+    assert index.search('xyz') == []
+
+
+def test_short_queries_use_the_smaller_grams():
+    index = SearchIndex(NAMES)
+
+    assert index.search('j')[:3] == ['Jin', 'Jinny', 'Jinsoo']
+    assert set(index.search('mi')) == {'Minji', 'Park Jimin'}
+
+
+def test_indexes_follow_added_and_removed_personalities(databases):
+    personality = DatabasePersonality.get()
+    personality.db.execute('''INSERT INTO Groups(id, name) VALUES (1, 'Group')''')
+    for name in ('Jin', 'Seojin'):
+        personality.add_personality(name, 1, f'https://images.example/{name}.jpg')
+    personality.load_memory()
+    assert personality.search_personalities('jin') == ['Jin', 'Seojin']
+
+    personality.add_personality('Kim Jinwoo', 1, 'https://images.example/kim.jpg')
+    personality.remove_personality(personality.get_perso_id('Jin'))
+    # The patches of the catalog make the indexes outdated, they are rebuilt by the next load
+    assert not personality.is_memory_loaded()
+    personality.load_memory()
+
+    assert personality.search_personalities('jin') == ['Kim Jinwoo', 'Seojin']
+    assert personality.search_groups('gro') == ['Group']